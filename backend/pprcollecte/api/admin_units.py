@@ -0,0 +1,234 @@
+# admin_units.py - Hiérarchie région > préfecture > commune à partir des emprises stockées
+import threading
+import time
+
+from django.conf import settings # type: ignore
+from django.db import connection # type: ignore
+
+from .conditional import get_table_versions
+from .layer_cache import LayerCache
+from .models import CommuneRurale, Prefecture, Region
+
+# Niveaux administratifs servis par les APIs de zoom
+ADMIN_LEVELS = {
+    'region': Region,
+    'prefecture': Prefecture,
+    'commune': CommuneRurale,
+}
+
+ADMIN_TABLES = [model._meta.db_table for model in ADMIN_LEVELS.values()]
+
+BOUNDS_COLUMNS = ['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy', 'center_x', 'center_y']
+
+# Nombre maximum de localisations par requête de zoom groupée
+MAX_ZOOM_LOCATIONS = 500
+
+
+def row_bounds(values):
+    """(minx, miny, maxx, maxy, cx, cy) -> (bounds, center), None si géométrie absente"""
+    minx, miny, maxx, maxy, cx, cy = values
+    bounds = [minx, miny, maxx, maxy] if minx is not None else None
+    center = [cx, cy] if cx is not None else None
+    return bounds, center
+
+
+class AdminHierarchy:
+    """
+    Arbre complet région > préfecture > commune (noms, emprises, centres) lu en
+    une requête sur les colonnes d'emprise, sans transfert de géométrie.
+    Le résultat est mis en cache tant que les tables administratives ne changent pas.
+    """
+    CACHE_PREFIX = 'geography:hierarchy'
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'GEOGRAPHY_CACHE_TIMEOUT', 24 * 3600)
+
+    @staticmethod
+    def sql():
+        def columns(alias):
+            return ', '.join(f"{alias}.{column}" for column in BOUNDS_COLUMNS)
+
+        region_fk = Prefecture._meta.get_field('regions_id').column
+        prefecture_fk = CommuneRurale._meta.get_field('prefectures_id').column
+        return f"""
+            SELECT r.id, r.nom, {columns('r')},
+                   p.id, p.nom, {columns('p')},
+                   c.id, c.nom, {columns('c')}
+            FROM {Region._meta.db_table} r
+            LEFT JOIN {Prefecture._meta.db_table} p ON p.{region_fk} = r.id
+            LEFT JOIN {CommuneRurale._meta.db_table} c ON c.{prefecture_fk} = p.id
+            ORDER BY r.nom, r.id, p.nom, p.id, c.nom, c.id
+        """
+
+    @classmethod
+    def compute(cls):
+        with connection.cursor() as cursor:
+            cursor.execute(cls.sql())
+            rows = cursor.fetchall()
+
+        width = 2 + len(BOUNDS_COLUMNS)
+        regions = {}
+        prefectures = {}
+        total_communes = 0
+        for row in rows:
+            region_row, prefecture_row, commune_row = row[:width], row[width:2 * width], row[2 * width:]
+
+            region_id = region_row[0]
+            region = regions.get(region_id)
+            if region is None:
+                bounds, center = row_bounds(region_row[2:])
+                region = regions[region_id] = {
+                    'id': region_id,
+                    'nom': region_row[1],
+                    'bounds': bounds,
+                    'center': center,
+                    'prefectures': [],
+                }
+
+            prefecture_id = prefecture_row[0]
+            if prefecture_id is None:
+                continue
+            prefecture = prefectures.get(prefecture_id)
+            if prefecture is None:
+                bounds, center = row_bounds(prefecture_row[2:])
+                prefecture = prefectures[prefecture_id] = {
+                    'id': prefecture_id,
+                    'nom': prefecture_row[1],
+                    'region_id': region_id,
+                    'bounds': bounds,
+                    'center': center,
+                    'communes': [],
+                }
+                region['prefectures'].append(prefecture)
+
+            if commune_row[0] is None:
+                continue
+            bounds, center = row_bounds(commune_row[2:])
+            prefecture['communes'].append({
+                'id': commune_row[0],
+                'nom': commune_row[1],
+                'bounds': bounds,
+                'center': center,
+            })
+            total_communes += 1
+
+        return {
+            'success': True,
+            'hierarchy': list(regions.values()),
+            'total_regions': len(regions),
+            'total_prefectures': len(prefectures),
+            'total_communes': total_communes,
+        }
+
+    @classmethod
+    def cache_key(cls):
+        versions = get_table_versions(ADMIN_TABLES)
+        return f"{cls.CACHE_PREFIX}:{LayerCache.filters_digest(versions)}"
+
+    @classmethod
+    def fetch(cls):
+        cache = LayerCache.backend()
+        key = cls.cache_key()
+        data = cache.get(key)
+        if data is None:
+            data = cls.compute()
+            cache.set(key, data, timeout=cls.timeout())
+        return data
+
+
+class AdminBounds:
+    """Emprises stockées de plusieurs unités administratives, de niveaux mélangés"""
+
+    @staticmethod
+    def sql(ids_by_type):
+        selects = []
+        params = []
+        for location_type, ids in ids_by_type.items():
+            model = ADMIN_LEVELS[location_type]
+            selects.append(
+                f"SELECT %s, t.id, t.nom, {', '.join(f't.{column}' for column in BOUNDS_COLUMNS)} "
+                f"FROM {model._meta.db_table} t WHERE t.id = ANY(%s)"
+            )
+            params += [location_type, sorted(ids)]
+        return ' UNION ALL '.join(selects), params
+
+    @classmethod
+    def fetch(cls, locations):
+        """
+        locations: [(type, id)] -> {(type, id): {'nom', 'bounds', 'center'}}
+        en une requête; les unités introuvables sont absentes du résultat.
+        """
+        ids_by_type = {}
+        for location_type, location_id in locations:
+            ids_by_type.setdefault(location_type, set()).add(location_id)
+        if not ids_by_type:
+            return {}
+
+        sql, params = cls.sql(ids_by_type)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        found = {}
+        for location_type, location_id, nom, *bounds_values in rows:
+            bounds, center = row_bounds(bounds_values)
+            found[(location_type, location_id)] = {'nom': nom, 'bounds': bounds, 'center': center}
+        return found
+
+    @staticmethod
+    def combined_extent(bounds_list):
+        """Emprise englobant toutes les emprises (None si aucune)"""
+        bounds_list = [bounds for bounds in bounds_list if bounds]
+        if not bounds_list:
+            return None
+        return [
+            min(bounds[0] for bounds in bounds_list),
+            min(bounds[1] for bounds in bounds_list),
+            max(bounds[2] for bounds in bounds_list),
+            max(bounds[3] for bounds in bounds_list),
+        ]
+
+
+class AdminMemoryIndex:
+    """
+    Index en mémoire partagé par le processus, construit à partir des tables
+    administratives: chargé au premier appel par index_class.load(versions), les
+    versions de ADMIN_TABLES sont relues au plus toutes les
+    settings.LOCATOR_REFRESH_INTERVAL secondes et l'index est rechargé si elles
+    ont changé. index_class expose versions et checked_at (time.monotonic()).
+    Chaque sous-classe a son propre index et son propre verrou.
+    """
+    index_class = None
+    _index = None
+    _lock = threading.Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._index = None
+        cls._lock = threading.Lock()
+
+    @staticmethod
+    def refresh_interval():
+        return getattr(settings, 'LOCATOR_REFRESH_INTERVAL', 60)
+
+    @classmethod
+    def is_fresh(cls, index):
+        return index is not None and time.monotonic() - index.checked_at < cls.refresh_interval()
+
+    @classmethod
+    def index(cls):
+        index = cls._index
+        if cls.is_fresh(index):
+            return index
+
+        with cls._lock:
+            index = cls._index
+            if cls.is_fresh(index):
+                return index
+            versions = get_table_versions(ADMIN_TABLES)
+            if index is not None and index.versions == versions:
+                index.checked_at = time.monotonic()
+                return index
+            cls._index = cls.index_class.load(versions)
+            return cls._index
@@ -0,0 +1,356 @@
+# boundaries.py - Contours administratifs simplifiés multi-résolution, servis en TopoJSON
+import json
+import logging
+import math
+
+from django.db import connection # type: ignore
+
+from .admin_units import ADMIN_TABLES, AdminHierarchy
+from .conditional import get_table_versions
+from .generalisation import METRIC_SRID
+from .layer_cache import LayerCache
+from .models import CommuneRurale, Prefecture, Region
+
+logger = logging.getLogger(__name__)
+
+# Objets TopoJSON: modèle et colonne du parent exposée en propriété
+BOUNDARY_LEVELS = {
+    'regions': {'model': Region, 'parent': None},
+    'prefectures': {'model': Prefecture, 'parent': 'regions_id'},
+    'communes': {'model': CommuneRurale, 'parent': 'prefectures_id'},
+}
+
+# (résolution, zoom maximum servi, tolérance en mètres), comme GENERALISATION_LEVELS.
+# Au-delà du dernier zoom la résolution la plus fine est servie.
+BOUNDARY_RESOLUTIONS = [
+    (1, 7, 1000.0),
+    (2, 10, 150.0),
+    (3, 13, 20.0),
+]
+
+# Grille de quantification TopoJSON (nombre de pas par axe)
+QUANTIZATION = 100000
+
+# Conversion approchée des tolérances en degrés (latitude de la Guinée, ~10° N)
+METERS_PER_DEGREE = 111320.0
+
+
+def resolution_for_zoom(zoom):
+    """Résolution des contours pour un zoom donné (la plus fine si zoom absent ou élevé)"""
+    if zoom is not None:
+        for resolution, max_zoom, _tolerance in BOUNDARY_RESOLUTIONS:
+            if zoom <= max_zoom:
+                return resolution
+    return BOUNDARY_RESOLUTIONS[-1][0]
+
+
+def resolution_tolerance(resolution):
+    for level, _max_zoom, tolerance in BOUNDARY_RESOLUTIONS:
+        if level == resolution:
+            return tolerance
+    return None
+
+
+class BoundarySimplifier:
+    """
+    Simplification des contours d'un niveau administratif en préservant la couverture:
+    ST_CoverageSimplify (PostGIS >= 3.4) simplifie une seule fois chaque frontière
+    commune à deux unités, les voisins gardent exactement les mêmes sommets.
+    Sans cette fonction, les contours sont lus sans simplification et ce sont les
+    arcs de la topologie qui sont simplifiés (TopologyBuilder.encode): simplifier
+    objet par objet décalerait les frontières communes.
+    """
+
+    @staticmethod
+    def coverage_simplify_available(cursor):
+        cursor.execute("SELECT to_regproc('st_coveragesimplify') IS NOT NULL")
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def sql(level, coverage=True):
+        config = BOUNDARY_LEVELS[level]
+        model = config['model']
+        table = model._meta.db_table
+        parent = model._meta.get_field(config['parent']).column if config['parent'] else 'NULL'
+        if coverage:
+            simplified = f"ST_CoverageSimplify(ST_Transform(t.geom, {METRIC_SRID}), %s) OVER ()"
+        else:
+            simplified = "t.geom"
+        return f"""
+            SELECT s.id, s.nom, s.parent_id, ST_AsGeoJSON(ST_Transform(s.geom, 4326), 6)
+            FROM (
+                SELECT t.id, t.nom, {parent} AS parent_id, {simplified} AS geom
+                FROM {table} t
+                WHERE t.geom IS NOT NULL AND NOT ST_IsEmpty(t.geom)
+            ) s
+            WHERE s.geom IS NOT NULL AND NOT ST_IsEmpty(s.geom)
+            ORDER BY s.id
+        """
+
+    @classmethod
+    def fetch(cls, levels, tolerance):
+        """
+        ({niveau: [(id, nom, parent_id, géométrie GeoJSON)]}, simplifié par PostGIS).
+        Si le second élément est False, les géométries sont en pleine résolution.
+        """
+        features = {}
+        with connection.cursor() as cursor:
+            coverage = cls.coverage_simplify_available(cursor)
+            if not coverage:
+                logger.info("ST_CoverageSimplify indisponible, simplification des arcs TopoJSON")
+            for level in levels:
+                cursor.execute(cls.sql(level, coverage), [tolerance] if coverage else [])
+                features[level] = [
+                    (unit_id, nom, parent_id, json.loads(geometry))
+                    for unit_id, nom, parent_id, geometry in cursor.fetchall()
+                ]
+        return features, coverage
+
+
+class TopologyBuilder:
+    """
+    Encodage TopoJSON de polygones: coordonnées quantifiées, anneaux découpés aux
+    jonctions (sommets reliés à plus de deux voisins distincts, ou départs d'anneau
+    partagés avec un autre anneau), arcs dédoublonnés dans les deux sens,
+    éventuellement simplifiés, et codés en différences.
+    """
+
+    def __init__(self, bbox, quantization=QUANTIZATION):
+        minx, miny, maxx, maxy = bbox
+        self.bbox = [minx, miny, maxx, maxy]
+        self.translate = [minx, miny]
+        self.scale = [
+            (maxx - minx) / (quantization - 1) or 1.0,
+            (maxy - miny) / (quantization - 1) or 1.0,
+        ]
+        self.arcs = []
+        self._arc_index = {}
+
+    def quantize_ring(self, ring):
+        """Anneau fermé en entiers, sans sommets consécutifs identiques (None si dégénéré)"""
+        tx, ty = self.translate
+        sx, sy = self.scale
+        points = []
+        for x, y in (position[:2] for position in ring):
+            point = (round((x - tx) / sx), round((y - ty) / sy))
+            if not points or points[-1] != point:
+                points.append(point)
+        if points[0] != points[-1]:
+            points.append(points[0])
+        return points if len(points) >= 4 else None
+
+    @staticmethod
+    def polygons(geometry):
+        if geometry['type'] == 'Polygon':
+            return [geometry['coordinates']]
+        if geometry['type'] == 'MultiPolygon':
+            return geometry['coordinates']
+        return []
+
+    @staticmethod
+    def find_junctions(rings):
+        """
+        Sommets où un arc doit s'arrêter: plus de deux voisins distincts tous
+        anneaux confondus (point triple, frontière qui rejoint une autre), ou
+        départ d'un anneau quand le sommet appartient aussi à un autre anneau
+        """
+        neighbours = {}
+        ring_ids = {}
+        for ring_id, ring in enumerate(rings):
+            points = ring[:-1]
+            count = len(points)
+            for i, point in enumerate(points):
+                neighbours.setdefault(point, set()).update((points[i - 1], points[(i + 1) % count]))
+                ring_ids.setdefault(point, set()).add(ring_id)
+
+        junctions = {point for point, adjacent in neighbours.items() if len(adjacent) > 2}
+        for ring in rings:
+            if len(ring_ids[ring[0]]) > 1:
+                junctions.add(ring[0])
+        return junctions
+
+    def _arc_ref(self, points):
+        """Indice de l'arc (~indice s'il est parcouru à l'envers), créé au besoin"""
+        key = tuple(points)
+        if key in self._arc_index:
+            return self._arc_index[key]
+        reverse_key = key[::-1]
+        if reverse_key in self._arc_index:
+            return ~self._arc_index[reverse_key]
+        index = len(self.arcs)
+        self._arc_index[key] = index
+        self.arcs.append(key)
+        return index
+
+    def ring_arcs(self, ring, junctions):
+        points = ring[:-1]
+        cuts = [i for i, point in enumerate(points) if point in junctions]
+        if not cuts:
+            # Anneau isolé: départ canonique au plus petit sommet pour le dédoublonnage
+            start = points.index(min(points))
+            rotated = points[start:] + points[:start]
+            return [self._arc_ref(rotated + [rotated[0]])]
+
+        start = cuts[0]
+        rotated = points[start:] + points[:start] + [points[start]]
+        refs = []
+        arc = [rotated[0]]
+        for point in rotated[1:]:
+            arc.append(point)
+            if point in junctions:
+                refs.append(self._arc_ref(arc))
+                arc = [point]
+        return refs
+
+    def simplify_arc(self, arc, tolerance):
+        """
+        Douglas-Peucker sur un arc quantifié (distances en unités d'origine).
+        Les extrémités sont conservées; un arc fermé garde au moins 4 sommets.
+        """
+        if len(arc) <= 2:
+            return arc
+        sx, sy = self.scale
+        coords = [(x * sx, y * sy) for x, y in arc]
+        keep = [False] * len(arc)
+        keep[0] = keep[-1] = True
+        stack = [(0, len(arc) - 1)]
+        while stack:
+            first, last = stack.pop()
+            (x0, y0), (x1, y1) = coords[first], coords[last]
+            dx, dy = x1 - x0, y1 - y0
+            length = math.hypot(dx, dy)
+            farthest, max_distance = None, tolerance
+            for i in range(first + 1, last):
+                x, y = coords[i]
+                if length:
+                    distance = abs(dy * (x - x0) - dx * (y - y0)) / length
+                else:
+                    distance = math.hypot(x - x0, y - y0)
+                if distance > max_distance:
+                    farthest, max_distance = i, distance
+            if farthest is not None:
+                keep[farthest] = True
+                stack += [(first, farthest), (farthest, last)]
+
+        simplified = tuple(point for point, kept in zip(arc, keep) if kept)
+        if arc[0] == arc[-1] and len(simplified) < 4:
+            return arc
+        return simplified
+
+    def encode(self, features, tolerance=None):
+        """
+        features: {objet: [(id, propriétés, géométrie GeoJSON)]} -> dict TopoJSON.
+        tolerance (unités des coordonnées): simplification des arcs après
+        découpage, une seule fois par frontière partagée.
+        """
+        quantized = {}
+        all_rings = []
+        for name, items in features.items():
+            quantized[name] = []
+            for unit_id, properties, geometry in items:
+                polygons = []
+                for polygon in self.polygons(geometry):
+                    rings = [self.quantize_ring(ring) for ring in polygon]
+                    if rings and rings[0] is not None:
+                        polygons.append([ring for ring in rings if ring is not None])
+                quantized[name].append((unit_id, properties, polygons))
+                all_rings += [ring for polygon in polygons for ring in polygon]
+
+        junctions = self.find_junctions(all_rings)
+
+        objects = {}
+        for name, items in quantized.items():
+            geometries = []
+            for unit_id, properties, polygons in items:
+                geometry = {'id': unit_id, 'properties': properties}
+                if polygons:
+                    geometry['type'] = 'MultiPolygon'
+                    geometry['arcs'] = [
+                        [self.ring_arcs(ring, junctions) for ring in polygon]
+                        for polygon in polygons
+                    ]
+                else:
+                    geometry['type'] = None
+                geometries.append(geometry)
+            objects[name] = {'type': 'GeometryCollection', 'geometries': geometries}
+
+        if tolerance:
+            self.arcs = [self.simplify_arc(arc, tolerance) for arc in self.arcs]
+
+        return {
+            'type': 'Topology',
+            'bbox': self.bbox,
+            'transform': {'scale': self.scale, 'translate': self.translate},
+            'objects': objects,
+            'arcs': [self.delta_encode(arc) for arc in self.arcs],
+        }
+
+    @staticmethod
+    def delta_encode(arc):
+        encoded = [list(arc[0])]
+        for (x0, y0), (x1, y1) in zip(arc, arc[1:]):
+            encoded.append([x1 - x0, y1 - y0])
+        return encoded
+
+
+class AdminBoundaries:
+    """
+    Contours des niveaux demandés à une résolution donnée, en TopoJSON.
+    Calculés une fois puis servis depuis le cache tant que les tables
+    administratives ne changent pas (clé liée à leurs versions).
+    """
+    CACHE_PREFIX = 'geography:boundaries'
+
+    def __init__(self, levels, resolution):
+        self.levels = [level for level in BOUNDARY_LEVELS if level in levels]
+        self.resolution = resolution
+
+    @staticmethod
+    def extent(features):
+        xs, ys = [], []
+        for items in features.values():
+            for _unit_id, _properties, geometry in items:
+                for polygon in TopologyBuilder.polygons(geometry):
+                    for position in polygon[0]:
+                        xs.append(position[0])
+                        ys.append(position[1])
+        if not xs:
+            return (0.0, 0.0, 0.0, 0.0)
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def compute(self):
+        """Document TopoJSON sérialisé (texte)"""
+        tolerance = resolution_tolerance(self.resolution)
+        rows, simplified = BoundarySimplifier.fetch(self.levels, tolerance)
+        features = {}
+        for level, items in rows.items():
+            parent_key = BOUNDARY_LEVELS[level]['parent']
+            features[level] = []
+            for unit_id, nom, parent_id, geometry in items:
+                properties = {'nom': nom}
+                if parent_key:
+                    properties[parent_key] = parent_id
+                features[level].append((unit_id, properties, geometry))
+
+        # Repli sans ST_CoverageSimplify: simplification des arcs partagés
+        arc_tolerance = None if simplified else tolerance / METERS_PER_DEGREE
+        topology = TopologyBuilder(self.extent(features)).encode(features, arc_tolerance)
+        topology['resolution'] = self.resolution
+        return json.dumps(topology, separators=(',', ':'))
+
+    def cache_key(self):
+        digest = LayerCache.filters_digest({
+            'levels': self.levels,
+            'resolution': self.resolution,
+            'versions': get_table_versions(ADMIN_TABLES),
+        })
+        return f"{LayerCache.PREFIX}:{self.CACHE_PREFIX}:{digest}"
+
+    def fetch(self):
+        cache = LayerCache.backend()
+        key = self.cache_key()
+        content = cache.get(key)
+        if content is None:
+            content = self.compute()
+            cache.set(key, content, timeout=AdminHierarchy.timeout())
+        return content
@@ -0,0 +1,124 @@
+# commune_assignment.py - Rattachement des objets à leur commune par jointure spatiale
+import logging
+
+from django.db import connection, transaction # type: ignore
+
+from .models import CommuneDecoupee, CommuneRurale
+from .spatial_utils import InfrastructureLayers
+
+logger = logging.getLogger(__name__)
+
+# Sommets maximum par morceau de commune (même valeur que le trigger de la migration 0011)
+SUBDIVIDE_MAX_VERTICES = 256
+
+# Objets traités par transaction lors d'un rattachement en masse
+DEFAULT_BATCH_SIZE = 5000
+
+
+class CommuneAssigner:
+    """
+    Renseigne commune_id (communes_rurales_id pour pistes et chaussées) à partir
+    de la géométrie: point intérieur de l'objet (ST_PointOnSurface) contenu dans
+    un morceau de communes_decoupees. Les morceaux étant petits, le test
+    point-dans-polygone reste rapide et l'index GiST très sélectif.
+    Un point sur une frontière est rattaché à la commune d'identifiant le plus petit.
+    """
+
+    @staticmethod
+    def _assign_sql(type_name, overwrite=False, feature_ids=None, id_range=None):
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+        pieces_table = CommuneDecoupee._meta.db_table
+
+        point = 't.geom'
+        if InfrastructureLayers.geom_srid(model) != 4326:
+            point = 'ST_Transform(t.geom, 4326)'
+
+        where = ['t.geom IS NOT NULL', 'NOT ST_IsEmpty(t.geom)']
+        params = []
+        if not overwrite:
+            where.append(f't.{commune_col} IS NULL')
+        if feature_ids is not None:
+            where.append(f't.{pk} = ANY(%s)')
+            params.append(list(feature_ids))
+        if id_range is not None:
+            where.append(f't.{pk} >= %s AND t.{pk} < %s')
+            params += list(id_range)
+
+        sql = f"""
+            UPDATE {table} u
+            SET {commune_col} = m.commune_id
+            FROM (
+                SELECT DISTINCT ON (s.fid) s.fid, d.commune_id
+                FROM (
+                    SELECT t.{pk} AS fid, ST_PointOnSurface({point}) AS pt
+                    FROM {table} t
+                    WHERE {' AND '.join(where)}
+                ) s
+                JOIN {pieces_table} d ON ST_Intersects(d.geom, s.pt)
+                ORDER BY s.fid, d.commune_id
+            ) m
+            WHERE u.{pk} = m.fid
+              AND u.{commune_col} IS DISTINCT FROM m.commune_id
+        """
+        return sql, params
+
+    @classmethod
+    def assign(cls, type_name, overwrite=False, feature_ids=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Rattache les objets d'une couche (sans commune, ou tous si overwrite).
+        Le traitement en masse avance par tranches de clé primaire, une transaction
+        par tranche. Retourne le nombre d'objets mis à jour.
+        """
+        if feature_ids is not None:
+            sql, params = cls._assign_sql(type_name, overwrite, feature_ids=feature_ids)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.rowcount
+
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min({pk}), max({pk}) FROM {table}")
+            min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return 0
+
+        updated = 0
+        for start in range(min_id, max_id + 1, batch_size):
+            sql, params = cls._assign_sql(type_name, overwrite, id_range=(start, start + batch_size))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                updated += cursor.rowcount
+        return updated
+
+    @classmethod
+    def assign_feature(cls, type_name, feature_id):
+        """Rattachement après écriture d'un objet dont la commune n'est pas renseignée"""
+        if InfrastructureLayers.get_model(type_name) is None or feature_id is None:
+            return
+        try:
+            cls.assign(type_name, feature_ids=[feature_id])
+        except Exception as e:
+            logger.warning("Erreur rattachement commune %s %s: %s", type_name, feature_id, e)
+
+    @staticmethod
+    def rebuild_index():
+        """Reconstruit communes_decoupees (normalement entretenue par trigger)"""
+        pieces_table = CommuneDecoupee._meta.db_table
+        communes = CommuneRurale._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {pieces_table}")
+            cursor.execute(f"""
+                INSERT INTO {pieces_table} (commune_id, geom)
+                SELECT c.id, ST_Subdivide(c.geom, %s)
+                FROM {communes} c
+                WHERE c.geom IS NOT NULL AND NOT ST_IsEmpty(c.geom)
+            """, [SUBDIVIDE_MAX_VERTICES])
+            written = cursor.rowcount
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {pieces_table}")
+        return written
@@ -0,0 +1,90 @@
+# conditional.py - ETags dérivés des compteurs de version des tables
+import hashlib
+import logging
+from contextlib import contextmanager
+
+from django.db import connection # type: ignore
+from django.views.decorators.http import condition # type: ignore
+
+from .models import TableVersion
+
+logger = logging.getLogger(__name__)
+
+# Variable lue par les triggers de journal et de version (migration 0016)
+SUIVI_SETTING = 'pprcollecte.sans_suivi'
+
+
+def get_table_versions(tables):
+    """Versions courantes des tables demandées (une seule requête)"""
+    versions = dict(
+        TableVersion.objects.filter(table_name__in=tables).values_list('table_name', 'version')
+    )
+    return {table: versions.get(table, 0) for table in tables}
+
+
+@contextmanager
+def change_tracking_disabled(cursor):
+    """
+    Coupe le journal des changements et les compteurs de version pour les
+    instructions du bloc (à utiliser dans transaction.atomic()). Le réglage est
+    local à la transaction: il est rétabli en sortie du bloc, pour le reste d'une
+    transaction englobante; en cas d'erreur, l'annulation l'efface.
+    """
+    cursor.execute("SELECT set_config(%s, 'on', true)", [SUIVI_SETTING])
+    yield
+    cursor.execute("SELECT set_config(%s, 'off', true)", [SUIVI_SETTING])
+
+
+def bump_table_version(table):
+    """Incrément manuel, après des écritures faites sans suivi"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {TableVersion._meta.db_table} (table_name, version, updated_at)
+            VALUES (%s, 1, now())
+            ON CONFLICT (table_name) DO UPDATE
+            SET version = {TableVersion._meta.db_table}.version + 1,
+                updated_at = now()
+            """,
+            [table],
+        )
+
+
+def normalized_query(request):
+    """Paramètres de requête triés (ordre des clés et des valeurs sans importance)"""
+    return '&'.join(
+        f"{key}={','.join(sorted(request.GET.getlist(key)))}"
+        for key in sorted(request.GET.keys())
+    )
+
+
+def compute_etag(tables, request):
+    """
+    ETag = empreinte des versions des tables lues + filtres de la requête.
+    Retourne None si les versions ne sont pas disponibles (pas d'ETag).
+    """
+    try:
+        versions = get_table_versions(sorted(set(tables)))
+    except Exception as e:
+        logger.warning("Erreur lecture table_versions: %s", e)
+        return None
+
+    fingerprint = '|'.join([
+        request.path,
+        normalized_query(request),
+        request.META.get('HTTP_ACCEPT', ''),
+        ';'.join(f"{table}:{version}" for table, version in versions.items()),
+    ])
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def watermark_etag(tables):
+    """
+    Décorateur de méthode get(): répond 304 à If-None-Match sans exécuter la vue.
+    tables est une liste de tables ou une fonction (request) -> liste de tables.
+    """
+    def etag_func(request, *args, **kwargs):
+        view_tables = tables(request) if callable(tables) else tables
+        return compute_etag(view_tables, request)
+
+    return condition(etag_func=etag_func)
@@ -0,0 +1,127 @@
+# delta_sync.py - Synchronisation incrémentale des couches (?since=<curseur>)
+import base64
+
+from django.db import connection, transaction # type: ignore
+
+from .models import ChangementInfrastructure, TableVersion
+from .spatial_utils import InfrastructureLayers
+
+CURSOR_PREFIX = 'c2:'
+# Ancien format (id seul), encore accepté
+LEGACY_CURSOR_PREFIX = 'c1:'
+
+# Ligne de table_versions retenant l'id le plus élevé supprimé par purger_changements
+PURGE_MARK_TABLE = 'infrastructure_changes:purge'
+
+
+class CursorError(ValueError):
+    """Curseur illisible"""
+
+
+class CursorExpiredError(CursorError):
+    """Curseur antérieur au début du journal (changements purgés)"""
+
+
+class DeltaSync:
+    """
+    Lit le journal infrastructure_changes pour savoir quels objets ont changé
+    depuis un curseur. Le curseur encode l'id du dernier changement vu et la plus
+    ancienne transaction encore en cours à ce moment (xmin): les ids sont attribués
+    avant la validation, un changement d'id inférieur peut devenir visible plus tard.
+    Les changements de ces transactions sont relus au prochain appel (renvoi idempotent).
+    """
+
+    @staticmethod
+    def encode_cursor(change_id, xmin=None):
+        raw = f"{CURSOR_PREFIX}{int(change_id)}:{int(xmin) if xmin is not None else ''}".encode('ascii')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(value):
+        """Curseur -> (change_id, xmin); xmin vaut None pour l'ancien format"""
+        try:
+            padded = value + '=' * (-len(value) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii')
+        except (ValueError, UnicodeError) as e:
+            raise CursorError("Curseur invalide") from e
+        try:
+            if raw.startswith(CURSOR_PREFIX):
+                change_id, xmin = raw[len(CURSOR_PREFIX):].split(':')
+                return int(change_id), int(xmin) if xmin else None
+            if raw.startswith(LEGACY_CURSOR_PREFIX):
+                return int(raw[len(LEGACY_CURSOR_PREFIX):]), None
+        except ValueError as e:
+            raise CursorError("Curseur invalide") from e
+        raise CursorError("Curseur invalide")
+
+    @staticmethod
+    def purge_mark():
+        """Id le plus élevé supprimé du journal par une purge (0 si jamais purgé)"""
+        return TableVersion.objects.filter(table_name=PURGE_MARK_TABLE).values_list('version', flat=True).first() or 0
+
+    @staticmethod
+    def record_purge(change_id):
+        """Avance la marque de purge (jamais en arrière)"""
+        with transaction.atomic():
+            mark, _created = TableVersion.objects.select_for_update().get_or_create(
+                table_name=PURGE_MARK_TABLE, defaults={'version': 0},
+            )
+            if change_id > mark.version:
+                mark.version = change_id
+                mark.save(update_fields=['version'])
+
+    @staticmethod
+    def current_cursor():
+        """
+        (id du dernier changement visible, xmin de l'instantané) lus dans la même
+        instruction. Journal vide: la marque de purge tient lieu de dernier id.
+        """
+        sql = f"""
+            SELECT GREATEST(
+                       (SELECT MAX(id) FROM {ChangementInfrastructure._meta.db_table}),
+                       (SELECT version FROM {TableVersion._meta.db_table} WHERE table_name = %s),
+                       0),
+                   txid_snapshot_xmin(txid_current_snapshot())
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [PURGE_MARK_TABLE])
+            change_id, xmin = cursor.fetchone()
+        return change_id, xmin
+
+    @classmethod
+    def check_retention(cls, since_id):
+        """
+        Le journal doit encore contenir tout ce qui suit since_id: seule la marque
+        de purge le dit, les ids ont des trous (transactions annulées) et le
+        premier id restant ne suffit pas
+        """
+        if since_id < cls.purge_mark():
+            raise CursorExpiredError("Curseur expiré, recharger toutes les données")
+
+    @staticmethod
+    def changes_since(since, until_id, type_names):
+        """
+        Dernière opération de chaque objet modifié dans ]since_id, until_id], plus
+        les changements des transactions en cours au moment du curseur (txid >= xmin).
+        since: (since_id, xmin) tel que retourné par decode_cursor.
+        Retourne {type_name: {'upserted': [ids], 'deleted': [ids]}}
+        """
+        since_id, since_xmin = since
+        tables = {
+            InfrastructureLayers.table(InfrastructureLayers.get_model(type_name)): type_name
+            for type_name in type_names
+        }
+        changes = {type_name: {'upserted': [], 'deleted': []} for type_name in type_names}
+
+        sql = f"""
+            SELECT table_name, feature_id, (array_agg(operation ORDER BY id DESC))[1]
+            FROM {ChangementInfrastructure._meta.db_table}
+            WHERE (id > %s OR txid >= %s) AND id <= %s AND table_name = ANY(%s)
+            GROUP BY table_name, feature_id
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [since_id, since_xmin, until_id, list(tables)])
+            for table_name, feature_id, operation in cursor.fetchall():
+                key = 'deleted' if operation == 'D' else 'upserted'
+                changes[tables[table_name]][key].append(feature_id)
+        return changes
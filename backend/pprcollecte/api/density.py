@@ -0,0 +1,156 @@
+# density.py - Densité des collectes par cellule de grille (hexagones ou carrés), calculée dans PostGIS
+from django.db import connection # type: ignore
+
+from .conditional import get_table_versions
+from .generalisation import METRIC_SRID
+from .geojson_engine import GeoJSONEngine
+from .layer_cache import LayerCache
+from .point_union import PointInfrastructureUnion
+from .spatial_utils import DEFAULT_PRECISION, InfrastructureLayers
+
+# Résolution -> taille de cellule en mètres (côté de l'hexagone ou du carré)
+DENSITY_RESOLUTIONS = {
+    0: 50000.0,
+    1: 25000.0,
+    2: 10000.0,
+    3: 5000.0,
+    4: 2500.0,
+    5: 1000.0,
+    6: 500.0,
+}
+DEFAULT_RESOLUTION = 2
+
+# Forme -> fonction construisant la cellule (i, j), même numérotation que
+# ST_HexagonGrid / ST_SquareGrid (grille ancrée sur l'origine du SRID)
+GRID_SHAPES = {
+    'hex': 'ST_Hexagon',
+    'square': 'ST_Square',
+}
+
+# Demi-hauteur d'un hexagone de côté 1 (sqrt(3) / 2)
+HEX_HALF_HEIGHT = 0.8660254037844387
+
+
+class DensityGrid:
+    """
+    Nombre d'objets par cellule d'une grille régulière (hexagones ou carrés)
+    en UTM 28N. Les objets linéaires comptent par leur point intérieur (ST_PointOnSurface).
+    La cellule de chaque point est calculée à partir de ses coordonnées (pas de
+    jointure spatiale avec une grille); seules les cellules non vides sont
+    construites et renvoyées, en WGS84, avec le détail par type.
+    """
+    CACHE_PREFIX = 'density'
+
+    def __init__(self, type_names, resolution=DEFAULT_RESOLUTION, shape='hex', commune_scope=None, bbox=None):
+        self.type_names = type_names
+        self.resolution = resolution
+        self.shape = shape
+        self.cell_size = DENSITY_RESOLUTIONS[resolution]
+        # Mêmes filtres administratifs et bbox que /api/collectes/
+        self.filters = GeoJSONEngine(commune_scope, bbox=bbox)
+
+    def cell_index_sql(self):
+        """
+        Sous-requête LATERAL donnant (i, j) de la cellule contenant le point (p.x, p.y).
+        Carrés: division entière. Hexagones (à sommets plats, colonnes impaires
+        décalées d'une demi-hauteur): centre le plus proche parmi les deux colonnes
+        encadrant x, le rang étant arrondi dans chaque colonne.
+        """
+        size = self.cell_size
+        if self.shape == 'square':
+            return f"SELECT floor(p.x / {size!r})::int AS i, floor(p.y / {size!r})::int AS j"
+
+        column_width = 1.5 * size
+        half_height = HEX_HALF_HEIGHT * size
+        return f"""
+            SELECT k.i, k.j
+            FROM (
+                SELECT c.i,
+                       round((p.y - CASE WHEN c.i % 2 <> 0 THEN {half_height!r} ELSE 0 END)
+                             / {2 * half_height!r})::int AS j
+                FROM (VALUES (floor(p.x / {column_width!r})::int),
+                             (floor(p.x / {column_width!r})::int + 1)) AS c(i)
+            ) k
+            ORDER BY power(p.x - {column_width!r} * k.i, 2)
+                   + power(p.y - {2 * half_height!r} * k.j
+                           - CASE WHEN k.i % 2 <> 0 THEN {half_height!r} ELSE 0 END, 2)
+            LIMIT 1
+        """
+
+    def sql(self):
+        union_sql, params = PointInfrastructureUnion.union_sql(
+            self.type_names, columns=['geom'], where_for=self.filters.where_sql,
+        )
+        cell_function = GRID_SHAPES[self.shape]
+        sql = f"""
+            WITH pts AS (
+                SELECT u.type, ST_X(g.geom) AS x, ST_Y(g.geom) AS y
+                FROM ({union_sql}) u
+                CROSS JOIN LATERAL (
+                    SELECT ST_Transform(ST_PointOnSurface(u.geom), {METRIC_SRID}) AS geom
+                ) g
+                WHERE u.geom IS NOT NULL AND NOT ST_IsEmpty(u.geom)
+            ),
+            counts AS (
+                SELECT cell.i, cell.j, p.type, count(*) AS n
+                FROM pts p
+                CROSS JOIN LATERAL ({self.cell_index_sql()}) cell
+                GROUP BY cell.i, cell.j, p.type
+            )
+            SELECT count(*), COALESCE(json_agg(f.feature ORDER BY f.i, f.j), '[]'::json)::text
+            FROM (
+                SELECT i, j, json_build_object(
+                    'type', 'Feature',
+                    'id', i || '_' || j,
+                    'geometry', ST_AsGeoJSON(
+                        ST_Transform(ST_SetSRID({cell_function}(%s, i, j), {METRIC_SRID}), 4326),
+                        {DEFAULT_PRECISION}
+                    )::json,
+                    'properties', json_build_object(
+                        'i', i,
+                        'j', j,
+                        'count', sum(n),
+                        'counts', json_object_agg(type, n)
+                    )
+                ) AS feature
+                FROM counts
+                GROUP BY i, j
+            ) f
+        """
+        return sql, params + [self.cell_size]
+
+    def compute(self):
+        """(nombre de cellules, tableau JSON des cellules)"""
+        sql, params = self.sql()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    def cache_key(self):
+        """Clé par résolution, forme, types et filtres, liée aux versions des tables lues"""
+        tables = [
+            InfrastructureLayers.table(InfrastructureLayers.get_model(type_name))
+            for type_name in self.type_names
+        ]
+        versions = get_table_versions(tables + ['communes_rurales', 'prefectures'])
+        digest = LayerCache.filters_digest({
+            'types': self.type_names,
+            'resolution': self.resolution,
+            'shape': self.shape,
+            'filters': self.filters.cache_filters(),
+            'versions': versions,
+        })
+        return f"{LayerCache.PREFIX}:{self.CACHE_PREFIX}:{digest}"
+
+    def fetch(self, use_cache=True):
+        """(nombre de cellules, tableau JSON), depuis le cache si possible"""
+        if not use_cache:
+            return self.compute()
+        cache = LayerCache.backend()
+        key = self.cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        value = self.compute()
+        cache.set(key, value, timeout=LayerCache.timeout())
+        return value
@@ -0,0 +1,92 @@
+# generalisation.py - Géométries linéaires multi-résolution par niveau de zoom
+from django.db import connection, transaction # type: ignore
+
+from .models import GeometrieGeneralisee
+from .spatial_utils import InfrastructureLayers
+
+# SRID métrique utilisé pour les tolérances (UTM zone 28N, Guinée)
+METRIC_SRID = 32628
+
+# (niveau, zoom maximum servi, tolérance en mètres)
+# La tolérance vaut environ un demi-pixel au zoom maximum du niveau.
+# Toute modification doit être reportée dans le trigger maj_geometries_generalisees.
+GENERALISATION_LEVELS = [
+    (1, 7, 500.0),
+    (2, 10, 75.0),
+    (3, 13, 10.0),
+]
+
+# Couches linéaires généralisées
+GENERALISED_LAYERS = ['pistes', 'chaussees', 'passages_submersibles', 'bacs']
+
+
+def level_for_zoom(zoom):
+    """Niveau de généralisation pour un zoom donné (None = pleine résolution)"""
+    if zoom is None:
+        return None
+    for niveau, max_zoom, _tolerance in GENERALISATION_LEVELS:
+        if zoom <= max_zoom:
+            return niveau
+    return None
+
+
+class GeometryGeneralizer:
+    """
+    Calcule et stocke les géométries simplifiées (ST_SimplifyPreserveTopology)
+    dans la table geometries_generalisees. Les écritures courantes sont suivies
+    par le trigger maj_geometries_generalisees (migration 0015, mêmes tolérances);
+    rebuild sert à la reconstruction complète après un changement de niveaux.
+    """
+
+    @staticmethod
+    def _refresh_sql(type_name, niveau, tolerance, feature_ids=None):
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        gen_table = GeometrieGeneralisee._meta.db_table
+
+        where = ['t.geom IS NOT NULL', 'NOT ST_IsEmpty(t.geom)']
+        params = [type_name, niveau, tolerance, tolerance]
+        if feature_ids is not None:
+            where.append(f't.{pk} = ANY(%s)')
+            params.append(list(feature_ids))
+
+        sql = f"""
+            INSERT INTO {gen_table} (layer, feature_id, niveau, tolerance_m, nb_points, geom, updated_at)
+            SELECT %s, s.feature_id, %s, %s, ST_NPoints(s.geom), s.geom, now()
+            FROM (
+                SELECT t.{pk} AS feature_id,
+                       ST_Transform(
+                           ST_SimplifyPreserveTopology(ST_Transform(t.geom, {METRIC_SRID}), %s),
+                           4326
+                       ) AS geom
+                FROM {table} t
+                WHERE {' AND '.join(where)}
+            ) s
+            ON CONFLICT (layer, feature_id, niveau) DO UPDATE
+            SET tolerance_m = EXCLUDED.tolerance_m,
+                nb_points = EXCLUDED.nb_points,
+                geom = EXCLUDED.geom,
+                updated_at = EXCLUDED.updated_at
+        """
+        return sql, params
+
+    @classmethod
+    def rebuild(cls, type_names=None, feature_ids=None):
+        """
+        (Re)calcule tous les niveaux pour les couches demandées.
+        feature_ids limite le calcul à quelques objets.
+        Retourne le nombre de lignes écrites par couche.
+        """
+        written = {}
+        with transaction.atomic(), connection.cursor() as cursor:
+            for type_name in type_names or GENERALISED_LAYERS:
+                if feature_ids is None:
+                    # Reconstruction complète: supprimer aussi les objets disparus
+                    GeometrieGeneralisee.objects.filter(layer=type_name).delete()
+                written[type_name] = 0
+                for niveau, _max_zoom, tolerance in GENERALISATION_LEVELS:
+                    sql, params = cls._refresh_sql(type_name, niveau, tolerance, feature_ids)
+                    cursor.execute(sql, params)
+                    written[type_name] += cursor.rowcount
+        return written
@@ -1,110 +1,64 @@
 # api/geographic_api.py
+import logging
+
 from rest_framework.views import APIView # type: ignore
 from rest_framework.response import Response # type: ignore
 from rest_framework import status # type: ignore
 from django.contrib.gis.geos import Point # type: ignore
 from django.contrib.gis.measure import Distance  # type: ignore
-from .models import Region, Prefecture, CommuneRurale
-from .serializers import RegionSerializer, PrefectureSerializer, CommuneRuraleSerializer
+from django.http import HttpResponse # type: ignore
+from django.utils.decorators import method_decorator # type: ignore
+from .admin_units import ADMIN_LEVELS, ADMIN_TABLES, BOUNDS_COLUMNS, MAX_ZOOM_LOCATIONS, AdminBounds, AdminHierarchy
+from .boundaries import BOUNDARY_LEVELS, BOUNDARY_RESOLUTIONS, AdminBoundaries, resolution_for_zoom
+from .conditional import watermark_etag
+from .locator import MAX_LOCATE_POINTS, CommuneLocator
+from .name_search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, AdminNameSearch
+from .spatial_utils import parse_zoom, validate_coordinates
+
+logger = logging.getLogger(__name__)
 
+@method_decorator(watermark_etag(ADMIN_TABLES), name='get')
 class GeographyHierarchyAPIView(APIView):
     """
     API pour récupérer la hiérarchie géographique complète
-    RÉgion > Préfecture > Commune avec données géométriques
+    Région > Préfecture > Commune avec emprises et centres (sans géométrie).
+    Lue en une requête sur les colonnes d'emprise, mise en cache tant que les
+    tables administratives ne changent pas (ETag sur leurs versions).
     """
     
     def get(self, request):
         try:
-            print("🌍 [Geographic API] Chargement hiérarchie complète...")
-            
-            # Récupérer toute la hiérarchie avec select_related pour optimiser
-            regions = Region.objects.prefetch_related(
-                'prefecture_set__communerurale_set'
-            ).order_by('nom')
-            
-            hierarchy_data = []
-            total_prefectures = 0
-            total_communes = 0
-            
-            for region in regions:
-                prefectures_data = []
-                
-                for prefecture in region.prefecture_set.all().order_by('nom'):
-                    communes_data = []
-                    total_prefectures += 1
-                    
-                    for commune in prefecture.communerurale_set.all().order_by('nom'):
-                        communes_data.append({
-                            'id': commune.id,
-                            'nom': commune.nom,
-                            'bounds': self._get_geometry_bounds(commune.geom) if commune.geom else None,
-                            'center': self._get_geometry_center(commune.geom) if commune.geom else None
-                        })
-                        total_communes += 1
-                    
-                    prefectures_data.append({
-                        'id': prefecture.id,
-                        'nom': prefecture.nom,
-                        'region_id': region.id,
-                        'bounds': self._get_geometry_bounds(prefecture.geom) if prefecture.geom else None,
-                        'center': self._get_geometry_center(prefecture.geom) if prefecture.geom else None,
-                        'communes': communes_data
-                    })
-                
-                hierarchy_data.append({
-                    'id': region.id,
-                    'nom': region.nom,
-                    'bounds': self._get_geometry_bounds(region.geom) if region.geom else None,
-                    'center': self._get_geometry_center(region.geom) if region.geom else None,
-                    'prefectures': prefectures_data
-                })
-            
-            print(f"✅ Hiérarchie chargée: {len(hierarchy_data)} régions, {total_prefectures} préfectures, {total_communes} communes")
-            
-            return Response({
-                'success': True,
-                'hierarchy': hierarchy_data,
-                'total_regions': len(hierarchy_data),
-                'total_prefectures': total_prefectures,
-                'total_communes': total_communes
-            })
+            data = AdminHierarchy.fetch()
+            logger.debug(
+                "hiérarchie: %s régions, %s préfectures, %s communes",
+                data['total_regions'], data['total_prefectures'], data['total_communes'],
+            )
+            return Response(data)
             
         except Exception as e:
-            print(f"❌ Erreur chargement hiérarchie: {e}")
+            logger.exception("Erreur chargement hiérarchie")
             return Response({
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _get_geometry_bounds(self, geometry):
-        """Calculer les bounds [minLng, minLat, maxLng, maxLat] pour zoom automatique"""
-        if not geometry:
-            return None
-        
-        try:
-            extent = geometry.extent  # [minLng, minLat, maxLng, maxLat]
-            return extent
-        except:
-            return None
-    
-    def _get_geometry_center(self, geometry):
-        """Calculer le centre [lng, lat] pour zoom automatique"""
-        if not geometry:
-            return None
-        
-        try:
-            centroid = geometry.centroid
-            return [centroid.x, centroid.y]
-        except:
-            return None
 
 
 class ZoomToLocationAPIView(APIView):
     """
     API pour obtenir les données de zoom pour une localisation spécifique
+    (emprise et centre stockés, géométrie non chargée).
+
+    Plusieurs localisations en un appel (restauration de filtres enregistrés):
+    GET  ?locations=region:1,commune:12
+    POST {"locations": [{"type": "commune", "id": 12}, ["region", 1], ...]}
+    -> emprise combinée et emprise de chaque localisation, en une requête
     """
     
     def get(self, request):
+        if request.GET.get('locations'):
+            pairs = [item.split(':', 1) for item in request.GET['locations'].split(',') if item.strip()]
+            return self._zoom_many(pairs)
+
         location_type = request.GET.get('type')  # 'region', 'prefecture', 'commune'
         location_id = request.GET.get('id')
         
@@ -114,23 +68,16 @@ class ZoomToLocationAPIView(APIView):
                 'error': 'Paramètres type et id requis'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        model = ADMIN_LEVELS.get(location_type)
+        if model is None:
+            return Response({
+                'success': False,
+                'error': 'Type invalide. Utilisez: region, prefecture, commune'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
             location_id = int(location_id)
-            
-            if location_type == 'region':
-                location = Region.objects.get(id=location_id)
-            elif location_type == 'prefecture':
-                location = Prefecture.objects.get(id=location_id)
-            elif location_type == 'commune':
-                location = CommuneRurale.objects.get(id=location_id)
-            else:
-                return Response({
-                    'success': False,
-                    'error': 'Type invalide. Utilisez: region, prefecture, commune'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            bounds = self._get_geometry_bounds(location.geom) if location.geom else None
-            center = self._get_geometry_center(location.geom) if location.geom else None
+            location = model.objects.only('id', 'nom', *BOUNDS_COLUMNS).get(id=location_id)
             
             return Response({
                 'success': True,
@@ -138,8 +85,8 @@ class ZoomToLocationAPIView(APIView):
                     'id': location.id,
                     'nom': location.nom,
                     'type': location_type,
-                    'bounds': bounds,
-                    'center': center
+                    'bounds': location.bounds,
+                    'center': location.center
                 }
             })
             
@@ -153,25 +100,219 @@ class ZoomToLocationAPIView(APIView):
                 'success': False,
                 'error': str(e)
             }, status=status.HTTP_404_NOT_FOUND)
-    
-    def _get_geometry_bounds(self, geometry):
-        """Calculer les bounds pour zoom automatique"""
-        if not geometry:
-            return None
-        
+
+    def post(self, request):
+        pairs = request.data.get('locations') if isinstance(request.data, dict) else None
+        if not isinstance(pairs, list):
+            return Response({
+                'success': False,
+                'error': 'Liste "locations" requise: [{"type": ..., "id": ...}, ...]'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return self._zoom_many(pairs)
+
+    def _zoom_many(self, pairs):
+        if len(pairs) > MAX_ZOOM_LOCATIONS:
+            return Response({
+                'success': False,
+                'error': f"Au plus {MAX_ZOOM_LOCATIONS} localisations par requête"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        locations = []
+        for position, pair in enumerate(pairs):
+            try:
+                if isinstance(pair, dict):
+                    location_type, location_id = pair['type'], int(pair['id'])
+                else:
+                    location_type, location_id = pair[0], int(pair[1])
+            except (KeyError, IndexError, TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'error': f"Localisation {position} invalide"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if location_type not in ADMIN_LEVELS:
+                return Response({
+                    'success': False,
+                    'error': 'Type invalide. Utilisez: region, prefecture, commune'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            locations.append((location_type, location_id))
+
+        found = AdminBounds.fetch(locations)
+        results = []
+        for location_type, location_id in locations:
+            item = found.get((location_type, location_id))
+            results.append({
+                'id': location_id,
+                'type': location_type,
+                'found': item is not None,
+                'nom': item['nom'] if item else None,
+                'bounds': item['bounds'] if item else None,
+                'center': item['center'] if item else None,
+            })
+
+        bounds = AdminBounds.combined_extent([result['bounds'] for result in results])
+        center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2] if bounds else None
+        return Response({
+            'success': True,
+            'bounds': bounds,
+            'center': center,
+            'locations': results,
+            'not_found': [
+                {'type': result['type'], 'id': result['id']} for result in results if not result['found']
+            ],
+        })
+
+
+@method_decorator(watermark_etag(ADMIN_TABLES), name='get')
+class AdminBoundariesAPIView(APIView):
+    """
+    Contours simplifiés des régions / préfectures / communes en TopoJSON
+    (frontières partagées par les voisins encodées une seule fois).
+
+    Paramètres:
+    - levels=regions,prefectures,communes (défaut: tous)
+    - resolution=1..3 ou zoom=<niveau> (défaut: résolution la plus fine)
+    """
+
+    def get(self, request):
+        levels_param = request.GET.get('levels', '')
+        levels = [level.strip() for level in levels_param.split(',') if level.strip()] or list(BOUNDARY_LEVELS)
+        unknown = [level for level in levels if level not in BOUNDARY_LEVELS]
+        if unknown:
+            return Response({
+                'success': False,
+                'error': f"Niveaux inconnus: {', '.join(unknown)}",
+                'available_levels': list(BOUNDARY_LEVELS),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        resolutions = [resolution for resolution, _max_zoom, _tolerance in BOUNDARY_RESOLUTIONS]
+        resolution_param = request.GET.get('resolution')
+        if resolution_param:
+            try:
+                resolution = int(resolution_param)
+            except ValueError:
+                resolution = None
+            if resolution not in resolutions:
+                return Response({
+                    'success': False,
+                    'error': f"resolution invalide ({', '.join(map(str, resolutions))})",
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            zoom, zoom_error = parse_zoom(request.GET.get('zoom'))
+            if zoom_error:
+                return Response({'success': False, 'error': zoom_error}, status=status.HTTP_400_BAD_REQUEST)
+            resolution = resolution_for_zoom(zoom)
+
         try:
-            extent = geometry.extent  # [minLng, minLat, maxLng, maxLat]
-            return extent
-        except:
-            return None
-    
-    def _get_geometry_center(self, geometry):
-        """Calculer le centre pour zoom automatique"""
-        if not geometry:
-            return None
-        
+            content = AdminBoundaries(levels, resolution).fetch()
+        except Exception as e:
+            logger.exception("Erreur calcul des contours administratifs")
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class LocateAPIView(APIView):
+    """
+    Géocodage inverse: commune, préfecture et région contenant un point WGS84,
+    depuis l'index en mémoire des communes (pas de requête par point).
+
+    GET  /api/geography/locate/?x=<lng>&y=<lat>
+    POST /api/geography/locate/ {"points": [[x, y], {"x": x, "y": y}, ...]}
+         -> résultats dans l'ordre des points (null hors des communes)
+    """
+
+    def get(self, request):
+        x = request.GET.get('x')
+        y = request.GET.get('y')
+        valid, error = validate_coordinates(x, y)
+        if not valid:
+            return Response({'success': False, 'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        location = CommuneLocator.locate(float(x), float(y))
+        return Response({
+            'success': True,
+            'x': float(x),
+            'y': float(y),
+            'found': location is not None,
+            'location': location,
+        })
+
+    def post(self, request):
+        points = request.data.get('points') if isinstance(request.data, dict) else None
+        if not isinstance(points, list):
+            return Response({
+                'success': False,
+                'error': 'Liste "points" requise: [[x, y], ...] ou [{"x": x, "y": y}, ...]'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > MAX_LOCATE_POINTS:
+            return Response({
+                'success': False,
+                'error': f"Au plus {MAX_LOCATE_POINTS} points par requête"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        xs, ys = [], []
+        for position, point in enumerate(points):
+            try:
+                if isinstance(point, dict):
+                    x, y = float(point['x']), float(point['y'])
+                else:
+                    x, y = (float(value) for value in point)
+            except (KeyError, TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'error': f"Point {position} invalide"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            xs.append(x)
+            ys.append(y)
+
+        locations = CommuneLocator.locate_many(xs, ys)
+        return Response({
+            'success': True,
+            'total': len(locations),
+            'found': sum(1 for location in locations if location is not None),
+            'results': locations,
+        })
+
+
+class GeographySearchAPIView(APIView):
+    """
+    Autocomplétion des noms de régions, préfectures et communes, insensible
+    aux accents et à la casse ("kerouane" trouve "Kérouané").
+    Classement: nom exact, début du nom, début d'un mot, sous-chaîne.
+
+    GET /api/geography/search/?q=<texte>&types=commune,prefecture,region&limit=20
+    """
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        if len(query) < 2:
+            return Response({
+                'success': True,
+                'results': [],
+                'message': 'Tapez au moins 2 caractères'
+            })
+
+        types_param = request.GET.get('types', '')
+        types = {value.strip() for value in types_param.split(',') if value.strip()}
+        unknown = sorted(types - set(ADMIN_LEVELS))
+        if unknown:
+            return Response({
+                'success': False,
+                'error': f"Types inconnus: {', '.join(unknown)}",
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            centroid = geometry.centroid
-            return [centroid.x, centroid.y]
-        except:
-            return Nones # type: ignore
\ No newline at end of file
+            limit = int(request.GET.get('limit', DEFAULT_SEARCH_LIMIT))
+        except ValueError:
+            limit = DEFAULT_SEARCH_LIMIT
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+        results = AdminNameSearch.search(query, types=types or None, limit=limit)
+        return Response({
+            'success': True,
+            'results': results,
+            'total': len(results),
+        })
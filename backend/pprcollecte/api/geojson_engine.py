@@ -0,0 +1,494 @@
+# geojson_engine.py - Construction des FeatureCollections directement dans PostGIS
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings # type: ignore
+from django.db import connection # type: ignore
+
+from .generalisation import GENERALISED_LAYERS, level_for_zoom
+from .conditional import get_table_versions
+from .delta_sync import CursorError
+from .layer_cache import LayerCache
+from .models import GeometrieGeneralisee
+from .point_union import PointInfrastructureUnion
+from .spatial_utils import CommuneScope, InfrastructureLayers, precision_for_zoom
+
+
+# Nombre de lignes lues par aller-retour sur le curseur serveur
+STREAM_CHUNK_SIZE = 2000
+
+COLLECTION_HEAD = '{"type": "FeatureCollection", "features": ['
+
+
+class GeoJSONEngine:
+    """
+    Construit le GeoJSON des couches d'infrastructures en SQL
+    (json_build_object + ST_AsGeoJSON + json_agg), une requête par couche.
+    Python ne fait que concaténer les fragments texte renvoyés par la base.
+    """
+
+    def __init__(self, commune_scope=None, bbox=None, zoom=None, feature_ids=None, precision=None,
+                 cluster_cell=None):
+        # Filtre hiérarchique (CommuneScope), appliqué en sous-requête SQL
+        self.commune_scope = commune_scope or CommuneScope()
+        # (minx, miny, maxx, maxy) en WGS84, filtre "geom && enveloppe" (index GiST)
+        self.bbox = bbox
+        # Niveau de généralisation des couches linéaires (None = pleine résolution)
+        self.zoom = zoom
+        self.generalisation_level = level_for_zoom(zoom)
+        # Décimales des coordonnées publiées (déduites du zoom si non précisées)
+        self.precision = precision if precision is not None else precision_for_zoom(zoom)
+        # Côté en degrés de la grille de regroupement des couches ponctuelles (None = pas de regroupement)
+        self.cluster_cell = cluster_cell
+        # {type_name: [ids]} pour ne lire que certains objets (synchronisation incrémentale)
+        self.feature_ids = feature_ids
+        # {type_name: {'count', 'ms', 'cached'}} rempli par fetch_features
+        self.layer_timings = {}
+
+    def where_sql(self, type_name):
+        """Conditions WHERE (liste) et paramètres pour une couche, alias de table "t" """
+        model = InfrastructureLayers.get_model(type_name)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+        srid = InfrastructureLayers.geom_srid(model)
+
+        where = ['t.geom IS NOT NULL', 'NOT ST_IsEmpty(t.geom)']
+        params = []
+        if self.feature_ids is not None:
+            where.append(f't.{pk} = ANY(%s)')
+            params.append(list(self.feature_ids.get(type_name, [])))
+        scope_condition, scope_params = self.commune_scope.sql(f't.{commune_col}')
+        if scope_condition:
+            where.append(scope_condition)
+            params.extend(scope_params)
+        if self.bbox is not None:
+            where.append(f't.geom && ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 4326), {srid})')
+            params.extend(self.bbox)
+        return where, params
+
+    def geometry_sql(self, type_name):
+        """
+        Expression de la géométrie WGS84 à publier, avec la jointure éventuelle
+        vers les géométries généralisées: (expression, jointure, paramètres)
+        """
+        if self.generalisation_level is None or type_name not in GENERALISED_LAYERS:
+            return 'ST_Transform(t.geom, 4326)', '', []
+
+        pk = InfrastructureLayers.pk_column(InfrastructureLayers.get_model(type_name))
+        join = f"""
+            LEFT JOIN {GeometrieGeneralisee._meta.db_table} g
+                ON g.layer = %s AND g.feature_id = t.{pk} AND g.niveau = %s
+        """
+        return 'COALESCE(g.geom, ST_Transform(t.geom, 4326))', join, [type_name, self.generalisation_level]
+
+    def feature_sql(self, type_name):
+        """SELECT d'une Feature GeoJSON (json) par ligne de la couche"""
+        if self.cluster_cell is not None and type_name in InfrastructureLayers.POINT_MODELS:
+            return self.cluster_sql(type_name)
+
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+
+        properties = [
+            f"'{pk}', t.{pk}",
+            "'type', %s",
+            f"'commune_id', t.{commune_col}",
+        ]
+        properties += [
+            f"'{column}', t.{column}" for column in InfrastructureLayers.extra_columns(type_name)
+        ]
+
+        geometry, join, join_params = self.geometry_sql(type_name)
+        where, where_params = self.where_sql(type_name)
+        params = [f"{InfrastructureLayers.feature_id_prefix(type_name)}_", type_name]
+        params += join_params + where_params
+
+        sql = f"""
+            SELECT json_build_object(
+                'type', 'Feature',
+                'id', %s || t.{pk},
+                'geometry', ST_AsGeoJSON({geometry}, {int(self.precision)})::json,
+                'properties', json_build_object({', '.join(properties)})
+            ) AS feature,
+            t.{pk} AS pk
+            FROM {table} t
+            {join}
+            WHERE {' AND '.join(where)}
+        """
+        return sql, params
+
+    def cluster_sql(self, type_name):
+        """
+        SELECT d'une Feature par cellule de grille occupée: centroïde des points
+        de la cellule et point_count. Une cellule à un seul point garde l'id de l'objet.
+        """
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+
+        geometry, join, join_params = self.geometry_sql(type_name)
+        where, where_params = self.where_sql(type_name)
+        cell = repr(float(self.cluster_cell))
+        prefix = InfrastructureLayers.feature_id_prefix(type_name)
+        params = [f"{prefix}_", f"{prefix}_cluster_", type_name]
+        params += join_params + where_params
+
+        sql = f"""
+            SELECT json_build_object(
+                'type', 'Feature',
+                'id', CASE WHEN count(*) = 1 THEN %s || min(c.pk) ELSE %s || c.cx || '_' || c.cy END,
+                'geometry', ST_AsGeoJSON(ST_Centroid(ST_Collect(c.geom)), {int(self.precision)})::json,
+                'properties', json_build_object(
+                    'type', %s,
+                    'cluster', count(*) > 1,
+                    'point_count', count(*),
+                    '{pk}', CASE WHEN count(*) = 1 THEN min(c.pk) END,
+                    'commune_id', CASE WHEN count(DISTINCT c.commune_id) = 1 THEN min(c.commune_id) END
+                )
+            ) AS feature
+            FROM (
+                SELECT p.geom, p.pk, p.commune_id,
+                       floor(ST_X(ST_Centroid(p.geom)) / {cell})::bigint AS cx,
+                       floor(ST_Y(ST_Centroid(p.geom)) / {cell})::bigint AS cy
+                FROM (
+                    SELECT {geometry} AS geom, t.{pk} AS pk, t.{commune_col} AS commune_id
+                    FROM {table} t
+                    {join}
+                    WHERE {' AND '.join(where)}
+                ) p
+            ) c
+            GROUP BY c.cx, c.cy
+        """
+        return sql, params
+
+    def layer_sql(self, type_name):
+        """Tableau JSON des Features de la couche + nombre de features"""
+        feature_sql, params = self.feature_sql(type_name)
+        sql = f"""
+            SELECT count(*), COALESCE(json_agg(f.feature), '[]'::json)::text
+            FROM ({feature_sql}) f
+        """
+        return sql, params
+
+    def row_sql(self, type_name):
+        """
+        Ligne à schéma commun à toutes les couches (géométrie WGS84, id, fid, type,
+        commune_id et propriétés supplémentaires) pour les encodeurs binaires PostGIS.
+        Les coordonnées sont arrondies sur la grille décimale de self.precision.
+        """
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+        own_extras = InfrastructureLayers.extra_columns(type_name)
+
+        extras = ''.join(
+            f", t.{column}::text AS {column}" if column in own_extras else f", NULL::text AS {column}"
+            for column in InfrastructureLayers.all_extra_columns()
+        )
+
+        geometry, join, join_params = self.geometry_sql(type_name)
+        where, where_params = self.where_sql(type_name)
+        params = [f"{InfrastructureLayers.feature_id_prefix(type_name)}_", type_name]
+        params += join_params + where_params
+
+        sql = f"""
+            SELECT ST_SnapToGrid({geometry}, {10.0 ** -int(self.precision)!r}) AS geom,
+                   %s || t.{pk} AS id,
+                   t.{pk}::bigint AS fid,
+                   %s::text AS type,
+                   t.{commune_col}::bigint AS commune_id{extras}
+            FROM {table} t
+            {join}
+            WHERE {' AND '.join(where)}
+        """
+        return sql, params
+
+    def fetch_binary(self, type_names, output_format):
+        """Toutes les couches encodées en une seule requête: 'fgb' ou 'geobuf'"""
+        if not type_names:
+            return b''
+        parts = [self.row_sql(type_name) for type_name in type_names]
+        union_sql = ' UNION ALL '.join(f"({sql})" for sql, _params in parts)
+        params = [param for _sql, layer_params in parts for param in layer_params]
+
+        if output_format == 'fgb':
+            aggregate = "ST_AsFlatGeobuf(q, true, 'geom')"
+        elif output_format == 'geobuf':
+            aggregate = "ST_AsGeobuf(q, 'geom')"
+        else:
+            raise ValueError(f"Format binaire inconnu: {output_format}")
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {aggregate} FROM ({union_sql}) q", params)
+            row = cursor.fetchone()
+        return bytes(row[0]) if row and row[0] else b''
+
+    def matching_ids(self, type_name):
+        """Identifiants de la couche qui satisfont les filtres courants"""
+        model = InfrastructureLayers.get_model(type_name)
+        pk = InfrastructureLayers.pk_column(model)
+        where, params = self.where_sql(type_name)
+        sql = f"SELECT t.{pk} FROM {InfrastructureLayers.table(model)} t WHERE {' AND '.join(where)}"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def fetch_layer(self, cursor, type_name):
+        sql, params = self.layer_sql(type_name)
+        cursor.execute(sql, params)
+        count, features = cursor.fetchone()
+        return count, features
+
+    def points_sql(self, type_names):
+        """
+        Features de plusieurs couches ponctuelles en un seul aller-retour
+        (UNION ALL des tables, agrégé par type): (type, count, tableau JSON)
+        """
+        union_sql, params = PointInfrastructureUnion.union_sql(
+            type_names, columns=['fid', 'geom', 'commune_id'], where_for=self.where_sql,
+        )
+        sql = f"""
+            SELECT u.type, count(*), json_agg(json_build_object(
+                'type', 'Feature',
+                'id', u.type || '_' || u.fid,
+                'geometry', ST_AsGeoJSON(ST_Transform(u.geom, 4326), {int(self.precision)})::json,
+                'properties', json_build_object('fid', u.fid, 'type', u.type, 'commune_id', u.commune_id)
+            ))::text
+            FROM ({union_sql}) u
+            GROUP BY u.type
+        """
+        return sql, params
+
+    def _timed_layer(self, cursor, type_name):
+        start = time.perf_counter()
+        count, features = self.fetch_layer(cursor, type_name)
+        return count, features[1:-1], (time.perf_counter() - start) * 1000
+
+    def _timed_points(self, cursor, type_names):
+        """Couches ponctuelles lues ensemble: elles partagent le temps de la requête"""
+        start = time.perf_counter()
+        sql, params = self.points_sql(type_names)
+        cursor.execute(sql, params)
+        rows = {type_name: (count, features) for type_name, count, features in cursor.fetchall()}
+        ms = (time.perf_counter() - start) * 1000
+        computed = {}
+        for type_name in type_names:
+            count, features = rows.get(type_name, (0, '[]'))
+            computed[type_name] = (count, features[1:-1], ms)
+        return computed
+
+    def _run_job(self, cursor, job, computed):
+        if len(job) == 1:
+            computed[job[0]] = self._timed_layer(cursor, job[0])
+        else:
+            computed.update(self._timed_points(cursor, job))
+
+    def _fetch_worker(self, pending, computed):
+        """
+        Thread de chargement: vide la file de travaux avec sa propre connexion
+        (les connexions Django sont par thread), fermée en fin de travail
+        """
+        try:
+            with connection.cursor() as cursor:
+                while True:
+                    try:
+                        job = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    self._run_job(cursor, job, computed)
+        finally:
+            connection.close()
+
+    def fetch_jobs(self, type_names):
+        """
+        Découpage en travaux: toutes les couches ponctuelles en une requête UNION ALL
+        (sauf en mode regroupé, propre à chaque couche), une requête par couche linéaire
+        """
+        points = [type_name for type_name in type_names if type_name in InfrastructureLayers.POINT_MODELS]
+        if self.cluster_cell is not None or len(points) < 2:
+            return [[type_name] for type_name in type_names]
+        return [points] + [[type_name] for type_name in type_names if type_name not in points]
+
+    def fetch_layers(self, type_names):
+        """
+        Requêtes des couches réparties sur un pool borné (COLLECTES_MAX_WORKERS),
+        une nouvelle connexion par thread: voir le coût dans settings.
+        Retourne {type_name: (count, fragment, ms)}; l'ordre est fixé par l'appelant.
+        """
+        computed = {}
+        jobs = self.fetch_jobs(type_names)
+        workers = min(getattr(settings, 'COLLECTES_MAX_WORKERS', 1), len(jobs))
+        if workers <= 1:
+            with connection.cursor() as cursor:
+                for job in jobs:
+                    self._run_job(cursor, job, computed)
+            return computed
+
+        pending = queue.SimpleQueue()
+        for job in jobs:
+            pending.put(job)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._fetch_worker, pending, computed) for _ in range(workers)]
+            for future in futures:
+                # Propage la première erreur SQL rencontrée
+                future.result()
+        return computed
+
+    def fetch_page(self, type_names, page_size, after=None):
+        """
+        Page de features triées par (type dans l'ordre du registre, clé primaire),
+        reprise après after = (type_name, id) sans OFFSET.
+        Retourne (fragments, total, dernière position (type_name, id) ou None si fin).
+        Lève CursorError si after désigne une couche absente de type_names.
+        """
+        registry = list(InfrastructureLayers.all_models())
+        start_rank = -1
+        if after:
+            if after[0] not in type_names:
+                raise CursorError("Curseur de page invalide pour les couches demandées")
+            start_rank = registry.index(after[0])
+
+        fragments = []
+        total = 0
+        last = None
+        with connection.cursor() as cursor:
+            for type_name in type_names:
+                rank = registry.index(type_name)
+                if rank < start_rank:
+                    continue
+                remaining = page_size - total
+                feature_sql, params = self.feature_sql(type_name)
+                sql = f"SELECT f.pk, f.feature::text FROM ({feature_sql}) f"
+                if after and rank == start_rank:
+                    sql += " WHERE f.pk > %s"
+                    params = params + [after[1]]
+                sql += " ORDER BY f.pk LIMIT %s"
+                # Une ligne de plus que la place restante pour savoir s'il reste une page
+                cursor.execute(sql, params + [remaining + 1])
+                rows = cursor.fetchall()
+                page_rows = rows[:remaining]
+                if page_rows:
+                    fragments.append(','.join(row[1] for row in page_rows))
+                    total += len(page_rows)
+                    last = (type_name, page_rows[-1][0])
+                if len(rows) > remaining:
+                    return fragments, total, last
+        return fragments, total, None
+
+    def cache_filters(self):
+        """Filtres effectifs normalisés, utilisés comme clé du cache par couche"""
+        return {
+            'communes': self.commune_scope.cache_key(),
+            'bbox': [round(value, 6) for value in self.bbox] if self.bbox else None,
+            'generalisation_level': self.generalisation_level,
+            'precision': self.precision,
+            'cluster_cell': self.cluster_cell,
+        }
+
+    def fetch_features(self, type_names, use_cache=True):
+        """
+        Fragments JSON des couches demandées (sans crochets) et nombre total.
+        Les couches déjà en cache pour ces filtres ne sont pas requêtées.
+        """
+        layers = {}
+        generations = {}
+        digest = LayerCache.filters_digest(self.cache_filters())
+        if use_cache:
+            # Les versions de tables couvrent aussi les écritures faites hors API
+            tables = {
+                type_name: InfrastructureLayers.table(InfrastructureLayers.get_model(type_name))
+                for type_name in type_names
+            }
+            generalised_table = GeometrieGeneralisee._meta.db_table
+            versions = get_table_versions(list(tables.values()) + [generalised_table])
+            generations = {
+                type_name: f"{generation}.{versions[tables[type_name]]}"
+                for type_name, generation in LayerCache.generations(type_names).items()
+            }
+            if self.generalisation_level is not None:
+                for type_name in generations:
+                    if type_name in GENERALISED_LAYERS:
+                        generations[type_name] += f".{versions[generalised_table]}"
+            layers = LayerCache.get_layers(type_names, generations, digest)
+
+        self.layer_timings = {
+            type_name: {'count': layers[type_name][0], 'ms': 0.0, 'cached': True}
+            for type_name in layers
+        }
+        missing = [type_name for type_name in type_names if type_name not in layers]
+        if missing:
+            # Fragments sans les crochets du tableau json_agg pour fusionner les couches
+            computed = {}
+            for type_name, (count, fragment, ms) in self.fetch_layers(missing).items():
+                computed[type_name] = (count, fragment)
+                self.layer_timings[type_name] = {'count': count, 'ms': round(ms, 1), 'cached': False}
+            if use_cache:
+                LayerCache.set_layers(computed, generations, digest)
+            layers.update(computed)
+
+        # Fusion dans l'ordre du registre, quel que soit l'ordre de fin des threads
+        fragments = []
+        total = 0
+        for type_name in type_names:
+            count, fragment = layers[type_name]
+            if count:
+                fragments.append(fragment)
+                total += count
+        return fragments, total
+
+    @staticmethod
+    def collection_tail(total, metadata=None):
+        """Fin de FeatureCollection: fermeture de "features", "total" puis metadata"""
+        parts = ['], "total": ', str(total)]
+        for key, value in (metadata or {}).items():
+            parts.append(f', {json.dumps(key)}: {json.dumps(value, default=str)}')
+        parts.append('}')
+        return ''.join(parts)
+
+    @classmethod
+    def render_collection(cls, fragments, total, metadata=None):
+        """
+        FeatureCollection complète (bytes) à partir des fragments.
+        metadata est ajouté à la suite de "features" et "total".
+        """
+        body = COLLECTION_HEAD + ','.join(fragments) + cls.collection_tail(total, metadata)
+        return body.encode('utf-8')
+
+    def iter_feature_chunks(self, type_names, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Parcourt les Features couche par couche avec un curseur côté serveur
+        et produit des listes de Features (texte JSON) d'au plus chunk_size éléments.
+        """
+        for type_name in type_names:
+            feature_sql, params = self.feature_sql(type_name)
+            with connection.chunked_cursor() as cursor:
+                cursor.execute(f"SELECT f.feature::text FROM ({feature_sql}) f", params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield [row[0] for row in rows]
+
+    def stream_ndjson(self, type_names):
+        """Flux NDJSON: une Feature par ligne"""
+        for chunk in self.iter_feature_chunks(type_names):
+            yield ('\n'.join(chunk) + '\n').encode('utf-8')
+
+    def stream_collection(self, type_names, metadata=None):
+        """
+        Flux FeatureCollection: l'en-tête, les Features par paquets puis
+        "total" et metadata une fois toutes les couches parcourues.
+        """
+        yield COLLECTION_HEAD.encode('utf-8')
+        total = 0
+        for chunk in self.iter_feature_chunks(type_names):
+            prefix = ',' if total else ''
+            total += len(chunk)
+            yield (prefix + ','.join(chunk)).encode('utf-8')
+        yield self.collection_tail(total, metadata).encode('utf-8')
@@ -0,0 +1,78 @@
+# horodatages.py - Conversion des dates texte des infrastructures en colonnes timestamptz
+from django.db import connection, transaction # type: ignore
+
+from .conditional import bump_table_version, change_tracking_disabled
+from .models import HorodatageConverti
+from .spatial_utils import InfrastructureLayers
+
+# Colonne texte -> copie timestamptz (trigger et index: migration 0013)
+SHADOW_COLUMNS = {
+    'created_at': 'created_at_ts',
+    'updated_at': 'updated_at_ts',
+}
+
+# Lignes traitées par transaction lors de la conversion en masse
+DEFAULT_BATCH_SIZE = 5000
+
+
+def timestamped_types():
+    """Couches dont les dates sont stockées en texte (toutes sauf pistes)"""
+    return [
+        type_name for type_name, model in InfrastructureLayers.all_models().items()
+        if issubclass(model, HorodatageConverti)
+    ]
+
+
+class TimestampBackfill:
+    """
+    Remplit created_at_ts / updated_at_ts des lignes antérieures au trigger,
+    par tranches de clé primaire (une transaction par tranche). Même conversion
+    que le trigger (fonction SQL parse_horodatage_texte); relancer ne réécrit
+    que les lignes dont la copie diffère.
+    Les copies ne sont pas des changements métier: journal et compteurs de
+    version sont coupés pendant les lots, la version de la table est incrémentée
+    une seule fois à la fin pour invalider les ETags.
+    """
+
+    @staticmethod
+    def _backfill_sql(type_name, id_range):
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+
+        assignments = ', '.join(
+            f"{shadow} = parse_horodatage_texte(t.{source})" for source, shadow in SHADOW_COLUMNS.items()
+        )
+        differs = ' OR '.join(
+            f"t.{shadow} IS DISTINCT FROM parse_horodatage_texte(t.{source})"
+            for source, shadow in SHADOW_COLUMNS.items()
+        )
+        sql = f"""
+            UPDATE {table} t
+            SET {assignments}
+            WHERE t.{pk} >= %s AND t.{pk} < %s
+              AND ({differs})
+        """
+        return sql, list(id_range)
+
+    @classmethod
+    def backfill(cls, type_name, batch_size=DEFAULT_BATCH_SIZE):
+        """Nombre de lignes mises à jour pour la couche"""
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT min({pk}), max({pk}) FROM {table}")
+            min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return 0
+
+        updated = 0
+        for start in range(min_id, max_id + 1, batch_size):
+            sql, params = cls._backfill_sql(type_name, (start, start + batch_size))
+            with transaction.atomic(), connection.cursor() as cursor, change_tracking_disabled(cursor):
+                cursor.execute(sql, params)
+                updated += cursor.rowcount
+        if updated:
+            bump_table_version(table)
+        return updated
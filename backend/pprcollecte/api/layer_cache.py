@@ -0,0 +1,84 @@
+# layer_cache.py - Cache serveur des couches GeoJSON, par couche et par filtres
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings # type: ignore
+from django.core.cache import caches # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class LayerCache:
+    """
+    Cache des fragments GeoJSON d'une couche pour un jeu de filtres normalisé.
+
+    Chaque couche a un numéro de génération inclus dans ses clés:
+    invalider une couche revient à incrémenter sa génération, les anciennes
+    entrées ne sont plus jamais lues et expirent d'elles-mêmes.
+    Le backend est choisi par settings.COLLECTES_CACHE_ALIAS (locmem, fichier, redis...).
+    """
+    PREFIX = 'collectes'
+
+    @staticmethod
+    def backend():
+        return caches[getattr(settings, 'COLLECTES_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def timeout():
+        return getattr(settings, 'COLLECTES_CACHE_TIMEOUT', 3600)
+
+    @classmethod
+    def _generation_key(cls, type_name):
+        return f"{cls.PREFIX}:{type_name}:generation"
+
+    @classmethod
+    def generations(cls, type_names):
+        """Génération courante de chaque couche (une seule lecture du cache)"""
+        keys = {cls._generation_key(type_name): type_name for type_name in type_names}
+        found = cls.backend().get_many(list(keys))
+        return {type_name: found.get(key, 0) for key, type_name in keys.items()}
+
+    @staticmethod
+    def filters_digest(filters):
+        """Empreinte stable des filtres (dict JSON-sérialisable, clés triées)"""
+        normalized = json.dumps(filters, sort_keys=True, default=str)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def make_key(cls, type_name, generation, digest):
+        return f"{cls.PREFIX}:{type_name}:g{generation}:{digest}"
+
+    @classmethod
+    def get_layers(cls, type_names, generations, digest):
+        """Entrées en cache {type_name: valeur} pour les couches demandées"""
+        keys = {
+            cls.make_key(type_name, generations[type_name], digest): type_name
+            for type_name in type_names
+        }
+        found = cls.backend().get_many(list(keys))
+        return {keys[key]: value for key, value in found.items()}
+
+    @classmethod
+    def set_layers(cls, values, generations, digest):
+        cls.backend().set_many(
+            {
+                cls.make_key(type_name, generations[type_name], digest): value
+                for type_name, value in values.items()
+            },
+            timeout=cls.timeout(),
+        )
+
+    @classmethod
+    def invalidate(cls, type_name):
+        """Écriture sur une couche: seules les entrées de cette couche sont évincées"""
+        cache = cls.backend()
+        key = cls._generation_key(type_name)
+        try:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+        except Exception as e:
+            logger.warning("Erreur invalidation cache %s: %s", type_name, e)
+            # Génération inédite pour ne jamais relire d'anciennes entrées
+            cache.set(key, time.time_ns(), timeout=None)
@@ -0,0 +1,102 @@
+# locator.py - Géocodage inverse (commune / préfecture / région d'un point) en mémoire
+import logging
+import time
+
+import numpy as np # type: ignore
+import shapely # type: ignore
+from shapely import STRtree # type: ignore
+
+from django.db import connection # type: ignore
+
+from .admin_units import AdminMemoryIndex
+from .models import CommuneRurale, Prefecture, Region
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de points par requête groupée
+MAX_LOCATE_POINTS = 10000
+
+
+class CommuneIndex:
+    """
+    Géométries préparées des communes (shapely) dans un STRtree: le filtre par
+    emprise puis le test point-dans-polygone se font sans aller-retour base.
+    Les communes sont triées par id: sur une frontière, la plus petite l'emporte.
+    """
+
+    def __init__(self, units, geometries, versions):
+        self.units = units
+        self.geometries = geometries
+        self.versions = versions
+        self.checked_at = time.monotonic()
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+    @staticmethod
+    def sql():
+        communes = CommuneRurale._meta.db_table
+        prefectures = Prefecture._meta.db_table
+        regions = Region._meta.db_table
+        commune_prefecture = CommuneRurale._meta.get_field('prefectures_id').column
+        prefecture_region = Prefecture._meta.get_field('regions_id').column
+        return f"""
+            SELECT c.id, c.nom, p.id, p.nom, r.id, r.nom, ST_AsBinary(c.geom)
+            FROM {communes} c
+            LEFT JOIN {prefectures} p ON p.id = c.{commune_prefecture}
+            LEFT JOIN {regions} r ON r.id = p.{prefecture_region}
+            WHERE c.geom IS NOT NULL AND NOT ST_IsEmpty(c.geom)
+            ORDER BY c.id
+        """
+
+    @classmethod
+    def load(cls, versions):
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(cls.sql())
+            rows = cursor.fetchall()
+
+        units = []
+        for commune_id, commune_nom, prefecture_id, prefecture_nom, region_id, region_nom, _wkb in rows:
+            units.append({
+                'commune': {'id': commune_id, 'nom': commune_nom},
+                'prefecture': {'id': prefecture_id, 'nom': prefecture_nom} if prefecture_id is not None else None,
+                'region': {'id': region_id, 'nom': region_nom} if region_id is not None else None,
+            })
+        geometries = shapely.from_wkb([bytes(row[6]) for row in rows])
+        index = cls(units, geometries, versions)
+        logger.info(
+            "index des communes chargé: %s communes en %.0f ms",
+            len(units), (time.perf_counter() - start) * 1000,
+        )
+        return index
+
+    def locate_many(self, xs, ys):
+        """Unité administrative de chaque point (None hors des communes)"""
+        points = shapely.points(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        results = [None] * len(points)
+        if not len(points) or not len(self.geometries):
+            return results
+
+        # Candidats par emprise, puis test exact sur les géométries préparées
+        point_idx, commune_idx = self.tree.query(points)
+        hits = shapely.intersects(self.geometries[commune_idx], points[point_idx])
+        best = {}
+        for i, j in zip(point_idx[hits].tolist(), commune_idx[hits].tolist()):
+            if i not in best or j < best[i]:
+                best[i] = j
+        for i, j in best.items():
+            results[i] = self.units[j]
+        return results
+
+
+class CommuneLocator(AdminMemoryIndex):
+    """Index des communes partagé par le processus (voir AdminMemoryIndex)"""
+    index_class = CommuneIndex
+
+    @classmethod
+    def locate(cls, x, y):
+        return cls.index().locate_many([x], [y])[0]
+
+    @classmethod
+    def locate_many(cls, xs, ys):
+        return cls.index().locate_many(xs, ys)
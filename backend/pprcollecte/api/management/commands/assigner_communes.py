@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError # type: ignore
+
+from api.commune_assignment import DEFAULT_BATCH_SIZE, CommuneAssigner
+from api.layer_cache import LayerCache
+from api.spatial_utils import InfrastructureLayers
+
+
+class Command(BaseCommand):
+    help = "Renseigne la commune des infrastructures à partir de leur géométrie (jointure spatiale)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='types',
+            help="Couche à traiter (répétable). Défaut: toutes les couches",
+        )
+        parser.add_argument(
+            '--tous',
+            action='store_true',
+            help="Recalculer aussi les objets qui ont déjà une commune",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Plage d'identifiants traitée par transaction (défaut: {DEFAULT_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            '--reconstruire-index',
+            action='store_true',
+            help="Reconstruire d'abord le découpage des communes (communes_decoupees)",
+        )
+
+    def handle(self, *args, **options):
+        type_names = options['types'] or list(InfrastructureLayers.all_models())
+        unknown = [type_name for type_name in type_names if InfrastructureLayers.get_model(type_name) is None]
+        if unknown:
+            raise CommandError(f"Couches inconnues: {', '.join(unknown)}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        if options['reconstruire_index']:
+            pieces = CommuneAssigner.rebuild_index()
+            self.stdout.write(f"Découpage des communes: {pieces} morceaux")
+
+        for type_name in type_names:
+            start = time.perf_counter()
+            updated = CommuneAssigner.assign(
+                type_name, overwrite=options['tous'], batch_size=options['batch_size'],
+            )
+            elapsed = time.perf_counter() - start
+            if updated:
+                LayerCache.invalidate(type_name)
+            rate = updated / elapsed if elapsed > 0 else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"{type_name}: {updated} objets rattachés en {elapsed:.1f} s ({rate:.0f}/s)"
+            ))
@@ -0,0 +1,69 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError # type: ignore
+
+from api.geojson_engine import GeoJSONEngine
+from api.spatial_utils import MAX_PRECISION, InfrastructureLayers, parse_bbox, parse_zoom
+
+
+class Command(BaseCommand):
+    help = ("Compare temps d'encodage et taille des formats GeoJSON, FlatGeobuf et Geobuf, "
+            "pour plusieurs précisions de coordonnées")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', action='append', dest='types',
+                            help="Couche à inclure (répétable). Défaut: toutes")
+        parser.add_argument('--bbox', help="minx,miny,maxx,maxy en WGS84")
+        parser.add_argument('--zoom', help="Niveau de zoom (généralisation des couches linéaires)")
+        parser.add_argument('--precision', action='append', type=int, dest='precisions',
+                            help="Décimales à mesurer (répétable). Défaut: 9, 6, 5, 4")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Nombre de mesures par format (meilleur temps retenu)")
+
+    def handle(self, *args, **options):
+        bbox, bbox_error = parse_bbox(options['bbox'])
+        zoom, zoom_error = parse_zoom(options['zoom'])
+        if bbox_error or zoom_error:
+            raise CommandError(bbox_error or zoom_error)
+
+        types = options['types'] or []
+        unknown = [type_name for type_name in types if type_name not in InfrastructureLayers.all_models()]
+        if unknown:
+            raise CommandError(f"Couches inconnues: {', '.join(unknown)}")
+        type_names = InfrastructureLayers.selected_types(types)
+        precisions = options['precisions'] or [MAX_PRECISION, 6, 5, 4]
+        if any(not (0 <= precision <= MAX_PRECISION) for precision in precisions):
+            raise CommandError(f"precision hors limites (0-{MAX_PRECISION})")
+
+        self.stdout.write(
+            f"{'format':<10}{'precision':>10}{'temps (ms)':>12}{'octets':>14}{'gzip':>14}{'ratio':>8}"
+        )
+        # Référence: GeoJSON à pleine précision (première mesure)
+        reference = None
+        for precision in precisions:
+            engine = GeoJSONEngine(bbox=bbox, zoom=zoom, precision=precision)
+
+            def encode_geojson():
+                fragments, total = engine.fetch_features(type_names, use_cache=False)
+                return engine.render_collection(fragments, total, {})
+
+            encoders = [
+                ('geojson', encode_geojson),
+                ('fgb', lambda: engine.fetch_binary(type_names, 'fgb')),
+                ('geobuf', lambda: engine.fetch_binary(type_names, 'geobuf')),
+            ]
+            for name, encode in encoders:
+                best = None
+                for _ in range(max(1, options['repeat'])):
+                    start = time.perf_counter()
+                    payload = encode()
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                compressed = len(gzip.compress(payload))
+                if reference is None:
+                    reference = len(payload) or 1
+                self.stdout.write(
+                    f"{name:<10}{precision:>10}{best * 1000:>12.1f}{len(payload):>14}{compressed:>14}"
+                    f"{len(payload) / reference:>8.2f}"
+                )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError # type: ignore
+
+from api.horodatages import DEFAULT_BATCH_SIZE, TimestampBackfill, timestamped_types
+from api.layer_cache import LayerCache
+
+
+class Command(BaseCommand):
+    help = "Convertit les dates texte (created_at, updated_at) des infrastructures en colonnes timestamptz"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type',
+            action='append',
+            dest='types',
+            help=f"Couche à convertir (répétable). Défaut: {', '.join(timestamped_types())}",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Plage d'identifiants traitée par transaction (défaut: {DEFAULT_BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        available = timestamped_types()
+        type_names = options['types'] or available
+        unknown = [type_name for type_name in type_names if type_name not in available]
+        if unknown:
+            raise CommandError(f"Couches inconnues ou sans dates texte: {', '.join(unknown)}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif")
+
+        for type_name in type_names:
+            start = time.perf_counter()
+            updated = TimestampBackfill.backfill(type_name, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - start
+            if updated:
+                LayerCache.invalidate(type_name)
+            self.stdout.write(self.style.SUCCESS(
+                f"{type_name}: {updated} lignes converties en {elapsed:.1f} s"
+            ))
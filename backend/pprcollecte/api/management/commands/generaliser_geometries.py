@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError # type: ignore
+
+from api.generalisation import GENERALISED_LAYERS, GENERALISATION_LEVELS, GeometryGeneralizer
+
+
+class Command(BaseCommand):
+    help = "Recalcule les géométries linéaires simplifiées par niveau de zoom"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--layer',
+            action='append',
+            dest='layers',
+            help=f"Couche à recalculer (répétable). Défaut: {', '.join(GENERALISED_LAYERS)}",
+        )
+
+    def handle(self, *args, **options):
+        layers = options['layers'] or GENERALISED_LAYERS
+        unknown = [layer for layer in layers if layer not in GENERALISED_LAYERS]
+        if unknown:
+            raise CommandError(f"Couches inconnues: {', '.join(unknown)}")
+
+        levels = ', '.join(f"{niveau}: {tolerance:g} m (zoom <= {max_zoom})"
+                           for niveau, max_zoom, tolerance in GENERALISATION_LEVELS)
+        self.stdout.write(f"Niveaux: {levels}")
+
+        written = GeometryGeneralizer.rebuild(layers)
+        for layer, count in written.items():
+            self.stdout.write(self.style.SUCCESS(f"{layer}: {count} géométries écrites"))
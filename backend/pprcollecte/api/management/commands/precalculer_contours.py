@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError # type: ignore
+
+from api.boundaries import BOUNDARY_LEVELS, BOUNDARY_RESOLUTIONS, AdminBoundaries
+
+
+class Command(BaseCommand):
+    help = "Calcule et met en cache les contours administratifs simplifiés (TopoJSON) de chaque résolution"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--level',
+            action='append',
+            dest='levels',
+            help=f"Niveau à inclure (répétable). Défaut: {', '.join(BOUNDARY_LEVELS)}",
+        )
+
+    def handle(self, *args, **options):
+        levels = options['levels'] or list(BOUNDARY_LEVELS)
+        unknown = [level for level in levels if level not in BOUNDARY_LEVELS]
+        if unknown:
+            raise CommandError(f"Niveaux inconnus: {', '.join(unknown)}")
+
+        # Même clé de cache que l'API sans paramètre levels (tous les niveaux)
+        for resolution, max_zoom, tolerance in BOUNDARY_RESOLUTIONS:
+            start = time.perf_counter()
+            content = AdminBoundaries(levels, resolution).fetch()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f"résolution {resolution} ({tolerance:g} m, zoom <= {max_zoom}): "
+                f"{len(content) / 1024:.0f} Ko en {elapsed:.1f} s"
+            ))
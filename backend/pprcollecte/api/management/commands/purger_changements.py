@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand # type: ignore
+from django.utils import timezone # type: ignore
+
+from django.db.models import Max # type: ignore
+
+from api.delta_sync import DeltaSync
+from api.models import ChangementInfrastructure
+
+
+class Command(BaseCommand):
+    help = ("Supprime les entrées anciennes du journal des changements. "
+            "Les clients dont le curseur est plus ancien recevront 410 et rechargeront tout.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=90, help="Rétention en jours (défaut: 90)")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['jours'])
+        anciens = ChangementInfrastructure.objects.filter(changed_at__lt=limite)
+        dernier_purge = anciens.aggregate(last=Max('id'))['last']
+        if dernier_purge is not None:
+            # Marque enregistrée avant la suppression: un curseur antérieur reçoit 410,
+            # même si le journal se retrouve vide
+            DeltaSync.record_purge(dernier_purge)
+        deleted, _ = ChangementInfrastructure.objects.filter(id__lte=dernier_purge or 0, changed_at__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} changements supprimés (avant {limite:%Y-%m-%d})"))
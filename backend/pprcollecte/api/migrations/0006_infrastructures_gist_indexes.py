@@ -0,0 +1,69 @@
+# Index spatiaux GiST sur les tables non gérées par Django (managed = False)
+# pour que les filtres "geom && ST_MakeEnvelope(...)" restent indexés.
+
+from django.db import migrations
+
+
+SPATIAL_TABLES = [
+    'regions',
+    'prefectures',
+    'communes_rurales',
+    'chaussees',
+    'points_coupures',
+    'points_critiques',
+    'localites',
+    'services_santes',
+    'ponts',
+    'buses',
+    'dalots',
+    'ecoles',
+    'marches',
+    'batiments_administratifs',
+    'infrastructures_hydrauliques',
+    'autres_infrastructures',
+    'bacs',
+    'passages_submersibles',
+]
+
+
+def create_gist_index_sql(table):
+    """Crée l'index seulement si la table existe et n'a pas déjà un index GiST sur geom"""
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                IF NOT EXISTS (
+                    SELECT 1
+                    FROM pg_index i
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    JOIN pg_am am ON am.oid = ic.relam
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+                    WHERE i.indrelid = to_regclass('public.{table}')
+                      AND am.amname = 'gist'
+                      AND a.attname = 'geom'
+                ) THEN
+                    CREATE INDEX {table}_geom_gist ON {table} USING GIST (geom);
+                    ANALYZE {table};
+                END IF;
+            END IF;
+        END $$;
+    """
+
+
+def drop_gist_index_sql(table):
+    return f"DROP INDEX IF EXISTS {table}_geom_gist;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_piste_created_at_alter_piste_updated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=create_gist_index_sql(table),
+            reverse_sql=drop_gist_index_sql(table),
+        )
+        for table in SPATIAL_TABLES
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:12
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_infrastructures_gist_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeometrieGeneralisee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layer', models.CharField(max_length=50)),
+                ('feature_id', models.BigIntegerField()),
+                ('niveau', models.SmallIntegerField()),
+                ('tolerance_m', models.FloatField()),
+                ('nb_points', models.IntegerField(blank=True, null=True)),
+                ('geom', django.contrib.gis.db.models.fields.GeometryField(blank=True, null=True, srid=4326)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'geometries_generalisees',
+                'managed': True,
+                'indexes': [models.Index(fields=['layer', 'niveau'], name='geom_gen_layer_niveau_idx')],
+                'unique_together': {('layer', 'feature_id', 'niveau')},
+            },
+        ),
+    ]
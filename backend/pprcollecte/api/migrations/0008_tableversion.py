@@ -0,0 +1,98 @@
+# Compteurs de version par table (ETag / requêtes conditionnelles)
+
+from django.db import migrations, models
+
+
+VERSIONED_TABLES = [
+    'login',
+    'regions',
+    'prefectures',
+    'communes_rurales',
+    'pistes',
+    'chaussees',
+    'points_coupures',
+    'points_critiques',
+    'services_santes',
+    'autres_infrastructures',
+    'bacs',
+    'batiments_administratifs',
+    'buses',
+    'dalots',
+    'ecoles',
+    'infrastructures_hydrauliques',
+    'localites',
+    'marches',
+    'passages_submersibles',
+    'ponts',
+    'geometries_generalisees',
+]
+
+CREATE_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO table_versions (table_name, version, updated_at)
+        VALUES (TG_TABLE_NAME, 1, now())
+        ON CONFLICT (table_name) DO UPDATE
+        SET version = table_versions.version + 1,
+            updated_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS bump_table_version();"
+
+
+def create_trigger_sql(table):
+    """Trigger par instruction (et non par ligne): un seul UPSERT par écriture"""
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_bump_version ON {table};
+                CREATE TRIGGER {table}_bump_version
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+                INSERT INTO table_versions (table_name, version, updated_at)
+                VALUES ('{table}', 1, now())
+                ON CONFLICT (table_name) DO NOTHING;
+            END IF;
+        END $$;
+    """
+
+
+def drop_trigger_sql(table):
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_bump_version ON {table};
+            END IF;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_geometriegeneralisee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table_name', models.CharField(max_length=63, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'table_versions',
+                'managed': True,
+            },
+        ),
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+    ] + [
+        migrations.RunSQL(sql=create_trigger_sql(table), reverse_sql=drop_trigger_sql(table))
+        for table in VERSIONED_TABLES
+    ]
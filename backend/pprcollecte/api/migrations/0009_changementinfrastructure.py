@@ -0,0 +1,97 @@
+# Journal des changements pour la synchronisation incrémentale (?since=)
+
+from django.db import migrations, models
+
+
+# (table, colonne clé primaire)
+JOURNALED_TABLES = [
+    ('pistes', 'id'),
+    ('chaussees', 'fid'),
+    ('points_coupures', 'fid'),
+    ('points_critiques', 'fid'),
+    ('services_santes', 'fid'),
+    ('autres_infrastructures', 'fid'),
+    ('bacs', 'fid'),
+    ('batiments_administratifs', 'fid'),
+    ('buses', 'fid'),
+    ('dalots', 'fid'),
+    ('ecoles', 'fid'),
+    ('infrastructures_hydrauliques', 'fid'),
+    ('localites', 'fid'),
+    ('marches', 'fid'),
+    ('passages_submersibles', 'fid'),
+    ('ponts', 'fid'),
+]
+
+CREATE_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION log_infrastructure_change() RETURNS trigger AS $$
+    DECLARE
+        row_data jsonb;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            row_data := to_jsonb(OLD);
+        ELSE
+            row_data := to_jsonb(NEW);
+        END IF;
+        INSERT INTO infrastructure_changes (table_name, feature_id, operation, changed_at)
+        VALUES (TG_TABLE_NAME, (row_data ->> TG_ARGV[0])::bigint, left(TG_OP, 1), now());
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS log_infrastructure_change();"
+
+
+def create_trigger_sql(table, pk):
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_log_change ON {table};
+                CREATE TRIGGER {table}_log_change
+                    AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION log_infrastructure_change('{pk}');
+            END IF;
+        END $$;
+    """
+
+
+def drop_trigger_sql(table):
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_log_change ON {table};
+            END IF;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_tableversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangementInfrastructure',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('table_name', models.CharField(max_length=63)),
+                ('feature_id', models.BigIntegerField()),
+                ('operation', models.CharField(choices=[('I', 'Insertion'), ('U', 'Modification'), ('D', 'Suppression')], max_length=1)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'infrastructure_changes',
+                'managed': True,
+                'indexes': [models.Index(fields=['table_name', 'feature_id'], name='infra_changes_feature_idx')],
+            },
+        ),
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+    ] + [
+        migrations.RunSQL(sql=create_trigger_sql(table, pk), reverse_sql=drop_trigger_sql(table))
+        for table, pk in JOURNALED_TABLES
+    ]
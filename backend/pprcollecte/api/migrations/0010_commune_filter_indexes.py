@@ -0,0 +1,67 @@
+# Index B-tree pour le filtre hiérarchique commune / préfecture / région,
+# appliqué en sous-requête (communes_rurales → prefectures) sur chaque couche.
+
+from django.db import migrations
+
+
+# (table, colonne)
+FILTER_INDEXES = [
+    ('communes_rurales', 'prefectures_id'),
+    ('prefectures', 'regions_id'),
+    ('pistes', 'communes_rurales_id'),
+    ('chaussees', 'communes_rurales_id'),
+    ('points_coupures', 'commune_id'),
+    ('points_critiques', 'commune_id'),
+    ('localites', 'commune_id'),
+    ('services_santes', 'commune_id'),
+    ('ponts', 'commune_id'),
+    ('buses', 'commune_id'),
+    ('dalots', 'commune_id'),
+    ('ecoles', 'commune_id'),
+    ('marches', 'commune_id'),
+    ('batiments_administratifs', 'commune_id'),
+    ('infrastructures_hydrauliques', 'commune_id'),
+    ('autres_infrastructures', 'commune_id'),
+    ('bacs', 'commune_id'),
+    ('passages_submersibles', 'commune_id'),
+]
+
+
+def create_index_sql(table, column):
+    """Crée l'index seulement si la table existe et n'a pas déjà un index commençant par la colonne"""
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                IF NOT EXISTS (
+                    SELECT 1
+                    FROM pg_index i
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                    WHERE i.indrelid = to_regclass('public.{table}')
+                      AND a.attname = '{column}'
+                ) THEN
+                    CREATE INDEX {table}_{column}_idx ON {table} ({column});
+                    ANALYZE {table};
+                END IF;
+            END IF;
+        END $$;
+    """
+
+
+def drop_index_sql(table, column):
+    return f"DROP INDEX IF EXISTS {table}_{column}_idx;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_changementinfrastructure'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=create_index_sql(table, column),
+            reverse_sql=drop_index_sql(table, column),
+        )
+        for table, column in FILTER_INDEXES
+    ]
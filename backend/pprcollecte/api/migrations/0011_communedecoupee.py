@@ -0,0 +1,76 @@
+# Index découpé des communes rurales (ST_Subdivide) pour le rattachement
+# automatique des objets à leur commune, synchronisé par trigger.
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+# Sommets maximum par morceau (ST_Subdivide); voir api.commune_assignment
+SUBDIVIDE_MAX_VERTICES = 256
+
+CREATE_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION sync_communes_decoupees() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM communes_decoupees WHERE commune_id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.geom IS NOT NULL AND NOT ST_IsEmpty(NEW.geom) THEN
+            INSERT INTO communes_decoupees (commune_id, geom)
+            SELECT NEW.id, ST_Subdivide(NEW.geom, {SUBDIVIDE_MAX_VERTICES});
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS sync_communes_decoupees();"
+
+CREATE_TRIGGER_SQL = f"""
+    DO $$
+    BEGIN
+        IF to_regclass('public.communes_rurales') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS communes_rurales_sync_decoupees ON communes_rurales;
+            CREATE TRIGGER communes_rurales_sync_decoupees
+                AFTER INSERT OR UPDATE OF geom OR DELETE ON communes_rurales
+                FOR EACH ROW EXECUTE FUNCTION sync_communes_decoupees();
+            INSERT INTO communes_decoupees (commune_id, geom)
+            SELECT c.id, ST_Subdivide(c.geom, {SUBDIVIDE_MAX_VERTICES})
+            FROM communes_rurales c
+            WHERE c.geom IS NOT NULL AND NOT ST_IsEmpty(c.geom);
+            ANALYZE communes_decoupees;
+        END IF;
+    END $$;
+"""
+
+DROP_TRIGGER_SQL = """
+    DO $$
+    BEGIN
+        IF to_regclass('public.communes_rurales') IS NOT NULL THEN
+            DROP TRIGGER IF EXISTS communes_rurales_sync_decoupees ON communes_rurales;
+        END IF;
+    END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_commune_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommuneDecoupee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commune_id', models.IntegerField(db_index=True)),
+                ('geom', django.contrib.gis.db.models.fields.GeometryField(srid=4326)),
+            ],
+            options={
+                'db_table': 'communes_decoupees',
+                'managed': True,
+            },
+        ),
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+        migrations.RunSQL(sql=CREATE_TRIGGER_SQL, reverse_sql=DROP_TRIGGER_SQL),
+    ]
@@ -0,0 +1,104 @@
+# Emprise (bbox) et point représentatif stockés sur regions, prefectures et
+# communes_rurales, recalculés par trigger à chaque écriture de la géométrie.
+
+from django.db import migrations, models
+
+
+ADMIN_TABLES = [
+    ('regions', 'region'),
+    ('prefectures', 'prefecture'),
+    ('communes_rurales', 'communerurale'),
+]
+
+BOUNDS_COLUMNS = ['bbox_minx', 'bbox_miny', 'bbox_maxx', 'bbox_maxy', 'center_x', 'center_y']
+
+CREATE_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION set_emprise_administrative() RETURNS trigger AS $$
+    DECLARE
+        pt geometry;
+    BEGIN
+        IF NEW.geom IS NULL OR ST_IsEmpty(NEW.geom) THEN
+            NEW.bbox_minx := NULL;
+            NEW.bbox_miny := NULL;
+            NEW.bbox_maxx := NULL;
+            NEW.bbox_maxy := NULL;
+            NEW.center_x := NULL;
+            NEW.center_y := NULL;
+        ELSE
+            pt := ST_PointOnSurface(NEW.geom);
+            NEW.bbox_minx := ST_XMin(NEW.geom);
+            NEW.bbox_miny := ST_YMin(NEW.geom);
+            NEW.bbox_maxx := ST_XMax(NEW.geom);
+            NEW.bbox_maxy := ST_YMax(NEW.geom);
+            NEW.center_x := ST_X(pt);
+            NEW.center_y := ST_Y(pt);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS set_emprise_administrative();"
+
+
+def create_columns_sql(table):
+    """Colonnes, valeurs initiales puis trigger BEFORE (la ligne écrite porte déjà son emprise)"""
+    add_columns = ', '.join(
+        f"ADD COLUMN IF NOT EXISTS {column} double precision" for column in BOUNDS_COLUMNS
+    )
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                ALTER TABLE {table} {add_columns};
+                UPDATE {table} t
+                SET bbox_minx = ST_XMin(t.geom),
+                    bbox_miny = ST_YMin(t.geom),
+                    bbox_maxx = ST_XMax(t.geom),
+                    bbox_maxy = ST_YMax(t.geom),
+                    center_x = ST_X(ST_PointOnSurface(t.geom)),
+                    center_y = ST_Y(ST_PointOnSurface(t.geom))
+                WHERE t.geom IS NOT NULL AND NOT ST_IsEmpty(t.geom);
+                DROP TRIGGER IF EXISTS {table}_emprise ON {table};
+                CREATE TRIGGER {table}_emprise
+                    BEFORE INSERT OR UPDATE OF geom ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION set_emprise_administrative();
+            END IF;
+        END $$;
+    """
+
+
+def drop_columns_sql(table):
+    drop_columns = ', '.join(f"DROP COLUMN IF EXISTS {column}" for column in BOUNDS_COLUMNS)
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_emprise ON {table};
+                ALTER TABLE {table} {drop_columns};
+            END IF;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_communedecoupee'),
+    ]
+
+    # Tables non gérées par Django: AddField ne met à jour que l'état des modèles
+    operations = [
+        migrations.AddField(
+            model_name=model_name,
+            name=column,
+            field=models.FloatField(blank=True, null=True),
+        )
+        for _table, model_name in ADMIN_TABLES
+        for column in BOUNDS_COLUMNS
+    ] + [
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+    ] + [
+        migrations.RunSQL(sql=create_columns_sql(table), reverse_sql=drop_columns_sql(table))
+        for table, _model_name in ADMIN_TABLES
+    ]
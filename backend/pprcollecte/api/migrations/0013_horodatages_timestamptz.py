@@ -0,0 +1,142 @@
+# Colonnes timestamptz created_at_ts / updated_at_ts à côté des dates texte des
+# tables d'infrastructures, tenues à jour par trigger et indexées.
+# Les lignes existantes sont converties par lots: manage.py convertir_horodatages
+
+from django.db import migrations, models
+
+
+# (table, modèle dans l'état des migrations ou None s'il n'y figure pas)
+TIMESTAMPED_TABLES = [
+    ('services_santes', 'servicessantes'),
+    ('autres_infrastructures', 'autresinfrastructures'),
+    ('bacs', 'bacs'),
+    ('batiments_administratifs', 'batimentsadministratifs'),
+    ('buses', 'buses'),
+    ('dalots', 'dalots'),
+    ('ecoles', 'ecoles'),
+    ('infrastructures_hydrauliques', 'infrastructureshydrauliques'),
+    ('localites', 'localites'),
+    ('marches', 'marches'),
+    ('passages_submersibles', 'passagessubmersibles'),
+    ('ponts', 'ponts'),
+    ('chaussees', 'chaussees'),
+    ('points_coupures', None),
+    ('points_critiques', None),
+]
+
+SHADOW_COLUMNS = [('created_at', 'created_at_ts'), ('updated_at', 'updated_at_ts')]
+
+# Formats rencontrés: "2025/02/28 21:49:55.000", "2025/02/28", ISO 8601 (avec ou sans fuseau).
+# Heure locale de Guinée = UTC. Valeur illisible -> NULL: la chaîne et ses champs sont
+# validés avant la conversion (pas de bloc EXCEPTION, donc pas de sous-transaction par ligne).
+# STABLE et non IMMUTABLE: la conversion texte -> timestamptz dépend des paramètres de session.
+CREATE_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION parse_horodatage_texte(value text) RETURNS timestamptz AS $$
+    DECLARE
+        cleaned text := replace(btrim(value), '/', '-');
+        parts text[];
+        day_count int;
+    BEGIN
+        -- 1-3 date, 4-6 heure, 7 fuseau (Z ou décalage), 8-9 heures et minutes du décalage
+        parts := regexp_match(
+            cleaned,
+            '^([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})'
+            '(?:[T ]([0-9]{1,2}):([0-9]{2})(?::([0-9]{2})(?:[.][0-9]+)?)?'
+            '(Z|[+-]([0-9]{2})(?::?([0-9]{2}))?)?)?$'
+        );
+        IF parts IS NULL OR parts[1]::int < 1 OR parts[2]::int NOT BETWEEN 1 AND 12 THEN
+            RETURN NULL;
+        END IF;
+        day_count := extract(day FROM make_date(parts[1]::int, parts[2]::int, 1) + interval '1 month - 1 day');
+        IF parts[3]::int NOT BETWEEN 1 AND day_count
+           OR coalesce(parts[4]::int, 0) > 23
+           OR coalesce(parts[5]::int, 0) > 59
+           OR coalesce(parts[6]::int, 0) > 59
+           OR coalesce(parts[8]::int, 0) > 15
+           OR coalesce(parts[9]::int, 0) > 59 THEN
+            RETURN NULL;
+        END IF;
+        IF parts[7] IS NOT NULL THEN
+            RETURN cleaned::timestamptz;
+        END IF;
+        RETURN cleaned::timestamp AT TIME ZONE 'UTC';
+    END;
+    $$ LANGUAGE plpgsql STABLE;
+
+    CREATE OR REPLACE FUNCTION set_horodatages_convertis() RETURNS trigger AS $$
+    BEGIN
+        NEW.created_at_ts := parse_horodatage_texte(NEW.created_at);
+        NEW.updated_at_ts := parse_horodatage_texte(NEW.updated_at);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = """
+    DROP FUNCTION IF EXISTS set_horodatages_convertis();
+    DROP FUNCTION IF EXISTS parse_horodatage_texte(text);
+"""
+
+
+def create_columns_sql(table):
+    add_columns = ', '.join(
+        f"ADD COLUMN IF NOT EXISTS {shadow} timestamptz" for _source, shadow in SHADOW_COLUMNS
+    )
+    create_indexes = '\n'.join(
+        f"CREATE INDEX IF NOT EXISTS {table}_{shadow}_idx ON {table} ({shadow});"
+        for _source, shadow in SHADOW_COLUMNS
+    )
+    # Lignes pas encore converties, relues depuis le texte par l'analyse temporelle
+    create_indexes += (
+        f"\nCREATE INDEX IF NOT EXISTS {table}_created_at_a_convertir_idx ON {table} (created_at) "
+        f"WHERE created_at_ts IS NULL AND created_at IS NOT NULL;"
+    )
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                ALTER TABLE {table} {add_columns};
+                {create_indexes}
+                DROP TRIGGER IF EXISTS {table}_horodatages ON {table};
+                CREATE TRIGGER {table}_horodatages
+                    BEFORE INSERT OR UPDATE OF created_at, updated_at ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION set_horodatages_convertis();
+            END IF;
+        END $$;
+    """
+
+
+def drop_columns_sql(table):
+    drop_columns = ', '.join(f"DROP COLUMN IF EXISTS {shadow}" for _source, shadow in SHADOW_COLUMNS)
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_horodatages ON {table};
+                ALTER TABLE {table} {drop_columns};
+            END IF;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_emprises_administratives'),
+    ]
+
+    # Tables non gérées par Django: AddField ne met à jour que l'état des modèles
+    operations = [
+        migrations.AddField(
+            model_name=model_name,
+            name=shadow,
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        )
+        for _table, model_name in TIMESTAMPED_TABLES if model_name
+        for _source, shadow in SHADOW_COLUMNS
+    ] + [
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+    ] + [
+        migrations.RunSQL(sql=create_columns_sql(table), reverse_sql=drop_columns_sql(table))
+        for table, _model_name in TIMESTAMPED_TABLES
+    ]
@@ -0,0 +1,30 @@
+# Transaction d'origine de chaque changement journalisé: un id attribué par une
+# transaction encore en cours peut être validé après un id plus grand, le curseur
+# de synchronisation retient donc aussi la plus ancienne transaction en cours.
+
+from django.db import migrations, models
+
+
+SET_DEFAULT_SQL = """
+    ALTER TABLE infrastructure_changes ALTER COLUMN txid SET DEFAULT txid_current();
+"""
+
+DROP_DEFAULT_SQL = """
+    ALTER TABLE infrastructure_changes ALTER COLUMN txid DROP DEFAULT;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_horodatages_timestamptz'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changementinfrastructure',
+            name='txid',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(sql=SET_DEFAULT_SQL, reverse_sql=DROP_DEFAULT_SQL),
+    ]
@@ -0,0 +1,94 @@
+# Maintien de geometries_generalisees par trigger: toute écriture sur une couche
+# linéaire (API, import, SQL direct) recalcule ou supprime ses géométries simplifiées.
+
+from django.db import migrations
+
+
+# (table = couche, colonne clé primaire), comme GENERALISED_LAYERS
+GENERALISED_TABLES = [
+    ('pistes', 'id'),
+    ('chaussees', 'fid'),
+    ('passages_submersibles', 'fid'),
+    ('bacs', 'fid'),
+]
+
+# (niveau, tolérance en mètres), figés ici: GENERALISATION_LEVELS à la date de la migration
+LEVELS = [(1, 500.0), (2, 75.0), (3, 10.0)]
+
+METRIC_SRID = 32628
+
+LEVELS_VALUES = ', '.join(f"({niveau}, {tolerance})" for niveau, tolerance in LEVELS)
+
+CREATE_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION maj_geometries_generalisees() RETURNS trigger AS $$
+    DECLARE
+        new_id bigint;
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            DELETE FROM geometries_generalisees
+            WHERE layer = TG_ARGV[0] AND feature_id = (to_jsonb(OLD) ->> TG_ARGV[1])::bigint;
+        END IF;
+        IF TG_OP = 'DELETE' OR NEW.geom IS NULL OR ST_IsEmpty(NEW.geom) THEN
+            RETURN NULL;
+        END IF;
+
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[1])::bigint;
+        INSERT INTO geometries_generalisees (layer, feature_id, niveau, tolerance_m, nb_points, geom, updated_at)
+        SELECT TG_ARGV[0], new_id, l.niveau, l.tolerance, ST_NPoints(s.geom), s.geom, now()
+        FROM (VALUES {LEVELS_VALUES}) AS l(niveau, tolerance)
+        CROSS JOIN LATERAL (
+            SELECT ST_Transform(
+                       ST_SimplifyPreserveTopology(ST_Transform(NEW.geom, {METRIC_SRID}), l.tolerance),
+                       4326
+                   ) AS geom
+        ) s
+        ON CONFLICT (layer, feature_id, niveau) DO UPDATE
+        SET tolerance_m = EXCLUDED.tolerance_m,
+            nb_points = EXCLUDED.nb_points,
+            geom = EXCLUDED.geom,
+            updated_at = EXCLUDED.updated_at;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS maj_geometries_generalisees();"
+
+
+def create_trigger_sql(table, pk):
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_generalisation ON {table};
+                CREATE TRIGGER {table}_generalisation
+                    AFTER INSERT OR UPDATE OF geom, {pk} OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION maj_geometries_generalisees('{table}', '{pk}');
+            END IF;
+        END $$;
+    """
+
+
+def drop_trigger_sql(table):
+    return f"""
+        DO $$
+        BEGIN
+            IF to_regclass('public.{table}') IS NOT NULL THEN
+                DROP TRIGGER IF EXISTS {table}_generalisation ON {table};
+            END IF;
+        END $$;
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_changementinfrastructure_txid'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=CREATE_FUNCTION_SQL, reverse_sql=DROP_FUNCTION_SQL),
+    ] + [
+        migrations.RunSQL(sql=create_trigger_sql(table, pk), reverse_sql=drop_trigger_sql(table))
+        for table, pk in GENERALISED_TABLES
+    ]
@@ -0,0 +1,51 @@
+# Triggers de suivi (journal des changements, compteurs de version) désactivables
+# le temps d'une transaction: SELECT set_config('pprcollecte.sans_suivi', 'on', true).
+# Utilisé par les conversions en masse qui ne changent pas les données métier
+# (convertir_horodatages): pas d'entrée de journal par ligne, une seule version à la fin.
+
+from django.db import migrations
+
+
+def function_sql(guard):
+    guard_sql = """
+        IF current_setting('pprcollecte.sans_suivi', true) = 'on' THEN
+            RETURN NULL;
+        END IF;""" if guard else ""
+    return f"""
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN{guard_sql}
+        INSERT INTO table_versions (table_name, version, updated_at)
+        VALUES (TG_TABLE_NAME, 1, now())
+        ON CONFLICT (table_name) DO UPDATE
+        SET version = table_versions.version + 1,
+            updated_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION log_infrastructure_change() RETURNS trigger AS $$
+    DECLARE
+        row_data jsonb;
+    BEGIN{guard_sql}
+        IF TG_OP = 'DELETE' THEN
+            row_data := to_jsonb(OLD);
+        ELSE
+            row_data := to_jsonb(NEW);
+        END IF;
+        INSERT INTO infrastructure_changes (table_name, feature_id, operation, changed_at)
+        VALUES (TG_TABLE_NAME, (row_data ->> TG_ARGV[0])::bigint, left(TG_OP, 1), now());
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_geometries_generalisees_trigger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=function_sql(guard=True), reverse_sql=function_sql(guard=False)),
+    ]
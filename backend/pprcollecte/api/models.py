@@ -50,7 +50,38 @@ class Login(models.Model):
         }
 
 
-class Region(models.Model):
+class EmpriseAdministrative(models.Model):
+    """
+    Emprise et point représentatif d'une unité administrative, calculés par
+    trigger PostgreSQL à chaque écriture de geom (ST_XMin..., ST_PointOnSurface).
+    Permet le zoom et la hiérarchie sans charger les multipolygones.
+    """
+    bbox_minx = models.FloatField(null=True, blank=True)
+    bbox_miny = models.FloatField(null=True, blank=True)
+    bbox_maxx = models.FloatField(null=True, blank=True)
+    bbox_maxy = models.FloatField(null=True, blank=True)
+    center_x = models.FloatField(null=True, blank=True)
+    center_y = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def bounds(self):
+        """[minLng, minLat, maxLng, maxLat] ou None"""
+        if self.bbox_minx is None:
+            return None
+        return [self.bbox_minx, self.bbox_miny, self.bbox_maxx, self.bbox_maxy]
+
+    @property
+    def center(self):
+        """[lng, lat] d'un point intérieur à la géométrie, ou None"""
+        if self.center_x is None:
+            return None
+        return [self.center_x, self.center_y]
+
+
+class Region(EmpriseAdministrative):
     nom = models.CharField(max_length=80, null=True, blank=True)
     geom = models.MultiPolygonField(srid=4326, null=True, blank=True)
     created_at = models.DateField(null=True, blank=True)
@@ -64,7 +95,7 @@ class Region(models.Model):
         return self.nom or "Region sans nom"
 
 
-class Prefecture(models.Model):
+class Prefecture(EmpriseAdministrative):
     regions_id = models.ForeignKey(
         Region,
         db_column='regions_id',
@@ -83,7 +114,7 @@ class Prefecture(models.Model):
         return self.nom or "Prefecture sans nom"
 
 
-class CommuneRurale(models.Model):
+class CommuneRurale(EmpriseAdministrative):
     prefectures_id = models.ForeignKey(
         Prefecture,
         on_delete=models.SET_NULL,
@@ -104,6 +135,19 @@ class CommuneRurale(models.Model):
         return self.nom or "Commune sans nom"
 
 
+class HorodatageConverti(models.Model):
+    """
+    Copies timestamptz de created_at / updated_at (stockés en texte
+    "YYYY/MM/DD HH:MM:SS.mmm"), renseignées par trigger PostgreSQL et indexées:
+    les filtres et tris temporels deviennent des parcours d'index.
+    """
+    created_at_ts = models.DateTimeField(null=True, blank=True, editable=False)
+    updated_at_ts = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
 class Piste(models.Model):
     """
     Modele Piste avec geometrie en SRID 32628 (UTM)
@@ -173,7 +217,7 @@ class Piste(models.Model):
 
 # ==================== INFRASTRUCTURES ====================
 
-class ServicesSantes(models.Model):
+class ServicesSantes(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -220,7 +264,7 @@ class ServicesSantes(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class AutresInfrastructures(models.Model):
+class AutresInfrastructures(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -267,7 +311,7 @@ class AutresInfrastructures(models.Model):
         return f"Autre infrastructure ({self.fid})"
 
 
-class Bacs(models.Model):
+class Bacs(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.GeometryField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -316,7 +360,7 @@ class Bacs(models.Model):
         return f"Bac {self.fid}"
 
 
-class BatimentsAdministratifs(models.Model):
+class BatimentsAdministratifs(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -364,7 +408,7 @@ class BatimentsAdministratifs(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class Buses(models.Model):
+class Buses(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -409,7 +453,7 @@ class Buses(models.Model):
         return f"Buse {self.fid}"
 
 
-class Dalots(models.Model):
+class Dalots(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -455,7 +499,7 @@ class Dalots(models.Model):
         return f"Dalot {self.fid}"
 
 
-class Ecoles(models.Model):
+class Ecoles(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -502,7 +546,7 @@ class Ecoles(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class InfrastructuresHydrauliques(models.Model):
+class InfrastructuresHydrauliques(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -549,7 +593,7 @@ class InfrastructuresHydrauliques(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class Localites(models.Model):
+class Localites(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -595,7 +639,7 @@ class Localites(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class Marches(models.Model):
+class Marches(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -641,7 +685,7 @@ class Marches(models.Model):
         return f"{self.nom} ({self.fid})"
 
 
-class PassagesSubmersibles(models.Model):
+class PassagesSubmersibles(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.LineStringField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -689,7 +733,7 @@ class PassagesSubmersibles(models.Model):
         return f"Passage {self.fid}"
 
 
-class Ponts(models.Model):
+class Ponts(HorodatageConverti):
     fid = models.BigAutoField(primary_key=True)
     geom = models.PointField(srid=4326)
     sqlite_id = models.IntegerField(null=True, blank=True, db_column='id')
@@ -736,7 +780,7 @@ class Ponts(models.Model):
         return f"Pont {self.fid} - {self.nom_cours or ''}"
 
 
-class Chaussees(models.Model):
+class Chaussees(HorodatageConverti):
     """Modele Chaussees - present dans la base finale"""
     fid = models.BigAutoField(primary_key=True, db_column='fid')
     geom = models.MultiLineStringField(srid=4326, null=True, blank=True)
@@ -791,7 +835,7 @@ class Chaussees(models.Model):
         return f"Chaussee {self.fid} ({self.code_piste_id})"
 
 
-class PointsCoupures(models.Model):
+class PointsCoupures(HorodatageConverti):
     """Points de coupure"""
     fid = models.BigAutoField(primary_key=True, db_column='fid')
     geom = models.PointField(srid=4326, null=True, blank=True)
@@ -826,7 +870,7 @@ class PointsCoupures(models.Model):
         return f"Point coupure {self.fid}"
 
 
-class PointsCritiques(models.Model):
+class PointsCritiques(HorodatageConverti):
     """Points critiques"""
     fid = models.BigAutoField(primary_key=True, db_column='fid')
     geom = models.PointField(srid=4326, null=True, blank=True)
@@ -858,4 +902,101 @@ class PointsCritiques(models.Model):
         managed = False
 
     def __str__(self):
-        return f"Point critique {self.fid}"
\ No newline at end of file
+        return f"Point critique {self.fid}"
+
+# ==================== GENERALISATION ====================
+
+class GeometrieGeneralisee(models.Model):
+    """
+    Géométries linéaires simplifiées par niveau de zoom.
+    Calculées en mètres (UTM 28N) puis stockées en WGS84 pour l'affichage.
+    """
+    layer = models.CharField(max_length=50)
+    feature_id = models.BigIntegerField()
+    niveau = models.SmallIntegerField()
+    tolerance_m = models.FloatField()
+    nb_points = models.IntegerField(null=True, blank=True)
+    geom = models.GeometryField(srid=4326, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'geometries_generalisees'
+        managed = True
+        unique_together = ('layer', 'feature_id', 'niveau')
+        indexes = [
+            models.Index(fields=['layer', 'niveau'], name='geom_gen_layer_niveau_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.layer} {self.feature_id} (niveau {self.niveau})"
+
+
+# ==================== VERSIONS DES TABLES ====================
+
+class TableVersion(models.Model):
+    """
+    Compteur de modifications par table, incrémenté par trigger PostgreSQL
+    à chaque INSERT / UPDATE / DELETE. Sert à calculer les ETags des APIs.
+    """
+    table_name = models.CharField(max_length=63, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'table_versions'
+        managed = True
+
+    def __str__(self):
+        return f"{self.table_name} v{self.version}"
+
+
+# ==================== JOURNAL DES CHANGEMENTS ====================
+
+class ChangementInfrastructure(models.Model):
+    """
+    Journal des écritures sur les tables d'infrastructures (rempli par trigger).
+    L'id croissant sert de curseur de synchronisation incrémentale (?since=),
+    avec la transaction d'origine (txid, rempli par défaut par la base) pour ne
+    pas perdre les changements validés dans le désordre.
+    """
+    OPERATIONS = [
+        ('I', 'Insertion'),
+        ('U', 'Modification'),
+        ('D', 'Suppression'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    table_name = models.CharField(max_length=63)
+    feature_id = models.BigIntegerField()
+    operation = models.CharField(max_length=1, choices=OPERATIONS)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    txid = models.BigIntegerField(null=True, editable=False, db_index=True)
+
+    class Meta:
+        db_table = 'infrastructure_changes'
+        managed = True
+        indexes = [
+            models.Index(fields=['table_name', 'feature_id'], name='infra_changes_feature_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.operation} {self.table_name} {self.feature_id} (#{self.id})"
+
+
+# ==================== DÉCOUPAGE DES COMMUNES ====================
+
+class CommuneDecoupee(models.Model):
+    """
+    Morceaux des communes rurales découpés par ST_Subdivide (au plus quelques
+    centaines de sommets chacun), tenus à jour par trigger sur communes_rurales.
+    Index GiST compact pour le rattachement point-dans-polygone des objets.
+    """
+    commune_id = models.IntegerField(db_index=True)
+    geom = models.GeometryField(srid=4326)
+
+    class Meta:
+        db_table = 'communes_decoupees'
+        managed = True
+
+    def __str__(self):
+        return f"Morceau de la commune {self.commune_id}"
@@ -0,0 +1,142 @@
+# name_search.py - Recherche par nom des unités administratives, insensible aux accents
+import bisect
+import re
+import time
+import unicodedata
+
+from .admin_units import AdminMemoryIndex
+from .models import CommuneRurale, Prefecture, Region
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Rangs (du meilleur au moins bon)
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+# Ordre des niveaux à rang égal
+LEVEL_ORDER = {'commune': 0, 'prefecture': 1, 'region': 2}
+
+
+def normalize_name(value):
+    """'Kérouané' -> 'kerouane': minuscules, sans accents ni ponctuation"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.findall(r'[0-9a-z]+', stripped.lower()))
+
+
+class AdminNameIndex:
+    """
+    Noms normalisés des régions, préfectures et communes en mémoire, avec la
+    liste triée de leurs mots: les mots commençant par un préfixe sont trouvés
+    par bisection (équivalent d'un trie pour quelques centaines de noms).
+    """
+
+    def __init__(self, entries, versions):
+        self.entries = entries
+        self.versions = versions
+        self.checked_at = time.monotonic()
+        self.words = sorted(
+            (word, position)
+            for position, entry in enumerate(entries)
+            for word in set(entry['key'].split())
+        )
+
+    @classmethod
+    def load(cls, versions):
+        regions = dict(Region.objects.values_list('id', 'nom'))
+        prefectures = {
+            prefecture_id: (nom, region_id)
+            for prefecture_id, nom, region_id in Prefecture.objects.values_list('id', 'nom', 'regions_id')
+        }
+
+        entries = []
+        for region_id, nom in regions.items():
+            entries.append({'type': 'region', 'id': region_id, 'nom': nom, 'prefecture': None, 'region': None})
+        for prefecture_id, (nom, region_id) in prefectures.items():
+            entries.append({
+                'type': 'prefecture', 'id': prefecture_id, 'nom': nom,
+                'prefecture': None, 'region': regions.get(region_id),
+            })
+        for commune_id, nom, prefecture_id in CommuneRurale.objects.values_list('id', 'nom', 'prefectures_id'):
+            prefecture_nom, region_id = prefectures.get(prefecture_id, (None, None))
+            entries.append({
+                'type': 'commune', 'id': commune_id, 'nom': nom,
+                'prefecture': prefecture_nom, 'region': regions.get(region_id),
+            })
+
+        for entry in entries:
+            entry['key'] = normalize_name(entry['nom'])
+        return cls([entry for entry in entries if entry['key']], versions)
+
+    def _word_prefix_matches(self, prefix):
+        """Positions des entrées ayant un mot qui commence par prefix"""
+        matches = set()
+        start = bisect.bisect_left(self.words, (prefix,))
+        for word, position in self.words[start:]:
+            if not word.startswith(prefix):
+                break
+            matches.add(position)
+        return matches
+
+    def search(self, query, types=None, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Entrées classées: nom exact, début du nom, début de chaque mot, sous-chaîne.
+        limit=None renvoie toutes les entrées trouvées.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+        tokens = key.split()
+
+        candidates = None
+        for token in tokens:
+            matches = self._word_prefix_matches(token)
+            candidates = matches if candidates is None else candidates & matches
+
+        ranked = {}
+        for position in candidates:
+            entry = self.entries[position]
+            if types and entry['type'] not in types:
+                continue
+            if entry['key'] == key:
+                ranked[position] = RANK_EXACT
+            elif entry['key'].startswith(key):
+                ranked[position] = RANK_PREFIX
+            else:
+                ranked[position] = RANK_WORD_PREFIX
+
+        # Sous-chaînes ("ouane" -> "Kérouané"): parcours simple, quelques centaines de noms
+        if limit is None or len(ranked) < limit:
+            for position, entry in enumerate(self.entries):
+                if types and entry['type'] not in types:
+                    continue
+                if position not in ranked and key in entry['key']:
+                    ranked[position] = RANK_SUBSTRING
+
+        results = [(rank, self.entries[position]) for position, rank in ranked.items()]
+        results.sort(key=lambda item: (
+            item[0], LEVEL_ORDER[item[1]['type']], len(item[1]['key']), item[1]['key'],
+        ))
+        return [
+            {
+                'type': entry['type'],
+                'id': entry['id'],
+                'nom': entry['nom'],
+                'prefecture': entry['prefecture'],
+                'region': entry['region'],
+                'rank': rank,
+            }
+            for rank, entry in results[:limit]
+        ]
+
+
+class AdminNameSearch(AdminMemoryIndex):
+    """Index des noms partagé par le processus, rechargé comme le géocodage inverse"""
+    index_class = AdminNameIndex
+
+    @classmethod
+    def search(cls, query, types=None, limit=DEFAULT_SEARCH_LIMIT):
+        return cls.index().search(query, types, limit)
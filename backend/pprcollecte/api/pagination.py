@@ -0,0 +1,111 @@
+# pagination.py - Pagination par clé (keyset) avec curseurs opaques
+import base64
+
+from rest_framework.exceptions import ValidationError # type: ignore
+from rest_framework.pagination import BasePagination # type: ignore
+from rest_framework.response import Response # type: ignore
+from rest_framework.utils.urls import replace_query_param # type: ignore
+
+from .delta_sync import CursorError
+
+PAGE_CURSOR_PREFIX = 'p1:'
+MAX_PAGE_SIZE = 5000
+
+
+class KeysetCursor:
+    """
+    Curseur de page: position (type, id) du dernier objet renvoyé, encodée.
+    Les pages suivantes reprennent après cette position (WHERE id > ..., sans OFFSET).
+    """
+
+    @staticmethod
+    def encode(type_name, last_id):
+        raw = f"{PAGE_CURSOR_PREFIX}{type_name}:{int(last_id)}".encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode(value):
+        """Retourne (type_name, id); lève CursorError si le curseur est illisible"""
+        try:
+            padded = value + '=' * (-len(value) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        except (ValueError, UnicodeError) as e:
+            raise CursorError("Curseur de page invalide") from e
+        if not raw.startswith(PAGE_CURSOR_PREFIX):
+            raise CursorError("Curseur de page invalide")
+        type_name, _, last_id = raw[len(PAGE_CURSOR_PREFIX):].rpartition(':')
+        try:
+            return type_name, int(last_id)
+        except ValueError as e:
+            raise CursorError("Curseur de page invalide") from e
+
+    @staticmethod
+    def parse_page_size(value):
+        """
+        Lire un paramètre page_size (1-MAX_PAGE_SIZE).
+        Retourne (taille, None) ou (None, message d'erreur). taille vaut None si absent.
+        """
+        if value in (None, ''):
+            return None, None
+        try:
+            page_size = int(value)
+        except (ValueError, TypeError):
+            return None, "page_size invalide"
+        if not (1 <= page_size <= MAX_PAGE_SIZE):
+            return None, f"page_size hors limites (1-{MAX_PAGE_SIZE})"
+        return page_size, None
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination opt-in des listes d'infrastructures: sans ?page_size= la liste
+    est renvoyée entière comme avant. Avec ?page_size=N, tri par clé primaire et
+    ?after=<next_cursor> pour la page suivante.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'after'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size, error = KeysetCursor.parse_page_size(request.query_params.get(self.page_size_query_param))
+        if error:
+            raise ValidationError({'error': error})
+        if page_size is None:
+            return None
+
+        self.request = request
+        self.type_name = getattr(view, 'layer_name', None) or queryset.model._meta.db_table
+        queryset = queryset.order_by('pk')
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                cursor_type, last_id = KeysetCursor.decode(cursor)
+            except CursorError as e:
+                raise ValidationError({'error': str(e)})
+            if cursor_type != self.type_name:
+                raise ValidationError({'error': "Curseur d'une autre couche"})
+            queryset = queryset.filter(pk__gt=last_id)
+
+        # Une ligne de plus pour savoir s'il reste une page
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            self.next_cursor = KeysetCursor.encode(self.type_name, page[-1].pk)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        # GeoFeatureModelSerializer renvoie déjà une FeatureCollection
+        if isinstance(data, dict):
+            body = dict(data)
+        else:
+            body = {'results': data}
+        body['next_cursor'] = self.next_cursor
+        body['next'] = self.get_next_link()
+        return Response(body)
@@ -0,0 +1,117 @@
+# point_union.py - Lecture unifiée des tables d'infrastructures ponctuelles (UNION ALL)
+from django.core.exceptions import FieldDoesNotExist # type: ignore
+from django.db import connection # type: ignore
+
+from .conditional import get_table_versions
+from .layer_cache import LayerCache
+from .spatial_utils import InfrastructureLayers
+
+
+class PointInfrastructureUnion:
+    """
+    Requête UNION ALL générée sur les tables ponctuelles, avec une colonne
+    discriminante "type": une seule requête pour n'importe quel sous-ensemble de types.
+
+    Colonnes communes: fid, geom, commune_id, code_piste, login_id, created_at, created_at_ts.
+    Une colonne absente d'une table vaut NULL (points_coupures n'a pas de code_piste).
+    Les tables de même forme (bacs, passages_submersibles) peuvent aussi être incluses.
+    """
+    # Nom de champ -> type SQL commun à toutes les branches
+    COLUMNS = {
+        'fid': 'bigint',
+        'geom': 'geometry',
+        'commune_id': 'bigint',
+        'code_piste': 'text',
+        'login_id': 'bigint',
+        'created_at': 'text',
+        'created_at_ts': 'timestamptz',
+    }
+
+    @staticmethod
+    def _column(model, field_name):
+        try:
+            return model._meta.get_field(field_name).column
+        except FieldDoesNotExist:
+            return None
+
+    @classmethod
+    def select_sql(cls, type_name, columns=None, where=None, params=None):
+        """
+        SELECT d'une branche (alias de table "t"): type + colonnes communes.
+        where/params: conditions supplémentaires sur t (liste) et leurs paramètres.
+        """
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+
+        expressions = ["%s::text AS type"]
+        for name in columns or cls.COLUMNS:
+            sql_type = cls.COLUMNS[name]
+            column = cls._column(model, name)
+            if column is None:
+                expressions.append(f"NULL::{sql_type} AS {name}")
+            else:
+                expressions.append(f"t.{column}::{sql_type} AS {name}")
+
+        sql = f"SELECT {', '.join(expressions)} FROM {table} t"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        return sql, [type_name] + list(params or [])
+
+    @classmethod
+    def union_sql(cls, type_names=None, columns=None, where_for=None):
+        """
+        UNION ALL des types demandés (tous les types ponctuels par défaut).
+        where_for(type_name) -> (conditions, paramètres) filtre chaque branche.
+        Retourne (sql, params), à utiliser comme sous-requête.
+        """
+        branches = []
+        params = []
+        for type_name in type_names or list(InfrastructureLayers.POINT_MODELS):
+            where, where_params = where_for(type_name) if where_for else ([], [])
+            sql, branch_params = cls.select_sql(type_name, columns, where, where_params)
+            branches.append(f"({sql})")
+            params += branch_params
+        return ' UNION ALL '.join(branches), params
+
+    @classmethod
+    def count_by(cls, column, type_names=None):
+        """
+        Nombre d'objets par valeur de column et par type, en une requête:
+        {valeur: {type_name: count}} (valeurs NULL ignorées)
+        """
+        union_sql, params = cls.union_sql(type_names, columns=[column])
+        sql = f"""
+            SELECT u.{column}, u.type, count(*)
+            FROM ({union_sql}) u
+            WHERE u.{column} IS NOT NULL
+            GROUP BY u.{column}, u.type
+        """
+        counts = {}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for value, type_name, count in cursor.fetchall():
+                counts.setdefault(value, {})[type_name] = count
+        return counts
+
+    @classmethod
+    def cached_count_by(cls, column, type_names=None):
+        """
+        count_by servi depuis le cache tant que les tables comptées ne changent pas
+        (clé liée à leurs versions, comme la hiérarchie administrative)
+        """
+        type_names = list(type_names or InfrastructureLayers.POINT_MODELS)
+        tables = sorted(
+            InfrastructureLayers.table(InfrastructureLayers.get_model(type_name)) for type_name in type_names
+        )
+        digest = LayerCache.filters_digest({
+            'column': column,
+            'types': sorted(type_names),
+            'versions': get_table_versions(tables),
+        })
+        key = f"{LayerCache.PREFIX}:counts:{digest}"
+        cache = LayerCache.backend()
+        counts = cache.get(key)
+        if counts is None:
+            counts = cls.count_by(column, type_names)
+            cache.set(key, counts, timeout=LayerCache.timeout())
+        return counts
@@ -0,0 +1,93 @@
+# profiling.py - Mesures par requête exposées dans l'en-tête Server-Timing
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings # type: ignore
+from django.core.exceptions import MiddlewareNotUsed # type: ignore
+from django.db import connection # type: ignore
+
+# Mesures de la requête en cours (None = profilage désactivé)
+_current_timing = contextvars.ContextVar('server_timing', default=None)
+
+
+class ServerTiming:
+    """Spans (nom, durée en ms, description) et requêtes SQL d'une requête HTTP"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.query_count = 0
+        self.query_ms = 0.0
+
+    def record(self, name, duration_ms, description=None):
+        self.spans.append((name, duration_ms, description))
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper: compte et chronomètre les requêtes SQL"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_count += 1
+            self.query_ms += (time.perf_counter() - start) * 1000
+
+    def header(self):
+        total_ms = (time.perf_counter() - self.start) * 1000
+        entries = [
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={self.query_ms:.1f};desc="{self.query_count} requetes"',
+        ]
+        for name, duration_ms, description in self.spans:
+            entry = f'{name};dur={duration_ms:.1f}'
+            if description:
+                entry += f';desc="{description}"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def record_span(name, duration_ms, description=None):
+    """Ajoute un span déjà mesuré (ex. temps par couche); sans effet si désactivé"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.record(name, duration_ms, description)
+
+
+@contextmanager
+def timing_span(name, description=None):
+    """Mesure un bloc de code; sans effet si le profilage est désactivé"""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.record(name, (time.perf_counter() - start) * 1000, description)
+
+
+class ServerTimingMiddleware:
+    """
+    Ajoute l'en-tête Server-Timing (durée totale, nombre et durée des requêtes SQL,
+    spans des vues). Activé par settings.API_SERVER_TIMING; sinon le middleware
+    est retiré de la chaîne au démarrage et ne coûte rien.
+    Les requêtes des threads de chargement parallèle utilisent leurs propres
+    connexions et ne sont pas comptées dans "db" (voir les spans par couche).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'API_SERVER_TIMING', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = ServerTiming()
+        token = _current_timing.set(timing)
+        try:
+            with connection.execute_wrapper(timing.query_wrapper):
+                response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        response['Server-Timing'] = timing.header()
+        return response
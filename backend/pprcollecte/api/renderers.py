@@ -0,0 +1,50 @@
+# renderers.py - Renderers binaires pour les APIs spatiales
+import json
+
+from rest_framework.renderers import BaseRenderer # type: ignore
+
+
+class BinaryRenderer(BaseRenderer):
+    """
+    Renderer de base pour les formats binaires produits par PostGIS.
+    Les vues renvoient directement les octets; les erreurs restent en JSON.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        return json.dumps(data, default=str).encode('utf-8')
+
+
+class MVTRenderer(BinaryRenderer):
+    """Tuiles vectorielles Mapbox (ST_AsMVT)"""
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'mvt'
+
+
+class GeoJSONRenderer(BinaryRenderer):
+    """FeatureCollection GeoJSON envoyée en flux (réponse chunked)"""
+    media_type = 'application/geo+json'
+    format = 'geojson'
+
+
+class NDJSONRenderer(BinaryRenderer):
+    """Une Feature GeoJSON par ligne (newline-delimited JSON)"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class FlatGeobufRenderer(BinaryRenderer):
+    """FlatGeobuf avec index spatial intégré (ST_AsFlatGeobuf)"""
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+
+
+class GeobufRenderer(BinaryRenderer):
+    """Geobuf, GeoJSON encodé en protobuf (ST_AsGeobuf)"""
+    media_type = 'application/x-geobuf'
+    format = 'geobuf'
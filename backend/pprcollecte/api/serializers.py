@@ -2,26 +2,94 @@ from rest_framework import serializers # type: ignore
 from rest_framework_gis.serializers import GeoFeatureModelSerializer # type: ignore
 from rest_framework_gis.fields import GeometryField # type: ignore
 from django.contrib.gis.geos import Point, LineString, MultiLineString, GEOSGeometry # type: ignore
+from django.db import connection # type: ignore
 from .models import *
+from .spatial_utils import precision_for_units
+
+
+class NullGeometryField(serializers.Field):
+    """Géométrie non demandée (?fields= sans geom): ni lue en base ni sérialisée"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return None
+
+    def to_representation(self, value):
+        return None
+
+
+class MapGeoFeatureModelSerializer(GeoFeatureModelSerializer):
+    """
+    GeoFeatureModelSerializer piloté par le contexte de la vue:
+    - 'precision': décimales de degré des coordonnées, ramenées en mètres
+      si la géométrie est en SRID projeté
+    - 'fields': champs à produire (la clé primaire est toujours incluse,
+      la géométrie seulement si elle est demandée)
+    """
+    # Champs calculés -> champs du modèle qu'ils lisent (pour .only())
+    field_sources = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        geo_field_name = self.Meta.geo_field
+
+        fields = self.context.get('fields')
+        if fields is not None:
+            keep = set(fields) | {self.Meta.model._meta.pk.name, geo_field_name}
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+            if geo_field_name not in fields:
+                self.fields[geo_field_name] = NullGeometryField()
+
+        precision = self.context.get('precision')
+        if precision is not None:
+            geo_field = self.fields.get(geo_field_name)
+            if geo_field is not None:
+                model_field = self.Meta.model._meta.get_field(geo_field_name)
+                geo_field.precision = precision_for_units(precision, model_field.geodetic(connection))
+
+    def model_fields(self, requested):
+        """
+        Champs du modèle à charger (.only()) pour produire les champs demandés.
+        None si un champ dépend de données inconnues: pas de restriction du SELECT.
+        """
+        model_fields = {field.name for field in self.Meta.model._meta.concrete_fields}
+        names = {self.Meta.model._meta.pk.name}
+        for name in requested:
+            if name in self.field_sources:
+                names.update(self.field_sources[name])
+                continue
+            field = self.fields.get(name)
+            if field is None or isinstance(field, serializers.SerializerMethodField):
+                return None
+            source = field.source.split('.')[0] if field.source and field.source != '*' else None
+            if source not in model_fields:
+                return None
+            names.add(source)
+        return sorted(names)
 
 
 # ==================== GEOGRAPHIE ====================
 
-class RegionSerializer(GeoFeatureModelSerializer):
+class RegionSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Region
         geo_field = "geom"
         fields = '__all__'
 
 
-class PrefectureSerializer(GeoFeatureModelSerializer):
+class PrefectureSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Prefecture
         geo_field = "geom"
         fields = '__all__'
 
 
-class CommuneRuraleSerializer(GeoFeatureModelSerializer):
+class CommuneRuraleSerializer(MapGeoFeatureModelSerializer):
     prefecture_nom = serializers.CharField(source='prefectures_id.nom', read_only=True)
     prefecture_id = serializers.IntegerField(source='prefectures_id.id', read_only=True)
     region_nom = serializers.CharField(source='prefectures_id.regions_id.nom', read_only=True)
@@ -153,7 +221,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
 # ==================== PISTES ====================
 
-class PisteWriteSerializer(GeoFeatureModelSerializer):
+class PisteWriteSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Piste
         geo_field = "geom"
@@ -167,8 +235,13 @@ class PisteWriteSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class PisteReadSerializer(GeoFeatureModelSerializer):
+class PisteReadSerializer(MapGeoFeatureModelSerializer):
     geom = GeometryField(read_only=True)
+    field_sources = {
+        'utilisateur': ['login_id'],
+        'commune': ['communes_rurales_id'],
+        'kilometrage': ['geom'],
+    }
     
     # ✅ Ces 3 champs sont NÉCESSAIRES pour le Dashboard
     utilisateur = serializers.SerializerMethodField()
@@ -199,7 +272,7 @@ class PisteReadSerializer(GeoFeatureModelSerializer):
                 return 0.0
         return 0.0
 
-class PisteWebSerializer(GeoFeatureModelSerializer):
+class PisteWebSerializer(MapGeoFeatureModelSerializer):
     """Serializer ultra-léger pour web"""
     
     geom = GeometryField(read_only=True)
@@ -233,7 +306,7 @@ class PisteWebSerializer(GeoFeatureModelSerializer):
 
 # ==================== INFRASTRUCTURES ====================
 
-class ServicesSantesSerializer(GeoFeatureModelSerializer):
+class ServicesSantesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = ServicesSantes
         geo_field = "geom"
@@ -251,7 +324,7 @@ class ServicesSantesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class AutresInfrastructuresSerializer(GeoFeatureModelSerializer):
+class AutresInfrastructuresSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = AutresInfrastructures
         geo_field = "geom"
@@ -270,7 +343,7 @@ class AutresInfrastructuresSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class BacsSerializer(GeoFeatureModelSerializer):
+class BacsSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Bacs
         geo_field = "geom"
@@ -291,7 +364,7 @@ class BacsSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class BatimentsAdministratifsSerializer(GeoFeatureModelSerializer):
+class BatimentsAdministratifsSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = BatimentsAdministratifs
         geo_field = "geom"
@@ -310,7 +383,7 @@ class BatimentsAdministratifsSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class BusesSerializer(GeoFeatureModelSerializer):
+class BusesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Buses
         geo_field = "geom"
@@ -328,7 +401,7 @@ class BusesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class DalotsSerializer(GeoFeatureModelSerializer):
+class DalotsSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Dalots
         geo_field = "geom"
@@ -346,7 +419,7 @@ class DalotsSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class EcolesSerializer(GeoFeatureModelSerializer):
+class EcolesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Ecoles
         geo_field = "geom"
@@ -364,7 +437,7 @@ class EcolesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class InfrastructuresHydrauliquesSerializer(GeoFeatureModelSerializer):
+class InfrastructuresHydrauliquesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = InfrastructuresHydrauliques
         geo_field = "geom"
@@ -382,7 +455,7 @@ class InfrastructuresHydrauliquesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class LocalitesSerializer(GeoFeatureModelSerializer):
+class LocalitesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Localites
         geo_field = "geom"
@@ -400,7 +473,7 @@ class LocalitesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class MarchesSerializer(GeoFeatureModelSerializer):
+class MarchesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Marches
         geo_field = "geom"
@@ -418,7 +491,7 @@ class MarchesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class PassagesSubmersiblesSerializer(GeoFeatureModelSerializer):
+class PassagesSubmersiblesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = PassagesSubmersibles
         geo_field = "geom"
@@ -438,7 +511,7 @@ class PassagesSubmersiblesSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class PontsSerializer(GeoFeatureModelSerializer):
+class PontsSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = Ponts
         geo_field = "geom"
@@ -471,7 +544,7 @@ class CommuneSearchSerializer(serializers.ModelSerializer):
         return f"{obj.nom}, {prefecture}, {region}"
 
 
-class ChausseesSerializer(GeoFeatureModelSerializer):
+class ChausseesSerializer(MapGeoFeatureModelSerializer):
     # ✅ Ce champ est NÉCESSAIRE pour afficher "Chaussées: 2 (3.2 km)"
     length_km = serializers.SerializerMethodField()
     
@@ -495,7 +568,7 @@ class ChausseesSerializer(GeoFeatureModelSerializer):
         return 0.0
 
 
-class PointsCoupuresSerializer(GeoFeatureModelSerializer):
+class PointsCoupuresSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = PointsCoupures
         geo_field = "geom"
@@ -514,7 +587,7 @@ class PointsCoupuresSerializer(GeoFeatureModelSerializer):
         return super().to_internal_value(data)
 
 
-class PointsCritiquesSerializer(GeoFeatureModelSerializer):
+class PointsCritiquesSerializer(MapGeoFeatureModelSerializer):
     class Meta:
         model = PointsCritiques
         geo_field = "geom"
@@ -570,7 +643,7 @@ class PisteDashboardSerializer(serializers.Serializer):
 
     
     def get_infrastructures_par_type(self, obj):
-        """Retourner les compteurs déjà calculés par annotate()"""
+        """Retourner les compteurs déjà calculés (contexte de la vue ou annotate())"""
         
         # ⭐ CHAUSSÉES avec compteur ET kilométrage
         chaussees_qs = Chaussees.objects.filter(code_piste=obj)
@@ -595,16 +668,23 @@ class PisteDashboardSerializer(serializers.Serializer):
                 'count': chaussees_count,
                 'km': chaussees_km
             },
-            'Buses': getattr(obj, 'nb_buses', 0),
-            'Ponts': getattr(obj, 'nb_ponts', 0),
-            'Dalots': getattr(obj, 'nb_dalots', 0),
-            'Bacs': getattr(obj, 'nb_bacs', 0),
-            'Écoles': getattr(obj, 'nb_ecoles', 0),
-            'Marchés': getattr(obj, 'nb_marches', 0),
-            'Services Santé': getattr(obj, 'nb_services_santes', 0),
-            'Autres Infrastructures': getattr(obj, 'nb_autres_infrastructures', 0),
-            'Bâtiments Administratifs': getattr(obj, 'nb_batiments_administratifs', 0),
-            'Infrastructures Hydrauliques': getattr(obj, 'nb_infrastructures_hydrauliques', 0),
-            'Localités': getattr(obj, 'nb_localites', 0),
-            'Passages Submersibles': getattr(obj, 'nb_passages_submersibles', 0)
-        }
\ No newline at end of file
+            'Buses': self._count(obj, 'buses'),
+            'Ponts': self._count(obj, 'ponts'),
+            'Dalots': self._count(obj, 'dalots'),
+            'Bacs': self._count(obj, 'bacs'),
+            'Écoles': self._count(obj, 'ecoles'),
+            'Marchés': self._count(obj, 'marches'),
+            'Services Santé': self._count(obj, 'services_santes'),
+            'Autres Infrastructures': self._count(obj, 'autres_infrastructures'),
+            'Bâtiments Administratifs': self._count(obj, 'batiments_administratifs'),
+            'Infrastructures Hydrauliques': self._count(obj, 'infrastructures_hydrauliques'),
+            'Localités': self._count(obj, 'localites'),
+            'Passages Submersibles': self._count(obj, 'passages_submersibles')
+        }
+    
+    def _count(self, obj, type_name):
+        """Compteur du contexte (infrastructure_counts) ou annotation nb_<type>"""
+        counts = self.context.get('infrastructure_counts')
+        if counts is not None:
+            return counts.get(obj.code_piste, {}).get(type_name, 0)
+        return getattr(obj, f'nb_{type_name}', 0)
\ No newline at end of file
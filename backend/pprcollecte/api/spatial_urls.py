@@ -3,14 +3,22 @@
 from django.urls import path # type: ignore
 from .spatial_views import (
     CollectesGeoAPIView,
+    DensityGridAPIView,
     CommunesSearchAPIView,
     TypesInfrastructuresAPIView
 )
 from .temporal_views import *
+from .tile_views import VectorTileAPIView
 
 urlpatterns = [
     # API principale pour récupérer les collectes avec filtrage spatial
     path('api/collectes/', CollectesGeoAPIView.as_view(), name='api-collectes-geo'),
+
+    # Densité par cellule de grille (hexagones ou carrés), par résolution
+    path('api/collectes/density/', DensityGridAPIView.as_view(), name='api-collectes-density'),
+
+    # Tuiles vectorielles MVT (une couche ou "all")
+    path('api/tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', VectorTileAPIView.as_view(), name='api-tiles-mvt'),
     
     
     # API de recherche communes
@@ -1,8 +1,33 @@
 #
 
+import logging
+import math
+
 from django.contrib.gis.geos import GEOSGeometry # type: ignore
 from django.contrib.gis.db.models.functions import Transform # type: ignore
-from .models import CommuneRurale, Prefecture, Region
+from .models import (
+    CommuneRurale,
+    Prefecture,
+    Region,
+    Piste,
+    Chaussees,
+    Buses,
+    Dalots,
+    Ponts,
+    PassagesSubmersibles,
+    Bacs,
+    Ecoles,
+    Marches,
+    ServicesSantes,
+    BatimentsAdministratifs,
+    InfrastructuresHydrauliques,
+    Localites,
+    AutresInfrastructures,
+    PointsCoupures,
+    PointsCritiques,
+)
+
+logger = logging.getLogger(__name__)
 
 class GeoQueryHelper:
     """Classe utilitaire pour les requêtes géospatiales"""
@@ -15,6 +40,25 @@ class GeoQueryHelper:
             return commune.geom
         except CommuneRurale.DoesNotExist:
             return None
+
+    @staticmethod
+    def get_commune_scope(region_id, prefecture_id, commune_id):
+        """
+        Filtre hiérarchique à appliquer selon les paramètres (le plus fin l'emporte).
+        La liste des communes n'est pas chargée: le filtre devient une sous-requête SQL.
+        """
+        try:
+            if commune_id:
+                return CommuneScope(CommuneScope.COMMUNE, int(commune_id))
+            elif prefecture_id:
+                return CommuneScope(CommuneScope.PREFECTURE, int(prefecture_id))
+            elif region_id:
+                return CommuneScope(CommuneScope.REGION, int(region_id))
+            # Aucun filtre géographique - toutes les communes
+            return CommuneScope()
+        except (ValueError, TypeError) as e:
+            logger.info("Paramètres de commune invalides: %s", e)
+            return CommuneScope(CommuneScope.NONE)
     
     @staticmethod
     def transform_geometry(geom, target_srid=4326):
@@ -22,6 +66,153 @@ class GeoQueryHelper:
         return geom
 
 
+class CommuneScope:
+    """
+    Filtre hiérarchique commune / préfecture / région traduit en condition SQL
+    sur la colonne commune d'une table (sous-requête communes_rurales → prefectures),
+    que le planificateur transforme en semi-jointure.
+    """
+    ALL = 'all'
+    NONE = 'none'
+    COMMUNE = 'commune'
+    PREFECTURE = 'prefecture'
+    REGION = 'region'
+
+    def __init__(self, level=ALL, value=None):
+        self.level = level
+        self.value = value
+
+    @property
+    def is_all(self):
+        return self.level == self.ALL
+
+    @property
+    def is_empty(self):
+        """Paramètres invalides: aucune commune ne correspond"""
+        return self.level == self.NONE
+
+    def sql(self, column):
+        """(condition, paramètres) sur column, None si aucun filtre"""
+        if self.level == self.ALL:
+            return None, []
+        if self.level == self.NONE:
+            return 'FALSE', []
+        if self.level == self.COMMUNE:
+            return f"{column} = %s", [self.value]
+
+        communes = CommuneRurale._meta.db_table
+        commune_prefecture = CommuneRurale._meta.get_field('prefectures_id').column
+        if self.level == self.PREFECTURE:
+            return (
+                f"{column} IN (SELECT c.id FROM {communes} c WHERE c.{commune_prefecture} = %s)",
+                [self.value],
+            )
+        prefectures = Prefecture._meta.db_table
+        prefecture_region = Prefecture._meta.get_field('regions_id').column
+        return (
+            f"""{column} IN (
+                SELECT c.id FROM {communes} c
+                JOIN {prefectures} p ON p.id = c.{commune_prefecture}
+                WHERE p.{prefecture_region} = %s
+            )""",
+            [self.value],
+        )
+
+    def cache_key(self):
+        return [self.level, self.value]
+
+
+class InfrastructureLayers:
+    """Registre des couches d'infrastructures servies par les APIs spatiales"""
+
+    # Même ordre que le chargement historique de /api/collectes/
+    POINT_MODELS = {
+        'services_santes': ServicesSantes,
+        'ponts': Ponts,
+        'buses': Buses,
+        'dalots': Dalots,
+        'ecoles': Ecoles,
+        'marches': Marches,
+        'batiments_administratifs': BatimentsAdministratifs,
+        'infrastructures_hydrauliques': InfrastructuresHydrauliques,
+        'localites': Localites,
+        'autres_infrastructures': AutresInfrastructures,
+        'points_coupures': PointsCoupures,
+        'points_critiques': PointsCritiques,
+    }
+
+    LINEAR_MODELS = {
+        'bacs': Bacs,
+        'pistes': Piste,
+        'chaussees': Chaussees,
+        'passages_submersibles': PassagesSubmersibles,
+    }
+
+    # Propriétés attributaires exposées en plus de l'identifiant et de la commune
+    EXTRA_PROPERTIES = {
+        'chaussees': ['type_chaus', 'etat_piste', 'code_piste'],
+    }
+
+    # Préfixe des identifiants GeoJSON (historique frontend: "bac_12", "piste_3"...)
+    FEATURE_ID_PREFIXES = {
+        'bacs': 'bac',
+        'pistes': 'piste',
+        'chaussees': 'chaussee',
+    }
+
+    @classmethod
+    def all_models(cls):
+        return {**cls.POINT_MODELS, **cls.LINEAR_MODELS}
+
+    @classmethod
+    def get_model(cls, type_name):
+        return cls.all_models().get(type_name)
+
+    @classmethod
+    def selected_types(cls, types_filter):
+        """Types demandés dans l'ordre du registre (tous si aucun filtre)"""
+        return [
+            type_name for type_name in cls.all_models()
+            if not types_filter or type_name in types_filter
+        ]
+
+    @staticmethod
+    def table(model):
+        return model._meta.db_table
+
+    @staticmethod
+    def pk_column(model):
+        return model._meta.pk.column
+
+    @staticmethod
+    def commune_column(model):
+        """Colonne commune: communes_rurales_id pour pistes/chaussées, commune_id ailleurs"""
+        if model in (Piste, Chaussees):
+            return model._meta.get_field('communes_rurales_id').column
+        return model._meta.get_field('commune_id').column
+
+    @staticmethod
+    def geom_srid(model):
+        return model._meta.get_field('geom').srid
+
+    @classmethod
+    def feature_id_prefix(cls, type_name):
+        return cls.FEATURE_ID_PREFIXES.get(type_name, type_name)
+
+    @classmethod
+    def extra_columns(cls, type_name):
+        model = cls.get_model(type_name)
+        return [model._meta.get_field(name).column for name in cls.EXTRA_PROPERTIES.get(type_name, [])]
+
+    @classmethod
+    def all_extra_columns(cls):
+        """Union ordonnée des propriétés supplémentaires de toutes les couches"""
+        columns = []
+        for type_name in cls.EXTRA_PROPERTIES:
+            columns += [column for column in cls.extra_columns(type_name) if column not in columns]
+        return columns
+
+
 class InfrastructureTypeMapper:
     """Classe pour mapper les types d'infrastructures"""
     
@@ -79,4 +270,105 @@ def validate_coordinates(x, y):
             
         return True, None
     except (ValueError, TypeError):
-        return False, "Coordonnées invalides"
\ No newline at end of file
+        return False, "Coordonnées invalides"
+
+def parse_bbox(value):
+    """
+    Lire un paramètre bbox "minx,miny,maxx,maxy" (WGS84).
+    Retourne (bbox, None) ou (None, message d'erreur). bbox vaut None si absent.
+    """
+    if not value:
+        return None, None
+    try:
+        minx, miny, maxx, maxy = (float(part) for part in value.split(','))
+    except (ValueError, TypeError):
+        return None, "bbox invalide, format attendu: minx,miny,maxx,maxy"
+
+    if minx >= maxx or miny >= maxy:
+        return None, "bbox invalide: min doit être inférieur à max"
+    if not (-180 <= minx <= 180 and -180 <= maxx <= 180 and -90 <= miny <= 90 and -90 <= maxy <= 90):
+        return None, "bbox hors limites WGS84"
+
+    return (minx, miny, maxx, maxy), None
+
+
+def parse_zoom(value):
+    """
+    Lire un paramètre zoom (niveau de tuile web 0-22).
+    Retourne (zoom, None) ou (None, message d'erreur). zoom vaut None si absent.
+    """
+    if value in (None, ''):
+        return None, None
+    try:
+        zoom = int(float(value))
+    except (ValueError, TypeError):
+        return None, "zoom invalide"
+    if not (0 <= zoom <= 22):
+        return None, "zoom hors limites (0-22)"
+    return zoom, None
+
+
+# Décimales des coordonnées WGS84 (6 décimales ≈ 11 cm, au-delà de la précision GPS terrain)
+DEFAULT_PRECISION = 6
+MAX_PRECISION = 9
+
+
+def parse_precision(value):
+    """
+    Lire un paramètre precision (nombre de décimales des coordonnées, 0-9).
+    Retourne (precision, None) ou (None, message d'erreur). precision vaut None si absent.
+    """
+    if value in (None, ''):
+        return None, None
+    try:
+        precision = int(value)
+    except (ValueError, TypeError):
+        return None, "precision invalide"
+    if not (0 <= precision <= MAX_PRECISION):
+        return None, f"precision hors limites (0-{MAX_PRECISION})"
+    return precision, None
+
+
+def precision_for_zoom(zoom):
+    """
+    Décimales suffisantes pour un demi-pixel au zoom donné
+    (tuile de 256 px: 360 / 2^(zoom+8) degrés par pixel). Plafonné à 7 (≈ 1 cm).
+    """
+    if zoom is None:
+        return DEFAULT_PRECISION
+    digits = math.ceil(math.log10(2 ** (zoom + 9) / 360.0))
+    return min(7, max(1, digits))
+
+
+# 1e-5 degré ≈ 1,1 m: décimales à retirer pour des coordonnées en mètres
+METRIC_PRECISION_OFFSET = 5
+
+
+def precision_for_units(precision, geodetic):
+    """
+    ?precision= est exprimé en décimales de degré; pour une géométrie en SRID
+    projeté (mètres, pistes en 32628) la précision équivalente compte 5 décimales
+    de moins (6 décimales de degré ≈ 0,1 m)
+    """
+    if precision is None or geodetic:
+        return precision
+    return max(0, precision - METRIC_PRECISION_OFFSET)
+
+
+# Regroupement des points (?cluster=1): taille d'une cellule de grille en pixels,
+# zoom au-delà duquel les points sont renvoyés un par un, zoom supposé si absent
+CLUSTER_RADIUS_PX = 60
+CLUSTER_MAX_ZOOM = 13
+CLUSTER_DEFAULT_ZOOM = 7
+
+
+def cluster_cell_for_zoom(zoom):
+    """
+    Côté de la cellule de regroupement en degrés pour un zoom donné
+    (None = pas de regroupement, zoom trop élevé)
+    """
+    if zoom is None:
+        zoom = CLUSTER_DEFAULT_ZOOM
+    if zoom > CLUSTER_MAX_ZOOM:
+        return None
+    return CLUSTER_RADIUS_PX * 360.0 / 2 ** (zoom + 8)
@@ -3,16 +3,64 @@ from rest_framework.views import APIView # type: ignore
 from rest_framework.response import Response # type: ignore
 from rest_framework import status # type: ignore
 from django.utils import timezone # type: ignore
+from django.http import HttpResponse, StreamingHttpResponse # type: ignore
+from rest_framework.settings import api_settings # type: ignore
 from django.views.decorators.gzip import gzip_page # type: ignore
 from django.utils.decorators import method_decorator # type: ignore
 import time
+import logging
 from .models import *
+from .spatial_utils import (
+    GeoQueryHelper, InfrastructureLayers, parse_bbox, parse_zoom, parse_precision, cluster_cell_for_zoom
+)
+from .geojson_engine import GeoJSONEngine
+from .generalisation import GENERALISED_LAYERS, level_for_zoom
+from .name_search import AdminNameSearch
+from .density import DEFAULT_RESOLUTION, DENSITY_RESOLUTIONS, GRID_SHAPES, DensityGrid
+from .renderers import GeoJSONRenderer, NDJSONRenderer, FlatGeobufRenderer, GeobufRenderer
+from .conditional import watermark_etag
+from .delta_sync import CursorError, CursorExpiredError, DeltaSync
+from .pagination import KeysetCursor
+from rest_framework.utils.urls import replace_query_param # type: ignore
+from .profiling import record_span, timing_span
+
+logger = logging.getLogger(__name__)
+
+def collectes_watermark_tables(request):
+    """
+    Tables dont dépend la réponse de /api/collectes/ pour ces filtres.
+    geometries_generalisees seulement si le zoom fait lire une couche généralisée,
+    même règle que GeoJSONEngine.fetch_features.
+    """
+    type_names = InfrastructureLayers.selected_types(request.GET.getlist('types', []))
+    tables = [InfrastructureLayers.table(InfrastructureLayers.get_model(type_name)) for type_name in type_names]
+    tables += ['communes_rurales', 'prefectures']
+    zoom, _zoom_error = parse_zoom(request.GET.get('zoom'))
+    if level_for_zoom(zoom) is not None and any(type_name in GENERALISED_LAYERS for type_name in type_names):
+        tables.append(GeometrieGeneralisee._meta.db_table)
+    return tables
+
 
 @method_decorator(gzip_page, name='dispatch')
+@method_decorator(watermark_etag(collectes_watermark_tables), name='get')
 class CollectesGeoAPIView(APIView):
     """
     Retourne les données avec filtrage géographique hiérarchique
+
+    format=geojson : FeatureCollection envoyée en flux (curseur serveur)
+    format=ndjson  : une Feature par ligne, en flux
+    format=fgb     : FlatGeobuf (binaire, index spatial intégré)
+    format=geobuf  : Geobuf (GeoJSON encodé en protobuf)
+    precision=<n>  : décimales des coordonnées (défaut déduit du zoom)
+    cluster=1      : points regroupés par type sur une grille (zoom <= 13,
+                     refusé avec les formats binaires)
+    page_size=<n>  : pagination par (type, id), page suivante avec after=<next_cursor>
+                     (réponse JSON uniquement: refusé avec les formats en flux ou binaires)
+    since=<cursor> : seulement les changements depuis ce curseur (+ "deleted")
     """
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [
+        GeoJSONRenderer, NDJSONRenderer, FlatGeobufRenderer, GeobufRenderer
+    ]
     
     def get(self, request):
         """Retourne les infrastructures en GeoJSON avec filtres géographiques"""
@@ -24,8 +72,37 @@ class CollectesGeoAPIView(APIView):
         prefecture_id = request.GET.get('prefecture_id')
         commune_id = request.GET.get('commune_id')
         types = request.GET.getlist('types', [])
+        bbox, bbox_error = parse_bbox(request.GET.get('bbox'))
+        zoom, zoom_error = parse_zoom(request.GET.get('zoom'))
+        precision, precision_error = parse_precision(request.GET.get('precision'))
+        cluster = request.GET.get('cluster', '').lower() in ('1', 'true', 'yes')
+        page_size, page_size_error = KeysetCursor.parse_page_size(request.GET.get('page_size'))
+        
+        error = bbox_error or zoom_error or precision_error or page_size_error
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Les formats en flux et binaires renvoient toute la sélection d'un bloc
+        unpaged_formats = (
+            GeoJSONRenderer.format, NDJSONRenderer.format, FlatGeobufRenderer.format, GeobufRenderer.format,
+        )
+        if page_size is not None and request.accepted_renderer.format in unpaged_formats:
+            return Response(
+                {'error': f"page_size n'est pas disponible avec format={request.accepted_renderer.format}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         
-        print(f"🌍 [CollectesGeoAPI] Filtres reçus - Region: {region_id}, Prefecture: {prefecture_id}, Commune: {commune_id}, Types: {types}")
+        # Les encodeurs binaires écrivent les objets un par un, sans regroupement
+        if cluster and request.accepted_renderer.format in (FlatGeobufRenderer.format, GeobufRenderer.format):
+            return Response(
+                {'error': f"cluster n'est pas disponible avec format={request.accepted_renderer.format}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        
+        logger.debug(
+            "collectes filtres region=%s prefecture=%s commune=%s types=%s",
+            region_id, prefecture_id, commune_id, types,
+        )
         
         results = {
             'type': 'FeatureCollection',
@@ -35,333 +112,280 @@ class CollectesGeoAPIView(APIView):
                 'region_id': region_id,
                 'prefecture_id': prefecture_id,
                 'commune_id': commune_id,
-                'types': types
+                'types': types,
+                'bbox': list(bbox) if bbox else None,
+                'zoom': zoom,
+                'precision': precision,
+                'cluster': cluster,
+                'page_size': page_size
             },
             'timestamp': timezone.now().isoformat()
         }
         
         try:
             #  CALCULER LES COMMUNES À INCLURE selon la hiérarchie
-            target_commune_ids = self._get_target_communes(region_id, prefecture_id, commune_id)
+            commune_scope = self._get_commune_scope(region_id, prefecture_id, commune_id)
+            
+            since = request.GET.get('since')
+            if since:
+                return self._delta_response(request, results, commune_scope, bbox, zoom, precision, types, since)
             
-            if target_commune_ids is not None and len(target_commune_ids) == 0:
+            # Curseur lu avant les données: un changement concurrent sera renvoyé au prochain since
+            results['cursor'] = DeltaSync.encode_cursor(*DeltaSync.current_cursor())
+            
+            output_format = request.accepted_renderer.format
+            streaming = output_format in (GeoJSONRenderer.format, NDJSONRenderer.format)
+            binary = output_format in (FlatGeobufRenderer.format, GeobufRenderer.format)
+            
+            if commune_scope.is_empty and not (streaming or binary):
                 # Aucune commune trouvée pour les filtres donnés
-                print("⚠️ Aucune commune trouvée pour ces filtres")
+                logger.info("collectes: paramètres de commune invalides, réponse vide")
                 return Response(results)
             
-            print(f"🎯 Communes ciblées: {len(target_commune_ids) if target_commune_ids else 'toutes'}")
+            # Construction du GeoJSON dans PostGIS, couche par couche
+            # Pas de regroupement en mode paginé: les pages suivent les objets un par un
+            engine = GeoJSONEngine(
+                commune_scope, bbox=bbox, zoom=zoom, precision=precision,
+                cluster_cell=cluster_cell_for_zoom(zoom) if cluster and page_size is None else None,
+            )
+            type_names = InfrastructureLayers.selected_types(types)
             
-            # Chargement des infrastructures avec filtrage
-            self._load_point_infrastructures(results, target_commune_ids, types)
-            self._load_linear_infrastructures(results, target_commune_ids, types)
+            if page_size is not None:
+                return self._page_response(request, engine, type_names, page_size, results)
             
-            processing_time = time.time() - start_time
-            results['total'] = len(results['features'])
-            results['processing_time'] = f"{processing_time:.2f}s"
+            if streaming:
+                return self._streaming_response(engine, type_names, output_format, results)
             
-            print(f"✅ {results['total']} features retournées en {processing_time:.2f}s")
+            if binary:
+                # Encodage binaire fait par PostGIS, métadonnées dans les en-têtes
+                return HttpResponse(
+                    engine.fetch_binary(type_names, output_format),
+                    content_type=request.accepted_renderer.media_type,
+                    headers={'X-Collectes-Cursor': results['cursor']},
+                )
             
-            return Response(results)
+            with timing_span('layers', f"{len(type_names)} couches"):
+                fragments, total = engine.fetch_features(type_names)
+            for type_name, layer_timing in engine.layer_timings.items():
+                record_span(
+                    f"layer-{type_name}", layer_timing['ms'],
+                    'cache' if layer_timing['cached'] else f"{layer_timing['count']} features",
+                )
+            
+            processing_time = time.time() - start_time
+            logger.debug("collectes: %s features en %.2fs", total, processing_time)
+            
+            body = engine.render_collection(fragments, total, {
+                'filters_applied': results['filters_applied'],
+                'timestamp': results['timestamp'],
+                'processing_time': f"{processing_time:.2f}s",
+                'generalisation_level': engine.generalisation_level,
+                'precision': engine.precision,
+                'cluster_cell': engine.cluster_cell,
+                'layer_timings': engine.layer_timings,
+                'cursor': results['cursor'],
+            })
+            return HttpResponse(body, content_type='application/json')
             
         except Exception as e:
-            print(f" Erreur dans CollectesGeoAPIView: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Erreur dans CollectesGeoAPIView")
             return Response({
                 'error': str(e), 
                 'type': type(e).__name__,
                 'details': 'Erreur lors de la récupération des données spatiales'
             }, status=500)
 
-    def _get_target_communes(self, region_id, prefecture_id, commune_id):
+    def _delta_response(self, request, results, commune_scope, bbox, zoom, precision, types, since):
         """
-        Calcule la liste des communes à inclure selon les filtres hiérarchiques
-        Retourne None pour "toutes les communes" ou une liste d'IDs
+        Synchronisation incrémentale: features créées ou modifiées depuis le curseur,
+        et tombstones ("deleted") pour les objets supprimés ou sortis des filtres
         """
+        start_time = time.time()
         try:
-            if commune_id:
-                # Filtre par commune spécifique
-                return [int(commune_id)]
-            
-            elif prefecture_id:
-                # Filtre par préfecture - toutes ses communes
-                communes = CommuneRurale.objects.filter(prefectures_id_id=int(prefecture_id))
-                return list(communes.values_list('id', flat=True))
-            
-            elif region_id:
-                # Filtre par région - toutes les communes de ses préfectures
-                communes = CommuneRurale.objects.filter(
-                    prefectures_id__regions_id_id=int(region_id)
-                )
-                return list(communes.values_list('id', flat=True))
-            
-            else:
-                # Aucun filtre géographique - toutes les communes
-                return None
-                
-        except (ValueError, TypeError) as e:
-            print(f" Erreur calcul communes cibles: {e}")
-            return []
-
-    def _should_include_type(self, type_name, types_filter):
-        """Vérifie si ce type doit être inclus selon les filtres"""
-        if not types_filter:
-            return True
-        return type_name in types_filter
-
-    def _load_point_infrastructures(self, results, target_commune_ids, types_filter):
-        point_models = {
-            'services_santes': ServicesSantes,
-            'ponts': Ponts,
-            'buses': Buses,
-            'dalots': Dalots,
-            'ecoles': Ecoles,
-            'marches': Marches,
-            'batiments_administratifs': BatimentsAdministratifs,
-            'infrastructures_hydrauliques': InfrastructuresHydrauliques,
-            'localites': Localites,
-            'autres_infrastructures': AutresInfrastructures,
-            'points_coupures': PointsCoupures,      
-            'points_critiques': PointsCritiques,
-        }
+            since_cursor = DeltaSync.decode_cursor(since)
+            DeltaSync.check_retention(since_cursor[0])
+        except CursorExpiredError as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except CursorError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        for type_name, model_class in point_models.items():
-            if not self._should_include_type(type_name, types_filter):
-                continue
-                
-            try:
-                queryset = model_class.objects.filter(geom__isnull=False)
-                
-                if target_commune_ids is not None:
-                    queryset = queryset.filter(commune_id__in=target_commune_ids)
-                
-                for item in queryset:
-                    try:
-                        if item.geom:
-                            commune_id = item.commune_id.id if item.commune_id else None
-                            
-                            feature = {
-                                'type': 'Feature',
-                                'id': f"{type_name}_{item.fid}",
-                                'geometry': {
-                                    'type': 'Point',
-                                    'coordinates': [float(item.geom.x), float(item.geom.y)]
-                                },
-                                'properties': {
-                                    'fid': int(item.fid),
-                                    'type': type_name,  
-                                    'commune_id': commune_id
-                                    
-                                }
-                            }
-                            results['features'].append(feature)
-                    except Exception as e:
-                        continue
-                        
-            except Exception as e:
-                print(f"Erreur chargement {type_name}: {e}")
-                continue
-                        
-            except Exception as e:
-                print(f"Erreur chargement {type_name}: {e}")
-                continue
-
-    def _load_linear_infrastructures(self, results, target_commune_ids, types_filter):
-        """Charge les infrastructures linéaires avec filtrage géographique"""
+        type_names = InfrastructureLayers.selected_types(types)
+        until_id, until_xmin = DeltaSync.current_cursor()
+        changes = DeltaSync.changes_since(since_cursor, until_id, type_names)
         
-        # CHARGEMENT DES BACS
-        if self._should_include_type('bacs', types_filter):
-            try:
-                bacs_queryset = Bacs.objects.filter(geom__isnull=False)
-                
-                if target_commune_ids is not None:
-                    bacs_queryset = bacs_queryset.filter(commune_id__in=target_commune_ids)
-                    print(f"  Filtrage bacs: {bacs_queryset.count()} éléments dans les communes {target_commune_ids}")
-                
-                for bac in bacs_queryset:
-                    try:
-                        if bac.geom:
-                            geom_type = bac.geom.geom_type
-                            coordinates = None
-                            
-                            if geom_type == 'Point':
-                                coordinates = [float(bac.geom.x), float(bac.geom.y)]
-                            elif geom_type == 'LineString':
-                                simplified_geom = bac.geom.simplify(0.01)
-                                coordinates = list(simplified_geom.coords)
-                            elif geom_type == 'MultiLineString':
-                                simplified_geom = bac.geom.simplify(0.01)
-                                coordinates = [list(line.coords) for line in simplified_geom]
-                            
-                            if coordinates:
-                                feature = {
-                                    'type': 'Feature', 
-                                    'id': f"bac_{bac.fid}",
-                                    'geometry': {
-                                        'type': geom_type,
-                                        'coordinates': coordinates
-                                    },
-                                    'properties': {
-                                        'fid': int(bac.fid),
-                                        'type': 'bacs',
-                                        'commune_id': bac.commune_id.id if bac.commune_id else None,
-                                        
-                                    }
-                                }
-                                results['features'].append(feature)
-                    except Exception as e:
-                        print(f"Erreur processing bac {bac.fid}: {e}")
-                        continue
-                        
-            except Exception as e:
-                print(f"Erreur chargement bacs: {e}")
+        upserted = {type_name: change['upserted'] for type_name, change in changes.items() if change['upserted']}
+        engine = GeoJSONEngine(commune_scope, bbox=bbox, zoom=zoom, feature_ids=upserted, precision=precision)
+        fragments, total = engine.fetch_features(list(upserted), use_cache=False)
         
-        # CHARGEMENT DES PISTES
-        if self._should_include_type('pistes', types_filter):
-            try:
-                piste_queryset = Piste.objects.filter(geom__isnull=False)
-                
-                if target_commune_ids is not None:
-                    piste_queryset = piste_queryset.filter(communes_rurales_id__in=target_commune_ids)
-                    print(f"  Filtrage pistes: {piste_queryset.count()} éléments dans les communes {target_commune_ids}")
-                
-                for piste in piste_queryset:
-                    try:
-                        if piste.geom:
-                            simplified_geom = piste.geom.simplify(0.01)
-                            
-                            if simplified_geom.empty:
-                                continue
-                            
-                            geom_4326 = simplified_geom
-                            
-                            coordinates = None
-                            if geom_4326.geom_type == 'LineString':
-                                coordinates = list(geom_4326.coords)
-                            elif geom_4326.geom_type == 'MultiLineString':
-                                coordinates = []
-                                for line in geom_4326:
-                                    coordinates.append(list(line.coords))
-                            
-                            if coordinates:
-                                feature = {
-                                    'type': 'Feature',
-                                    'id': f"piste_{piste.id}",
-                                    'geometry': {
-                                        'type': geom_4326.geom_type,
-                                        'coordinates': coordinates
-                                    },
-                                    'properties': {
-                                        'id': int(piste.id),
-                                        'type': 'pistes',
-                                        'commune_id': piste.communes_rurales_id.id if piste.communes_rurales_id else None,
-                                        
-                                    }
-                                }
-                                results['features'].append(feature)
-                    except Exception as e:
-                        print(f"Erreur processing piste {piste.id}: {e}")
-                        continue
-                
-            except Exception as e:
-                print(f"Erreur chargement pistes: {e}")
-        #  CHARGEMENT DES CHAUSSÉES
-        if self._should_include_type('chaussees', types_filter):
-            try:
-                chaussees_queryset = Chaussees.objects.filter(geom__isnull=False)
-                
-                if target_commune_ids is not None:
-                    chaussees_queryset = chaussees_queryset.filter(communes_rurales_id__in=target_commune_ids)
-                    print(f"  Filtrage chaussées: {chaussees_queryset.count()} éléments dans les communes {target_commune_ids}")
-                
-                for chaussee in chaussees_queryset:
-                    try:
-                        if chaussee.geom:
-                            # Vérifier si c'est déjà en WGS84 (SRID 4326)
-                            if chaussee.geom.srid == 4326:
-                                geom_4326 = chaussee.geom
-                            else:
-                                geom_4326 = chaussee.geom
-                            
-                            # Extraire les coordonnées MultiLineString
-                            if geom_4326.geom_type == 'LineString':
-                                coordinates = list(geom_4326.coords)
-                            elif geom_4326.geom_type == 'MultiLineString':
-                                coordinates = [list(line.coords) for line in geom_4326]
-                            else:
-                                continue
-                            
-                            feature = {
-                                'type': 'Feature',
-                                'id': f"chaussee_{chaussee.fid}",
-                                'geometry': {
-                                    'type': geom_4326.geom_type,
-                                    'coordinates': coordinates
-                                },
-                                'properties': {
-                                    'fid': int(chaussee.fid),
-                                    'type': 'chaussees',
-                                    'commune_id': chaussee.communes_rurales_id.id if chaussee.communes_rurales_id else None,
-                                    'type_chaus': chaussee.type_chaus,
-                                    'etat_piste': chaussee.etat_piste,
-                                    'code_piste': chaussee.code_piste_id if chaussee.code_piste_id else None
-                                }
-                            }
-                            results['features'].append(feature)
-                            
-                    except Exception as e:
-                        print(f" Erreur processing chaussée {chaussee.fid}: {e}")
-                        continue
-                        
-            except Exception as e:
-                print(f" Erreur chargement chaussées: {e}")
-        #  PASSAGES_SUBMERSIBLES comme LineString
-        if self._should_include_type('passages_submersibles', types_filter):
+        deleted = []
+        for type_name, change in changes.items():
+            removed = set(change['deleted'])
+            if change['upserted']:
+                # Modifiés mais hors des filtres demandés: à retirer côté client
+                removed |= set(change['upserted']) - engine.matching_ids(type_name)
+            prefix = InfrastructureLayers.feature_id_prefix(type_name)
+            deleted += [{'type': type_name, 'id': f"{prefix}_{feature_id}"} for feature_id in sorted(removed)]
+        
+        processing_time = time.time() - start_time
+        body = engine.render_collection(fragments, total, {
+            'filters_applied': results['filters_applied'],
+            'timestamp': results['timestamp'],
+            'processing_time': f"{processing_time:.2f}s",
+            'generalisation_level': engine.generalisation_level,
+            'precision': engine.precision,
+            'layer_timings': engine.layer_timings,
+            'since': since,
+            'cursor': DeltaSync.encode_cursor(until_id, until_xmin),
+            'deleted': deleted,
+        })
+        return HttpResponse(body, content_type='application/json')
+
+    def _page_response(self, request, engine, type_names, page_size, results):
+        """
+        Page ordonnée par (type, id): ?after=<next_cursor> reprend après le dernier
+        objet de la page précédente (pas d'OFFSET, reprise possible d'un téléchargement)
+        """
+        start_time = time.time()
+        after = None
+        page_cursor = request.GET.get('after')
+        if page_cursor:
             try:
-                queryset = PassagesSubmersibles.objects.filter(geom__isnull=False)
-                
-                if target_commune_ids is not None:
-                    queryset = queryset.filter(commune_id__in=target_commune_ids)
-                
-                for passage in queryset:
-                    try:
-                        if passage.geom:
-                            # Vérifier si c'est déjà en WGS84 (SRID 4326)
-                            if passage.geom.srid == 4326:
-                                geom_4326 = passage.geom
-                            else:
-                                geom_4326 = passage.geom
-                            
-                            # Extraire les coordonnées LineString
-                            coordinates = list(geom_4326.coords)
-                            
-                            feature = {
-                                'type': 'Feature',
-                                'id': f"passages_submersibles_{passage.fid}",
-                                'geometry': {
-                                    'type': 'LineString',
-                                    'coordinates': coordinates
-                                },
-                                'properties': {
-                                    'fid': int(passage.fid),
-                                    'type': 'passages_submersibles',
-                                    'commune_id': passage.commune_id.id if passage.commune_id else None,
-                                    
-                                }
-                            }
-                            results['features'].append(feature)
-                            
-                    except Exception as e:
-                        print(f"Erreur processing passage {passage.fid}: {e}")
-                        continue
-                        
-            except Exception as e:
-                print(f"Erreur chargement passages_submersibles: {e}")
+                after = KeysetCursor.decode(page_cursor)
+            except CursorError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            fragments, total, last = engine.fetch_page(type_names, page_size, after)
+        except CursorError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        next_cursor = KeysetCursor.encode(*last) if last else None
+        
+        processing_time = time.time() - start_time
+        body = engine.render_collection(fragments, total, {
+            'filters_applied': results['filters_applied'],
+            'timestamp': results['timestamp'],
+            'processing_time': f"{processing_time:.2f}s",
+            'generalisation_level': engine.generalisation_level,
+            'precision': engine.precision,
+            'cursor': results['cursor'],
+            'next_cursor': next_cursor,
+            'next': replace_query_param(request.build_absolute_uri(), 'after', next_cursor) if next_cursor else None,
+        })
+        return HttpResponse(body, content_type='application/json')
+
+    def _streaming_response(self, engine, type_names, output_format, results):
+        """
+        Réponse en flux: la mémoire reste constante quel que soit le nombre
+        de features (gzip_page compresse les paquets au fil de l'eau)
+        """
+        if output_format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                engine.stream_ndjson(type_names),
+                content_type=NDJSONRenderer.media_type,
+            )
+        return StreamingHttpResponse(
+            engine.stream_collection(type_names, {
+                'filters_applied': results['filters_applied'],
+                'timestamp': results['timestamp'],
+                'generalisation_level': engine.generalisation_level,
+                'precision': engine.precision,
+                'cluster_cell': engine.cluster_cell,
+                'cursor': results['cursor'],
+            }),
+            content_type=GeoJSONRenderer.media_type,
+        )
+
+    def _get_commune_scope(self, region_id, prefecture_id, commune_id):
+        """
+        Filtre hiérarchique à appliquer (CommuneScope): traduit en sous-requête
+        SQL par couche, sans charger la liste des communes en Python
+        """
+        return GeoQueryHelper.get_commune_scope(region_id, prefecture_id, commune_id)
+
+
 
+def density_watermark_tables(request):
+    """Tables lues par /api/collectes/density/ pour ces filtres"""
+    tables = [
+        InfrastructureLayers.table(InfrastructureLayers.get_model(type_name))
+        for type_name in InfrastructureLayers.selected_types(request.GET.getlist('types', []))
+    ]
+    return tables + ['communes_rurales', 'prefectures']
+
+
+@method_decorator(gzip_page, name='dispatch')
+@method_decorator(watermark_etag(density_watermark_tables), name='get')
+class DensityGridAPIView(APIView):
+    """
+    Densité des collectes par cellule de grille, calculée dans PostGIS
+
+    resolution=<0-6> : taille des cellules (0 = 50 km ... 6 = 500 m)
+    shape=hex|square : hexagones (défaut) ou carrés
+    types, region_id, prefecture_id, commune_id, bbox : mêmes filtres que /api/collectes/
+    """
+
+    def get(self, request):
+        start_time = time.time()
+        
+        try:
+            resolution = int(request.GET.get('resolution', DEFAULT_RESOLUTION))
+        except (ValueError, TypeError):
+            return Response({'error': 'resolution invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        if resolution not in DENSITY_RESOLUTIONS:
+            return Response({
+                'error': f"resolution hors limites ({min(DENSITY_RESOLUTIONS)}-{max(DENSITY_RESOLUTIONS)})"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        shape = request.GET.get('shape', 'hex')
+        if shape not in GRID_SHAPES:
+            return Response({
+                'error': f"shape invalide ({', '.join(GRID_SHAPES)})"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        bbox, bbox_error = parse_bbox(request.GET.get('bbox'))
+        if bbox_error:
+            return Response({'error': bbox_error}, status=status.HTTP_400_BAD_REQUEST)
+        
+        types = request.GET.getlist('types', [])
+        commune_scope = GeoQueryHelper.get_commune_scope(
+            request.GET.get('region_id'),
+            request.GET.get('prefecture_id'),
+            request.GET.get('commune_id'),
+        )
+        
+        try:
+            grid = DensityGrid(
+                InfrastructureLayers.selected_types(types),
+                resolution=resolution, shape=shape, commune_scope=commune_scope, bbox=bbox,
+            )
+            total, features = grid.fetch()
+        except Exception as e:
+            logger.exception("Erreur dans DensityGridAPIView")
+            return Response({
+                'error': str(e),
+                'type': type(e).__name__,
+                'details': 'Erreur lors du calcul de densité'
+            }, status=500)
+        
+        processing_time = time.time() - start_time
+        body = GeoJSONEngine.render_collection([features[1:-1]] if total else [], total, {
+            'resolution': resolution,
+            'cell_size_m': grid.cell_size,
+            'shape': shape,
+            'filters_applied': {
+                'region_id': request.GET.get('region_id'),
+                'prefecture_id': request.GET.get('prefecture_id'),
+                'commune_id': request.GET.get('commune_id'),
+                'types': types,
+                'bbox': list(bbox) if bbox else None,
+            },
+            'processing_time': f"{processing_time:.2f}s",
+        })
+        return HttpResponse(body, content_type='application/json')
 
 
 class CommunesSearchAPIView(APIView):
-    """API de recherche communes"""
+    """API de recherche communes (index en mémoire, insensible aux accents, classé)"""
     
     def get(self, request):
         query = request.GET.get('q', '').strip()
@@ -373,21 +397,16 @@ class CommunesSearchAPIView(APIView):
             })
         
         try:
-            communes = CommuneRurale.objects.filter(
-                nom__icontains=query
-            ).select_related('prefectures_id__regions_id').order_by('nom')[:20]
-            
-            results = []
-            for commune in communes:
-                prefecture_nom = commune.prefectures_id.nom if commune.prefectures_id else "N/A"
-                region_nom = commune.prefectures_id.regions_id.nom if commune.prefectures_id and commune.prefectures_id.regions_id else "N/A"
-                
-                results.append({
-                    'id': commune.id,
-                    'nom': commune.nom,
-                    'prefecture': prefecture_nom,
-                    'region': region_nom,
-                })
+            matches = AdminNameSearch.search(query, types={'commune'})
+            results = [
+                {
+                    'id': match['id'],
+                    'nom': match['nom'],
+                    'prefecture': match['prefecture'] or "N/A",
+                    'region': match['region'] or "N/A",
+                }
+                for match in matches
+            ]
             
             return Response({
                 'communes': results,
@@ -2,12 +2,16 @@ from django.db.models import Count, Q, Min, Max # type: ignore
 from django.db.models.functions import TruncDate, TruncMonth, TruncYear, TruncWeek # type: ignore
 from rest_framework.views import APIView # type: ignore
 from rest_framework.response import Response # type: ignore
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta, date, timezone as dt_timezone
 from django.utils import timezone # type: ignore
 from django.db import connection # type: ignore
 from .models import *
+from .point_union import PointInfrastructureUnion
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 class TemporalAnalysisAPIView(APIView):
     """
     API pour analyses temporelles - Version finale sans erreur ValidationError
@@ -25,8 +29,7 @@ class TemporalAnalysisAPIView(APIView):
         specific_month = request.GET.get('month', '')
         specific_day = request.GET.get('day', '')
         
-        print(f"\n🔍 === ANALYSE TEMPORELLE FINALE ===")
-        print(f"📋 Paramètres: period_type={period_type}, types={types_param}")
+        logger.debug("analyse temporelle period_type=%s types=%s", period_type, types_param)
         
         try:
             # Configuration des modèles avec types corrigés
@@ -35,11 +38,11 @@ class TemporalAnalysisAPIView(APIView):
             # Si aucun type spécifié, utiliser tous les types disponibles
             if not types_param:
                 types_param = list(models_config.keys())
-                print(f"✅ Types utilisés (tous): {types_param}")
+                logger.debug("types utilisés (tous): %s", types_param)
             else:
                 # Mapper les types frontend vers backend
                 types_param = self._map_frontend_types(types_param)
-                print(f"✅ Types mappés: {types_param}")
+                logger.debug("types mappés: %s", types_param)
             
             # Déterminer la plage de dates
             start_date, end_date = self._calculate_date_range(
@@ -47,7 +50,7 @@ class TemporalAnalysisAPIView(APIView):
                 specific_day, date_from, date_to
             )
             
-            print(f"📅 Période d'analyse: {start_date.strftime('%Y-%m-%d')} → {end_date.strftime('%Y-%m-%d')}")
+            logger.debug("période d'analyse: %s → %s", start_date.date(), end_date.date())
             
             # Fonction de troncature selon la période
             trunc_functions = {
@@ -62,23 +65,39 @@ class TemporalAnalysisAPIView(APIView):
             total_by_period = {}
             debug_details = {}
             
+            # Types à dates VARCHAR: comptage par période sur created_at_ts (index),
+            # tous types en une requête UNION ALL
+            varchar_types = [
+                type_name for type_name in types_param
+                if type_name in models_config and models_config[type_name]['is_varchar_date']
+            ]
+            # Une erreur de cette requête est rapportée pour chacun de ces types
+            period_counts = {}
+            period_counts_error = None
+            if varchar_types:
+                try:
+                    period_counts = self._fetch_period_counts_union(varchar_types, start_date, end_date, period_type)
+                except Exception as sql_error:
+                    period_counts_error = sql_error
+            
             # Analyser chaque type demandé
             for type_name in types_param:
                 if type_name not in models_config:
-                    print(f"⚠️ Type {type_name} non trouvé dans la config")
+                    logger.warning("type %s non trouvé dans la config", type_name)
                     continue
                 
                 config = models_config[type_name]
-                print(f"\n🔧 Configuration pour {type_name}:")
-                print(f"  Model: {config['model'].__name__}")
-                print(f"  Date field: {config['date_field']}")
-                print(f"  Is VARCHAR: {config['is_varchar_date']}")
+                logger.debug(
+                    "%s: modèle %s, champ %s, varchar=%s",
+                    type_name, config['model'].__name__, config['date_field'], config['is_varchar_date'],
+                )
                 
                 try:
                     if config['is_varchar_date']:
-                        # Pour les champs VARCHAR, utiliser uniquement SQL direct
-                        type_results, debug_info = self._process_varchar_dates_sql_only(
-                            config, type_name, start_date, end_date, period_type, total_by_period
+                        if period_counts_error is not None:
+                            raise period_counts_error
+                        type_results, debug_info = self._format_period_counts(
+                            period_counts.get(type_name, []), period_type, total_by_period
                         )
                     else:
                         # Pour les vrais DateTime, utiliser l'ORM normalement
@@ -91,12 +110,12 @@ class TemporalAnalysisAPIView(APIView):
                     
                     if type_results:
                         results[type_name] = type_results
-                        print(f"✅ {type_name}: {len(type_results)} périodes trouvées")
+                        logger.debug("%s: %s périodes trouvées", type_name, len(type_results))
                     else:
-                        print(f"⚠️ {type_name}: aucune donnée dans la période")
+                        logger.debug("%s: aucune donnée dans la période", type_name)
                 
                 except Exception as model_error:
-                    print(f"❌ Erreur {type_name}: {model_error}")
+                    logger.warning("Erreur analyse temporelle %s: %s", type_name, model_error)
                     debug_details[type_name] = {'error': str(model_error)}
                     continue
             
@@ -113,7 +132,7 @@ class TemporalAnalysisAPIView(APIView):
                 'tendance': self._calculate_trend(all_counts)
             }
             
-            print(f"🎯 Résultats finaux: {len(results)} types, {total_collectes} collectes total")
+            logger.debug("résultats: %s types, %s collectes", len(results), total_collectes)
             
             return Response({
                 'success': True,
@@ -138,127 +157,71 @@ class TemporalAnalysisAPIView(APIView):
             })
             
         except Exception as e:
-            print(f"💥 Erreur globale: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Erreur dans TemporalAnalysisAPIView")
             return Response({
                 'success': False,
                 'error': str(e),
                 'debug': 'Erreur dans TemporalAnalysisAPIView finale'
             }, status=500)
     
-    def _process_varchar_dates_sql_only(self, config, type_name, start_date, end_date, 
-                                      period_type, total_by_period):
-        """Traitement UNIQUEMENT SQL pour éviter l'ORM Django"""
-        
-        print(f"\n📊 Analyse {type_name.upper()} - VARCHAR (SQL SEUL)")
-        
-        model = config['model']
-        date_field = config['date_field']
-        id_field = config['id_field']
-        table_name = model._meta.db_table
-        
-        # Requête SQL pure - AUCUN ORM
-        raw_records = []
-        
-        try:
-            with connection.cursor() as cursor:
-                # Requête SQL directe avec filtrage strict
-                sql = f"""
-                SELECT {id_field}, {date_field}
-                FROM {table_name}
-                WHERE {date_field} IS NOT NULL 
-                  AND {date_field} != ''
-                  AND {date_field} != 'null'
-                  AND LENGTH(TRIM({date_field})) > 10
-                  AND {date_field} LIKE '20%%/%%/%%'
-                ORDER BY {id_field}
-                LIMIT 1000
-                """
-                
-                print(f"  🔍 SQL: {sql}")
-                cursor.execute(sql)
-                raw_records = cursor.fetchall()
-                
-        except Exception as sql_error:
-            print(f"  ❌ Erreur SQL: {sql_error}")
-            return [], {'total_records': 0, 'valid_dates': 0, 'in_range_dates': 0, 'sql_error': str(sql_error)}
-        
-        total_records = len(raw_records)
-        print(f"  📊 Enregistrements récupérés: {total_records}")
-        
-        if total_records == 0:
-            return [], {'total_records': 0, 'valid_dates': 0, 'in_range_dates': 0}
-        
-        # Afficher exemples pour debug
-        print(f"  📋 Exemples de dates:")
-        for i, record in enumerate(raw_records[:3]):
-            print(f"    {i+1}. ID={record[0]}, Date='{record[1]}'")
-        
-        # Parser manuellement chaque date
-        period_counts = {}
-        valid_count = 0
-        in_range_count = 0
-        
-        start_date_only = start_date.date()
-        end_date_only = end_date.date()
-        
-        for record in raw_records:
-            record_id = record[0]
-            date_str = record[1]
-            
-            if not date_str:
-                continue
-                
-            date_str_clean = str(date_str).strip()
-            if not date_str_clean or date_str_clean.lower() in ['null', 'none', '']:
-                continue
-            
-            try:
-                # Parsing pour format YYYY/MM/DD HH:MM:SS.mmm
-                parsed_date = self._parse_varchar_date_robust(date_str_clean)
-                
-                if parsed_date:
-                    valid_count += 1
-                    
-                    # Vérifier si dans la période demandée
-                    if start_date_only <= parsed_date <= end_date_only:
-                        in_range_count += 1
-                        
-                        # Calculer la clé de période
-                        period_key = self._get_period_key(parsed_date, period_type)
-                        period_counts[period_key] = period_counts.get(period_key, 0) + 1
-                
-            except Exception as e:
-                continue
-        
-        print(f"  ✅ Dates valides: {valid_count}/{total_records}")
-        print(f"  📅 Dans la période: {in_range_count}")
-        print(f"  📊 Périodes trouvées: {len(period_counts)}")
-        
-        # Convertir en format attendu
+    def _fetch_period_counts_union(self, type_names, start_date, end_date, period_type):
+        """
+        {type: [(début de période, nombre)]} depuis created_at_ts (migration 0013),
+        bornes en jours entiers: parcours de l'index created_at_ts de chaque table,
+        sans limite de lignes. Les lignes dont la copie n'est pas encore remplie
+        (conversion en masse pas encore passée) sont converties à la volée depuis
+        created_at (index partiel sur ces lignes).
+        """
+        range_start = datetime.combine(start_date.date(), datetime.min.time(), tzinfo=dt_timezone.utc)
+        range_end = datetime.combine(end_date.date() + timedelta(days=1), datetime.min.time(), tzinfo=dt_timezone.utc)
+        converted_sql, converted_params = PointInfrastructureUnion.union_sql(
+            type_names, columns=['created_at_ts'],
+            where_for=lambda type_name: (
+                ["t.created_at_ts >= %s", "t.created_at_ts < %s"], [range_start, range_end],
+            ),
+        )
+        pending_sql, pending_params = PointInfrastructureUnion.union_sql(
+            type_names, columns=['created_at'],
+            where_for=lambda type_name: (["t.created_at_ts IS NULL", "t.created_at IS NOT NULL"], []),
+        )
+        # Périodes de _format_period (jour par défaut)
+        unit = period_type if period_type in ('day', 'week', 'month', 'year') else 'day'
+        sql = f"""
+            SELECT u.type, date_trunc(%s, u.ts AT TIME ZONE 'UTC')::date AS period, count(*)
+            FROM (
+                SELECT c.type, c.created_at_ts AS ts FROM ({converted_sql}) c
+                UNION ALL
+                SELECT p.type, parse_horodatage_texte(p.created_at) FROM ({pending_sql}) p
+            ) u
+            WHERE u.ts >= %s AND u.ts < %s
+            GROUP BY u.type, period
+            ORDER BY u.type, period
+        """
+        params = [unit] + converted_params + pending_params + [range_start, range_end]
+        counts = {type_name: [] for type_name in type_names}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for type_name, period, count in cursor.fetchall():
+                counts[type_name].append((period, count))
+        return counts
+    
+    def _format_period_counts(self, counts, period_type, total_by_period):
+        """[(début de période, nombre)] -> résultats au format de l'API"""
         results = []
-        for period_date, count in sorted(period_counts.items()):
+        for period_date, count in counts:
             period_str = self._format_period(period_date, period_type)
-            
             results.append({
                 'period': period_str,
                 'date': period_date.isoformat(),
                 'count': count
             })
-            
-            # Ajouter au total global
-            if period_str not in total_by_period:
-                total_by_period[period_str] = 0
-            total_by_period[period_str] += count
+            total_by_period[period_str] = total_by_period.get(period_str, 0) + count
         
         debug_info = {
-            'total_records': total_records,
-            'valid_dates': valid_count,
-            'in_range_dates': in_range_count,
-            'periods_found': len(period_counts)
+            'in_range_dates': sum(count for _period, count in counts),
+            'periods_found': len(counts),
+            'source': 'created_at_ts'
         }
-        
         return results, debug_info
     
     def _get_models_config(self):
@@ -427,7 +390,7 @@ class TemporalAnalysisAPIView(APIView):
                                        period_type, total_by_period, trunc_func):
         """Traitement pour les champs DateTime natifs (table pistes)"""
         
-        print(f"\n📊 Analyse {type_name.upper()} - DATETIME")
+        logger.debug("analyse %s - DATETIME", type_name)
         
         model = config['model']
         date_field = config['date_field']
@@ -452,9 +415,10 @@ class TemporalAnalysisAPIView(APIView):
             count=Count(id_field)
         ).order_by('period_truncated')
         
-        print(f"  📊 Total enregistrements: {total_records}")
-        print(f"  📅 Dans la période: {in_range_count}")
-        print(f"  📊 Périodes trouvées: {len(temporal_data)}")
+        logger.debug(
+            "%s: %s enregistrements, %s dans la période, %s périodes",
+            type_name, total_records, in_range_count, len(temporal_data),
+        )
         
         # Formater les résultats avec tri correct
         results = []
@@ -483,70 +447,6 @@ class TemporalAnalysisAPIView(APIView):
         
         return results, debug_info
     
-    def _parse_varchar_date_robust(self, date_str):
-        """Parser robuste spécialement conçu pour le format YYYY/MM/DD HH:MM:SS.mmm"""
-        if not date_str or date_str.strip() == '':
-            return None
-        
-        try:
-            date_str_clean = str(date_str).strip()
-            
-            # Format principal: YYYY/MM/DD HH:MM:SS.mmm
-            # Exemple: "2025/02/28 21:49:55.000"
-            if '/' in date_str_clean and ' ' in date_str_clean:
-                date_part = date_str_clean.split(' ')[0]  # Prendre seulement la partie date
-                
-                parts = date_part.split('/')
-                if len(parts) == 3:
-                    year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                    
-                    # Validation stricte
-                    if self._is_valid_date(year, month, day):
-                        return date(year, month, day)
-            
-            # Format alternatif: YYYY/MM/DD sans heure
-            elif '/' in date_str_clean:
-                parts = date_str_clean.split('/')
-                if len(parts) == 3:
-                    year, month, day = int(parts[0]), int(parts[1]), int(parts[2])
-                    
-                    if self._is_valid_date(year, month, day):
-                        return date(year, month, day)
-            
-        except (ValueError, IndexError, AttributeError) as e:
-            pass
-        
-        return None
-    
-    def _is_valid_date(self, year, month, day):
-        """Vérifier si une date est valide et cohérente"""
-        try:
-            if not (2020 <= year <= 2030):  # Plage réaliste pour le projet
-                return False
-            if not (1 <= month <= 12):
-                return False
-            if not (1 <= day <= 31):
-                return False
-            
-            # Test de création de date pour vérifier la validité
-            date(year, month, day)
-            return True
-        except ValueError:
-            return False
-    
-    def _get_period_key(self, parsed_date, period_type):
-        """Calculer la clé de période pour un objet date"""
-        if period_type == 'month':
-            return parsed_date.replace(day=1)
-        elif period_type == 'year':
-            return parsed_date.replace(month=1, day=1)
-        elif period_type == 'day':
-            return parsed_date
-        elif period_type == 'week':
-            return parsed_date - timedelta(days=parsed_date.weekday())
-        else:
-            return parsed_date
-    
     def _format_period(self, date_obj, period_type):
         """Formater la période selon le type - CORRIGÉ pour tri chronologique"""
         if period_type == 'day':
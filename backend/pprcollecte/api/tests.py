@@ -1,3 +1,609 @@
-from django.test import TestCase # type: ignore
+import base64
+import importlib
+import json
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+import shapely # type: ignore
+from django.contrib.gis.geos import LineString, MultiLineString, Point # type: ignore
+from django.core.management import call_command # type: ignore
+from django.db import connection, transaction # type: ignore
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings # type: ignore
+from django.urls import reverse # type: ignore
+from django.utils import timezone # type: ignore
+
+from .boundaries import TopologyBuilder
+from .conditional import bump_table_version, change_tracking_disabled, get_table_versions
+from .density import GRID_SHAPES, HEX_HALF_HEIGHT, DensityGrid
+from .delta_sync import CursorError, CursorExpiredError, DeltaSync
+from .geojson_engine import GeoJSONEngine
+from .horodatages import TimestampBackfill
+from .locator import CommuneIndex
+from .models import ChangementInfrastructure, CommuneRurale, Ecoles, Login, Piste, Ponts, Prefecture, Region
+from .pagination import MAX_PAGE_SIZE, KeysetCursor
+from .spatial_utils import DEFAULT_PRECISION, InfrastructureLayers, precision_for_units, precision_for_zoom
+from .spatial_views import collectes_watermark_tables
+
+
+def migration(name):
+    return importlib.import_module(f'api.migrations.{name}')
+
+
+def ensure_tables(*models):
+    """
+    Crée dans la base de test les tables non gérées par Django qui manquent
+    (elles existent déjà en production), dans l'ordre des clés étrangères
+    """
+    existing = set(connection.introspection.table_names())
+    with connection.schema_editor() as editor:
+        for model in models:
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def install_tracking(table, pk):
+    """Triggers de version (0008) et de journal (0009) de la table, comme en production"""
+    with connection.cursor() as cursor:
+        cursor.execute(migration('0008_tableversion').create_trigger_sql(table))
+        cursor.execute(migration('0009_changementinfrastructure').create_trigger_sql(table, pk))
+
+
+def create_pont(**fields):
+    fields.setdefault('geom', Point(-13.7, 9.5, srid=4326))
+    return Ponts.objects.create(**fields)
+
+
+class ConditionalRequestTests(TestCase):
+    """ETag dérivé des versions de tables (watermark_etag) et réponses 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts)
+        create_pont(created_at='2025/02/28 21:49:55.000')
+        cls.url = reverse('api-ponts')
+
+    def test_revalidation_returns_304_without_body(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_write_to_table_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        bump_table_version('ponts')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_write_to_other_table_keeps_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        bump_table_version('ecoles')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_query_parameters(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, {'precision': 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_collectes_depend_on_generalised_geometries_only_when_read(self):
+        def tables(**params):
+            return collectes_watermark_tables(RequestFactory().get('/api/collectes/', params))
+
+        self.assertIn('geometries_generalisees', tables(types='pistes', zoom=8))
+        self.assertNotIn('geometries_generalisees', tables(types='pistes'))
+        self.assertNotIn('geometries_generalisees', tables(types='pistes', zoom=16))
+        self.assertNotIn('geometries_generalisees', tables(types='ponts', zoom=8))
+
+
+class PrecisionTests(TestCase):
+    """Décimales des coordonnées: déduites du zoom, converties pour les SRID projetés, ?precision="""
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts)
+        cls.pont = create_pont(geom=Point(-13.7123456, 9.5187654, srid=4326))
+        cls.url = reverse('api-ponts')
+
+    def coordinates(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        [feature] = json.loads(response.content)['features']
+        return feature['geometry']['coordinates']
+
+    def test_precision_for_zoom(self):
+        self.assertEqual(precision_for_zoom(None), DEFAULT_PRECISION)
+        self.assertEqual(precision_for_zoom(0), 1)
+        self.assertEqual(precision_for_zoom(10), 4)
+        self.assertEqual(precision_for_zoom(14), 5)
+        self.assertEqual(precision_for_zoom(22), 7)
+        self.assertEqual(precision_for_zoom(30), 7)
+        digits = [precision_for_zoom(zoom) for zoom in range(23)]
+        self.assertEqual(digits, sorted(digits))
+
+    def test_precision_for_units(self):
+        self.assertIsNone(precision_for_units(None, geodetic=False))
+        self.assertEqual(precision_for_units(6, geodetic=True), 6)
+        self.assertEqual(precision_for_units(6, geodetic=False), 1)
+        self.assertEqual(precision_for_units(3, geodetic=False), 0)
+        self.assertEqual(precision_for_units(0, geodetic=False), 0)
+
+    def test_list_rounds_coordinates(self):
+        self.assertEqual(self.coordinates(precision=2), [-13.71, 9.52])
+        self.assertEqual(self.coordinates(precision=0), [-14, 10])
+        self.assertEqual(self.coordinates(), [-13.7123456, 9.5187654])
+
+    def test_invalid_precision_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'precision': 10}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'precision': 'deux'}).status_code, 400)
+
+
+class DeltaSyncTests(TestCase):
+    """Synchronisation incrémentale: curseur, tombstones et 410 après purge"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts)
+        cls.url = reverse('api-collectes-geo')
+
+    def journal(self, feature_id, operation, **fields):
+        return ChangementInfrastructure.objects.create(
+            table_name='ponts', feature_id=feature_id, operation=operation, **fields
+        )
+
+    def delta(self, since):
+        return self.client.get(self.url, {'since': since, 'types': 'ponts'})
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(DeltaSync.decode_cursor(DeltaSync.encode_cursor(12, 345)), (12, 345))
+        self.assertEqual(DeltaSync.decode_cursor(DeltaSync.encode_cursor(12)), (12, None))
+
+    def test_legacy_cursor_is_accepted(self):
+        legacy = base64.urlsafe_b64encode(b'c1:42').decode('ascii').rstrip('=')
+        self.assertEqual(DeltaSync.decode_cursor(legacy), (42, None))
+
+    def test_invalid_cursor(self):
+        for value in ('', 'pas-un-curseur', base64.urlsafe_b64encode(b'c2:x:1').decode('ascii')):
+            with self.assertRaises(CursorError):
+                DeltaSync.decode_cursor(value)
+        self.assertEqual(self.delta('pas-un-curseur').status_code, 400)
+
+    def test_last_operation_wins(self):
+        since_id, _xmin = DeltaSync.current_cursor()
+        self.journal(1, 'I')
+        self.journal(1, 'U')
+        self.journal(2, 'I')
+        self.journal(2, 'D')
+        until_id, _xmin = DeltaSync.current_cursor()
+
+        changes = DeltaSync.changes_since((since_id, None), until_id, ['ponts'])
+        self.assertEqual(changes['ponts'], {'upserted': [1], 'deleted': [2]})
+
+    def test_change_committed_out_of_order_is_reread(self):
+        # Id attribué avant le curseur par une transaction encore en cours (txid >= xmin)
+        late = self.journal(3, 'U', txid=1000)
+        older = self.journal(4, 'U', txid=10)
+        until_id, _xmin = DeltaSync.current_cursor()
+
+        changes = DeltaSync.changes_since((until_id, 1000), until_id, ['ponts'])
+        self.assertEqual(changes['ponts']['upserted'], [late.feature_id])
+        self.assertNotIn(older.feature_id, changes['ponts']['upserted'])
+
+    def test_tombstones_and_next_cursor(self):
+        pont = create_pont()
+        since = DeltaSync.encode_cursor(*DeltaSync.current_cursor())
+        self.journal(pont.fid, 'U')
+        self.journal(999999, 'D')
+        # Modifié puis disparu de la table: retiré côté client aussi
+        self.journal(888888, 'U')
+
+        response = self.delta(since)
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual(body['total'], 1)
+        self.assertEqual(
+            sorted(item['id'] for item in body['deleted']),
+            ['ponts_888888', 'ponts_999999'],
+        )
+
+        # Rien de nouveau depuis le curseur renvoyé
+        again = json.loads(self.delta(body['cursor']).content)
+        self.assertEqual(again['total'], 0)
+        self.assertEqual(again['deleted'], [])
+
+    def test_cursor_before_purge_mark_is_gone(self):
+        DeltaSync.record_purge(100)
+        self.assertFalse(ChangementInfrastructure.objects.exists())
+
+        self.assertEqual(self.delta(DeltaSync.encode_cursor(50)).status_code, 410)
+        self.assertEqual(self.delta(DeltaSync.encode_cursor(100)).status_code, 200)
+
+    def test_empty_journal_cursor_starts_at_purge_mark(self):
+        DeltaSync.record_purge(100)
+        change_id, _xmin = DeltaSync.current_cursor()
+        self.assertEqual(change_id, 100)
+        DeltaSync.check_retention(change_id)
+
+    def test_purge_records_mark(self):
+        old = self.journal(5, 'U')
+        recent = self.journal(6, 'U')
+        ChangementInfrastructure.objects.filter(pk=old.pk).update(changed_at=timezone.now() - timedelta(days=120))
+
+        call_command('purger_changements', jours=90, stdout=StringIO())
+
+        self.assertEqual(DeltaSync.purge_mark(), old.pk)
+        self.assertEqual(list(ChangementInfrastructure.objects.values_list('pk', flat=True)), [recent.pk])
+        with self.assertRaises(CursorExpiredError):
+            DeltaSync.check_retention(old.pk - 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """Pages de /api/collectes/ par (type, id): limites de page et curseurs invalides"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts)
+        cls.ponts = [create_pont() for _ in range(4)]
+        cls.url = reverse('api-collectes-geo')
+
+    def page(self, page_size, after=None, **params):
+        params.update({'types': 'ponts', 'page_size': page_size})
+        if after:
+            params['after'] = after
+        return self.client.get(self.url, params)
+
+    def read_all(self, page_size):
+        pages = []
+        after = None
+        while True:
+            response = self.page(page_size, after)
+            self.assertEqual(response.status_code, 200)
+            body = json.loads(response.content)
+            pages.append([feature['id'] for feature in body['features']])
+            after = body['next_cursor']
+            if after is None:
+                self.assertIsNone(body['next'])
+                return pages
+
+    def test_exact_multiple_has_no_empty_last_page(self):
+        pages = self.read_all(2)
+        self.assertEqual([len(page) for page in pages], [2, 2])
+
+    def test_partial_last_page(self):
+        pages = self.read_all(3)
+        self.assertEqual([len(page) for page in pages], [3, 1])
+
+    def test_pages_follow_primary_key_without_overlap(self):
+        pages = self.read_all(1)
+        ids = [feature_id for page in pages for feature_id in page]
+        self.assertEqual(ids, [f"ponts_{pont.fid}" for pont in sorted(self.ponts, key=lambda pont: pont.fid)])
+
+    def test_single_page(self):
+        self.assertEqual(self.read_all(10), [[f"ponts_{pont.fid}" for pont in self.ponts]])
+
+    def test_unreadable_cursor_is_rejected(self):
+        self.assertEqual(self.page(2, after='pas-un-curseur').status_code, 400)
+        self.assertEqual(self.page(2, after=DeltaSync.encode_cursor(1)).status_code, 400)
+
+    def test_cursor_of_unrequested_layer_is_rejected(self):
+        response = self.page(2, after=KeysetCursor.encode('ecoles', self.ponts[0].fid))
+        self.assertEqual(response.status_code, 400)
+
+    def test_page_size_bounds(self):
+        self.assertEqual(self.page(0).status_code, 400)
+        self.assertEqual(self.page(MAX_PAGE_SIZE + 1).status_code, 400)
+
+    def test_page_size_rejected_with_unpaged_formats(self):
+        for output_format in ('geojson', 'ndjson', 'fgb', 'geobuf'):
+            response = self.page(2, format=output_format)
+            self.assertEqual(response.status_code, 400, output_format)
+
+    def test_list_view_rejects_paging_with_binary_formats(self):
+        url = reverse('api-ponts')
+        self.assertEqual(self.client.get(url, {'page_size': 2}).status_code, 200)
+        for output_format in ('fgb', 'geobuf'):
+            for params in ({'page_size': 2}, {'after': KeysetCursor.encode('ponts', self.ponts[0].fid)}):
+                response = self.client.get(url, {**params, 'format': output_format})
+                self.assertEqual(response.status_code, 400, (output_format, params))
+                self.assertIn('error', json.loads(response.content))
+
+
+@override_settings(COLLECTES_MAX_WORKERS=4)
+class ParallelLayerFetchTests(TransactionTestCase):
+    """
+    Couches chargées par plusieurs threads (fetch_layers): les données sont
+    validées pour être visibles des connexions propres à chaque thread
+    """
+
+    def setUp(self):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts, Ecoles)
+        self.piste = Piste.objects.create(
+            geom=MultiLineString(LineString((530000, 1050000), (531000, 1051000)), srid=32628),
+        )
+        self.ponts = [create_pont() for _ in range(2)]
+        self.ecole = Ecoles.objects.create(geom=Point(-13.6, 9.4, srid=4326))
+        self.type_names = InfrastructureLayers.selected_types(['pistes', 'ponts', 'ecoles'])
+
+    def tearDown(self):
+        # Tables non gérées: non vidées entre les tests par TransactionTestCase
+        for model in (Ecoles, Ponts, Piste):
+            model.objects.all().delete()
+
+    def test_parallel_fetch_matches_sequential(self):
+        engine = GeoJSONEngine()
+        self.assertGreater(len(engine.fetch_jobs(self.type_names)), 1)
+        parallel = engine.fetch_features(self.type_names, use_cache=False)
+        with override_settings(COLLECTES_MAX_WORKERS=1):
+            sequential = GeoJSONEngine().fetch_features(self.type_names, use_cache=False)
+        self.assertEqual(parallel[1], 4)
+        self.assertEqual(parallel, sequential)
+
+    def test_layers_are_merged_in_registry_order(self):
+        fragments, _total = GeoJSONEngine().fetch_features(self.type_names, use_cache=False)
+        features = json.loads('[' + ','.join(fragments) + ']')
+        counts = {'pistes': 1, 'ponts': 2, 'ecoles': 1}
+        expected = [
+            InfrastructureLayers.feature_id_prefix(type_name)
+            for type_name in self.type_names for _ in range(counts[type_name])
+        ]
+        self.assertEqual([feature['id'].rsplit('_', 1)[0] for feature in features], expected)
+
+    def test_layer_timings(self):
+        engine = GeoJSONEngine()
+        engine.fetch_features(self.type_names, use_cache=False)
+        self.assertEqual(
+            {type_name: timing['count'] for type_name, timing in engine.layer_timings.items()},
+            {'pistes': 1, 'ponts': 2, 'ecoles': 1},
+        )
+        for timing in engine.layer_timings.values():
+            self.assertFalse(timing['cached'])
+            self.assertGreaterEqual(timing['ms'], 0)
+
+
+class DensityCellIndexTests(TestCase):
+    """
+    (i, j) calculés par DensityGrid.cell_index_sql pour des points proches des
+    bords de cellule: la cellule ST_Hexagon / ST_Square correspondante les contient
+    """
+    SIZE = 1000.0
+    # Écart au bord en mètres, de part et d'autre
+    EPSILON = 0.01
+    # Colonnes paires et impaires, indices négatifs et coordonnées UTM réelles
+    CELLS = [(0, 0), (1, 0), (-1, -1), (-2, 3), (350, 600), (351, 601)]
+
+    def cells_containing(self, shape, points):
+        grid = DensityGrid([], shape=shape)
+        grid.cell_size = self.SIZE
+        values = ', '.join(['(%s::float8, %s::float8)'] * len(points))
+        sql = f"""
+            SELECT p.x, p.y, cell.i, cell.j,
+                   ST_Contains({GRID_SHAPES[shape]}(%s, cell.i, cell.j), ST_MakePoint(p.x, p.y))
+            FROM (VALUES {values}) AS p(x, y)
+            CROSS JOIN LATERAL ({grid.cell_index_sql()}) cell
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.SIZE] + [value for point in points for value in point])
+            return cursor.fetchall()
+
+    def assert_points_in_cells(self, shape, points):
+        rows = self.cells_containing(shape, points)
+        self.assertEqual(len(rows), len(points))
+        for x, y, i, j, contained in rows:
+            self.assertTrue(contained, f"{shape}: ({x}, {y}) hors de la cellule ({i}, {j})")
+
+    def test_hexagon_contains_points_near_edges(self):
+        half_height = HEX_HALF_HEIGHT * self.SIZE
+        points = []
+        for i, j in self.CELLS:
+            cx = 1.5 * self.SIZE * i
+            cy = 2 * half_height * j + (half_height if i % 2 else 0)
+            for k in range(6):
+                # Milieux des côtés (apothème) et sommets, juste à l'intérieur et juste à
+                # l'extérieur; décalage latéral près des sommets: dans le prolongement
+                # d'un rayon, le point serait sur le côté commun aux deux voisins
+                for radius, angle, shift in ((half_height, 30 + 60 * k, 0.0), (self.SIZE, 60 * k, 2 * self.EPSILON)):
+                    cos, sin = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+                    for distance in (radius - self.EPSILON, radius + self.EPSILON):
+                        points.append((cx + distance * cos - shift * sin, cy + distance * sin + shift * cos))
+        self.assert_points_in_cells('hex', points)
+
+    def test_square_contains_points_near_edges(self):
+        points = []
+        for i, j in self.CELLS:
+            for x in (i * self.SIZE - self.EPSILON, i * self.SIZE + self.EPSILON):
+                for y in (j * self.SIZE - self.EPSILON, j * self.SIZE + self.EPSILON, (j + 0.5) * self.SIZE):
+                    points.append((x, y))
+        self.assert_points_in_cells('square', points)
+
+
+class TimestampBackfillTests(TestCase):
+    """Conversion en masse des dates texte: copies remplies, sans passer par le journal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_tables(Region, Prefecture, CommuneRurale, Login, Piste, Ponts)
+        install_tracking('ponts', 'fid')
+        with connection.cursor() as cursor:
+            cursor.execute(migration('0013_horodatages_timestamptz').create_columns_sql('ponts'))
+        cls.dated = create_pont(created_at='2025/02/28 21:49:55.000', updated_at='2025/03/01')
+        cls.undated = create_pont(created_at='pas une date')
+
+        # Lignes antérieures au trigger de conversion: copies vides
+        with transaction.atomic(), connection.cursor() as cursor, change_tracking_disabled(cursor):
+            cursor.execute("UPDATE ponts SET created_at_ts = NULL, updated_at_ts = NULL")
+
+    def test_shadow_columns_are_filled(self):
+        self.assertEqual(TimestampBackfill.backfill('ponts'), 1)
+
+        dated = Ponts.objects.get(pk=self.dated.pk)
+        self.assertEqual(dated.created_at_ts, datetime(2025, 2, 28, 21, 49, 55, tzinfo=dt_timezone.utc))
+        self.assertEqual(dated.updated_at_ts, datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        self.assertIsNone(Ponts.objects.get(pk=self.undated.pk).created_at_ts)
+
+    def test_backfill_does_not_touch_journal(self):
+        journal_size = ChangementInfrastructure.objects.count()
+        version = get_table_versions(['ponts'])['ponts']
+
+        TimestampBackfill.backfill('ponts', batch_size=1)
+
+        self.assertEqual(ChangementInfrastructure.objects.count(), journal_size)
+        # Une seule version pour toute la conversion (invalidation des ETags)
+        self.assertEqual(get_table_versions(['ponts'])['ponts'], version + 1)
+
+    def test_second_run_writes_nothing(self):
+        TimestampBackfill.backfill('ponts')
+        version = get_table_versions(['ponts'])['ponts']
+
+        self.assertEqual(TimestampBackfill.backfill('ponts'), 0)
+        self.assertEqual(get_table_versions(['ponts'])['ponts'], version)
+
+    def test_tracking_resumes_after_backfill(self):
+        TimestampBackfill.backfill('ponts')
+        journal_size = ChangementInfrastructure.objects.count()
+
+        Ponts.objects.filter(pk=self.dated.pk).update(situation='Bon')
+
+        self.assertEqual(ChangementInfrastructure.objects.count(), journal_size + 1)
+
+
+def square(minx, miny, maxx, maxy):
+    """Anneau carré fermé, sens direct"""
+    return [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny]]
+
+
+class TopologyBuilderTests(SimpleTestCase):
+    """Encodage TopoJSON des contours, sans base: grille 0-10 au pas de 1"""
+
+    def encode(self, features):
+        return TopologyBuilder((0, 0, 10, 10), quantization=11).encode(features)
+
+    @staticmethod
+    def decoded_arcs(topology):
+        arcs = []
+        for encoded in topology['arcs']:
+            x, y = 0, 0
+            arc = []
+            for dx, dy in encoded:
+                x, y = x + dx, y + dy
+                arc.append((x, y))
+            arcs.append(arc)
+        return arcs
+
+    def rebuild_ring(self, topology, refs):
+        arcs = self.decoded_arcs(topology)
+        ring = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            ring += arc if not ring else arc[1:]
+        return ring
+
+    @staticmethod
+    def arc_indexes(refs):
+        return {ref if ref >= 0 else ~ref for ref in refs}
+
+    @staticmethod
+    def same_ring(ring, expected):
+        """Même anneau fermé au point de départ près"""
+        points = [tuple(point) for point in ring[:-1]]
+        expected = [tuple(point) for point in expected[:-1]]
+        if ring[0] != ring[-1] or len(points) != len(expected) or expected[0] not in points:
+            return False
+        start = points.index(expected[0])
+        return points[start:] + points[:start] == expected
+
+    def test_adjacent_squares_share_one_arc(self):
+        left, right = square(0, 0, 2, 2), square(2, 0, 4, 2)
+        topology = self.encode({'communes': [
+            (1, {}, {'type': 'Polygon', 'coordinates': [left]}),
+            (2, {}, {'type': 'Polygon', 'coordinates': [right]}),
+        ]})
+
+        first, second = (geometry['arcs'][0][0] for geometry in topology['objects']['communes']['geometries'])
+        shared = self.arc_indexes(first) & self.arc_indexes(second)
+        self.assertEqual(len(shared), 1)
+        self.assertEqual(len(topology['arcs']), 3)
+        # Frontière commune parcourue dans un sens par chaque carré
+        self.assertEqual(sorted(ref for ref in first + second if self.arc_indexes([ref]) == shared), [~0, 0])
+
+    def test_hole_ring_is_reused_by_island(self):
+        hole = [[4, 4], [4, 6], [6, 6], [6, 4], [4, 4]]
+        island = square(4, 4, 6, 6)
+        topology = self.encode({'communes': [
+            (1, {}, {'type': 'Polygon', 'coordinates': [square(0, 0, 10, 10), hole]}),
+            (2, {}, {'type': 'Polygon', 'coordinates': [island]}),
+        ]})
+
+        outer, island_geometry = topology['objects']['communes']['geometries']
+        hole_refs = outer['arcs'][0][1]
+        island_refs = island_geometry['arcs'][0][0]
+        self.assertEqual(len(hole_refs), 1)
+        self.assertEqual(island_refs, [~hole_refs[0]])
+        self.assertEqual(len(topology['arcs']), 2)
+
+    def test_decoded_arcs_rebuild_input_rings(self):
+        polygons = {
+            1: [square(0, 0, 2, 2)],
+            2: [square(2, 0, 4, 2)],
+            3: [square(0, 2, 4, 4)],
+            4: [square(5, 5, 9, 9), [[6, 6], [6, 8], [8, 8], [8, 6], [6, 6]]],
+            5: [square(6, 6, 8, 8)],
+        }
+        topology = self.encode({'communes': [
+            (unit_id, {}, {'type': 'Polygon', 'coordinates': rings}) for unit_id, rings in polygons.items()
+        ]})
+
+        for geometry in topology['objects']['communes']['geometries']:
+            [polygon_refs] = geometry['arcs']
+            expected_rings = polygons[geometry['id']]
+            self.assertEqual(len(polygon_refs), len(expected_rings))
+            for refs, expected in zip(polygon_refs, expected_rings):
+                ring = self.rebuild_ring(topology, refs)
+                self.assertTrue(self.same_ring(ring, expected), (geometry['id'], ring))
+
+
+class CommuneIndexTests(SimpleTestCase):
+    """Géocodage inverse en mémoire sur des communes carrées, sans base"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Triées par id comme CommuneIndex.sql(): 3 et 7 ont la frontière x = 2 en commun
+        cls.units = [
+            {'commune': {'id': commune_id, 'nom': nom}, 'prefecture': None, 'region': None}
+            for commune_id, nom in ((3, 'Kankan'), (7, 'Kérouané'), (9, 'Siguiri'))
+        ]
+        geometries = shapely.box([0, 2, 10], [0, 0, 10], [2, 4, 12], [2, 2, 12])
+        cls.index = CommuneIndex(cls.units, geometries, versions={})
+
+    def commune_ids(self, xs, ys):
+        return [
+            unit['commune']['id'] if unit else None
+            for unit in self.index.locate_many(xs, ys)
+        ]
+
+    def test_point_inside_commune(self):
+        self.assertEqual(self.commune_ids([1.0], [1.0]), [3])
+        self.assertEqual(self.index.locate_many([3.0], [0.5])[0], self.units[1])
+
+    def test_point_outside_communes(self):
+        self.assertEqual(self.commune_ids([5.0], [5.0]), [None])
+
+    def test_shared_border_goes_to_lowest_id(self):
+        self.assertEqual(self.commune_ids([2.0, 2.0], [1.0, 2.0]), [3, 3])
+
+    def test_batch_keeps_point_order(self):
+        xs = [11.0, 5.0, 3.0, 1.0, 11.5]
+        ys = [11.0, 5.0, 1.0, 1.0, 10.5]
+        self.assertEqual(self.commune_ids(xs, ys), [9, None, 7, 3, 9])
+
+    def test_empty_batch(self):
+        self.assertEqual(self.index.locate_many([], []), [])
 
-# Create your tests here.
@@ -0,0 +1,120 @@
+# tile_views.py - Tuiles vectorielles (MVT) générées par PostGIS
+import logging
+
+from django.db import connection # type: ignore
+from django.http import HttpResponse # type: ignore
+from rest_framework.views import APIView # type: ignore
+from rest_framework.response import Response # type: ignore
+from rest_framework.renderers import JSONRenderer # type: ignore
+from rest_framework import status # type: ignore
+
+from .renderers import MVTRenderer
+from .spatial_utils import GeoQueryHelper, InfrastructureLayers
+
+logger = logging.getLogger(__name__)
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MAX_ZOOM = 22
+
+
+class VectorTileAPIView(APIView):
+    """
+    Retourne une tuile MVT pour une couche d'infrastructures.
+
+    URL : /api/tiles/<layer>/<z>/<x>/<y>.mvt
+    <layer> est un type d'infrastructure (ex: ecoles, pistes) ou "all"
+    pour toutes les couches (filtrables avec ?types=...).
+    Les filtres region_id / prefecture_id / commune_id sont supportés.
+    """
+    renderer_classes = [JSONRenderer, MVTRenderer]
+
+    def get(self, request, layer, z, x, y):
+        if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+            return Response({
+                'error': f'Tuile invalide: {z}/{x}/{y}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if layer == 'all':
+            type_names = InfrastructureLayers.selected_types(request.GET.getlist('types', []))
+        elif InfrastructureLayers.get_model(layer) is not None:
+            type_names = [layer]
+        else:
+            return Response({
+                'error': f'Couche inconnue: {layer}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        commune_scope = GeoQueryHelper.get_commune_scope(
+            request.GET.get('region_id'),
+            request.GET.get('prefecture_id'),
+            request.GET.get('commune_id'),
+        )
+        if commune_scope.is_empty:
+            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            tile = self._build_tile(type_names, z, x, y, commune_scope)
+        except Exception as e:
+            logger.exception("Erreur génération tuile %s %s/%s/%s", layer, z, x, y)
+            return Response({
+                'error': str(e),
+                'type': type(e).__name__,
+                'details': 'Erreur lors de la génération de la tuile'
+            }, status=500)
+
+        if not tile:
+            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+        return HttpResponse(tile, content_type=MVTRenderer.media_type)
+
+    def _build_tile(self, type_names, z, x, y, commune_scope):
+        """Une couche MVT par type; les couches MVT se concatènent telles quelles"""
+        tile = b''
+        with connection.cursor() as cursor:
+            for type_name in type_names:
+                sql, params = self._layer_sql(type_name, z, x, y, commune_scope)
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+                if row and row[0]:
+                    tile += bytes(row[0])
+        return tile
+
+    def _layer_sql(self, type_name, z, x, y, commune_scope):
+        model = InfrastructureLayers.get_model(type_name)
+        table = InfrastructureLayers.table(model)
+        pk = InfrastructureLayers.pk_column(model)
+        commune_col = InfrastructureLayers.commune_column(model)
+        srid = InfrastructureLayers.geom_srid(model)
+
+        extra_select = ''.join(
+            f', t.{column}' for column in InfrastructureLayers.extra_columns(type_name)
+        )
+
+        # Préfiltre sur l'emprise élargie du tampon: les symboles proches du bord
+        # sont aussi écrits dans la tuile voisine
+        where = [f't.geom && ST_Transform(bounds.buffered, {srid})']
+        params = [z, x, y, z, x, y, MVT_BUFFER / MVT_EXTENT, MVT_EXTENT, MVT_BUFFER, type_name]
+        scope_condition, scope_params = commune_scope.sql(f't.{commune_col}')
+        if scope_condition:
+            where.append(scope_condition)
+            params.extend(scope_params)
+        params += [type_name, MVT_EXTENT]
+
+        sql = f"""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(%s, %s, %s) AS geom,
+                       ST_TileEnvelope(%s, %s, %s, margin => %s) AS buffered
+            ),
+            mvtgeom AS (
+                SELECT ST_AsMVTGeom(ST_Transform(t.geom, 3857), bounds.geom, %s, %s, true) AS geom,
+                       t.{pk} AS {pk},
+                       %s AS type,
+                       t.{commune_col} AS commune_id{extra_select}
+                FROM {table} t, bounds
+                WHERE {' AND '.join(where)}
+            )
+            SELECT ST_AsMVT(mvtgeom.*, %s, %s, 'geom')
+            FROM mvtgeom
+            WHERE mvtgeom.geom IS NOT NULL
+        """
+        return sql, params
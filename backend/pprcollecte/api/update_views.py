@@ -2,6 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from .commune_assignment import CommuneAssigner
+from .layer_cache import LayerCache
+
 from .models import (
     Piste,
     Chaussees,
@@ -109,6 +112,9 @@ class InfrastructureUpdateAPIView(APIView):
             )
 
         obj.save()
+        # Commune vidée par la modification: la recalculer depuis la géométrie
+        CommuneAssigner.assign_feature(table, obj.pk)
+        LayerCache.invalidate(table)
 
         return Response(
             {
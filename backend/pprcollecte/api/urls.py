@@ -19,6 +19,9 @@ urlpatterns = [
     # ==================== GEOGRAPHIE ====================
     path('api/geography/hierarchy/', GeographyHierarchyAPIView.as_view(), name='api-geography-hierarchy'),
     path('api/geography/zoom/', ZoomToLocationAPIView.as_view(), name='api-geography-zoom'),
+    path('api/geography/boundaries/', AdminBoundariesAPIView.as_view(), name='api-geography-boundaries'),
+    path('api/geography/locate/', LocateAPIView.as_view(), name='api-geography-locate'),
+    path('api/geography/search/', GeographySearchAPIView.as_view(), name='api-geography-search'),
     path('api/regions/', RegionsListCreateAPIView.as_view(), name='api-regions'),
     path('api/prefectures/', PrefecturesListCreateAPIView.as_view(), name='api-prefectures'),
     path('api/communes_rurales/', CommunesRuralesListCreateAPIView.as_view(), name='api-communes-rurales'),
@@ -3,7 +3,7 @@ from rest_framework.views import APIView # type: ignore
 from rest_framework.response import Response # type: ignore
 from rest_framework import status, generics # type: ignore
 from django.contrib.gis.db.models.functions import Transform,Length # type: ignore
-from django.db.models import Count # type: ignore
+from django.db.models import Case, Count, When # type: ignore
 from django.db.models import Q # type: ignore
 from rest_framework.pagination import PageNumberPagination # type: ignore
 
@@ -12,21 +12,172 @@ from rest_framework_simplejwt.tokens import RefreshToken  # type: ignore
 
 from .models import *
 from .serializers import *
+from .commune_assignment import CommuneAssigner
+from .name_search import AdminNameSearch
+from .layer_cache import LayerCache
+from .conditional import watermark_etag
+from django.utils.decorators import method_decorator # type: ignore
+from django.db import connection # type: ignore
+from django.http import HttpResponse # type: ignore
+from rest_framework.settings import api_settings # type: ignore
+from .renderers import FlatGeobufRenderer, GeobufRenderer
+from .point_union import PointInfrastructureUnion
+from .pagination import KeysetPagination
+from .spatial_utils import parse_precision
+
+
+class InfrastructureCreateMixin:
+    """
+    Après création d'une infrastructure: rattachement à la commune si elle n'est
+    pas renseignée et invalidation du cache de la couche (les géométries
+    généralisées sont tenues à jour par trigger).
+    """
+    layer_name = None
+
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        CommuneAssigner.assign_feature(self.layer_name, instance.pk)
+        LayerCache.invalidate(self.layer_name)
+
+
+class MapQueryParamsMixin:
+    """
+    Paramètres des listes GeoJSON:
+    - ?precision=<décimales de degré> (0-9) arrondit les coordonnées (converties
+      en mètres pour les couches en SRID projeté); sans ce paramètre les
+      coordonnées stockées sont renvoyées telles quelles
+    - ?fields=a,b,c limite le SELECT (.only()) et les propriétés produites;
+      la géométrie n'est renvoyée que si elle est demandée
+    """
+
+    def list(self, request, *args, **kwargs):
+        precision, precision_error = parse_precision(request.query_params.get('precision'))
+        if precision_error:
+            return Response({'error': precision_error}, status=status.HTTP_400_BAD_REQUEST)
+        self.precision = precision
+
+        self.sparse_fields = None
+        fields_param = request.query_params.get('fields', '')
+        if fields_param:
+            requested = [name.strip() for name in fields_param.split(',') if name.strip()]
+            available = self.get_serializer_class()(context=super().get_serializer_context()).fields
+            unknown = [name for name in requested if name not in available]
+            if unknown:
+                return Response({
+                    'error': f"Champs inconnus: {', '.join(unknown)}",
+                    'available_fields': list(available),
+                }, status=status.HTTP_400_BAD_REQUEST)
+            self.sparse_fields = requested
+        return super().list(request, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested = getattr(self, 'sparse_fields', None)
+        if requested:
+            serializer = self.get_serializer_class()(context=super().get_serializer_context())
+            only = serializer.model_fields(requested) if hasattr(serializer, 'model_fields') else None
+            if only is not None:
+                # Les relations chargées par select_related() ne peuvent pas être différées
+                if isinstance(queryset.query.select_related, dict):
+                    only += [name for name in queryset.query.select_related if name not in only]
+                queryset = queryset.only(*only)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['precision'] = getattr(self, 'precision', None)
+        context['fields'] = getattr(self, 'sparse_fields', None)
+        return context
+
+
+class GeoFormatsMixin:
+    """
+    Listes d'infrastructures aussi disponibles en binaire (?format=fgb|geobuf
+    ou en-tête Accept): l'encodage est fait par PostGIS sur les lignes
+    filtrées par get_queryset(), sans passer par le serializer.
+    Les géométries sont reprojetées en 4326 (les pistes sont stockées en 32628).
+    Les formats binaires renvoient toute la sélection: page_size et after sont refusés.
+    ?precision= et ?fields= (MapQueryParamsMixin) s'appliquent comme en JSON.
+    """
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [FlatGeobufRenderer, GeobufRenderer]
+
+    def list(self, request, *args, **kwargs):
+        output_format = request.accepted_renderer.format
+        if output_format not in (FlatGeobufRenderer.format, GeobufRenderer.format):
+            return super().list(request, *args, **kwargs)
+
+        for param in ('page_size', 'after'):
+            if request.query_params.get(param):
+                return Response(
+                    {'error': f"{param} n'est pas disponible avec format={output_format}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        table = queryset.model._meta.db_table
+        pk = queryset.model._meta.pk.column
+        ids_sql, params = queryset.values('pk').query.sql_with_params()
+
+        # ?fields=: colonnes du modèle derrière les champs demandés (la géométrie
+        # reste nécessaire à l'encodeur)
+        names = None
+        requested = getattr(self, 'sparse_fields', None)
+        if requested:
+            serializer = self.get_serializer_class()(context=super().get_serializer_context())
+            names = serializer.model_fields(requested) if hasattr(serializer, 'model_fields') else None
+            if names is None:
+                return Response(
+                    {'error': f"fields n'est pas disponible avec format={output_format} pour ces champs"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        columns = ', '.join(
+            f't.{field.column}' for field in queryset.model._meta.concrete_fields
+            if field.column != 'geom' and (names is None or field.name in names)
+        )
+
+        # ?precision=: coordonnées WGS84 arrondies sur la grille décimale
+        geometry = 'ST_Transform(t.geom, 4326)'
+        precision = getattr(self, 'precision', None)
+        if precision is not None:
+            geometry = f'ST_SnapToGrid({geometry}, {10.0 ** -int(precision)!r})'
+
+        if output_format == FlatGeobufRenderer.format:
+            aggregate = "ST_AsFlatGeobuf(q, true, 'geom')"
+        else:
+            aggregate = "ST_AsGeobuf(q, 'geom')"
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT {aggregate}
+                FROM (
+                    SELECT {columns}, {geometry} AS geom
+                    FROM {table} t
+                    WHERE t.geom IS NOT NULL AND t.{pk} IN ({ids_sql})
+                ) q
+                """,
+                params,
+            )
+            row = cursor.fetchone()
+        return HttpResponse(
+            bytes(row[0]) if row and row[0] else b'',
+            content_type=request.accepted_renderer.media_type,
+        )
 
 
 # ==================== GEOGRAPHIE ====================
 
-class RegionsListCreateAPIView(generics.ListCreateAPIView):
+class RegionsListCreateAPIView(MapQueryParamsMixin, generics.ListCreateAPIView):
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
 
 
-class PrefecturesListCreateAPIView(generics.ListCreateAPIView):
+class PrefecturesListCreateAPIView(MapQueryParamsMixin, generics.ListCreateAPIView):
     queryset = Prefecture.objects.all()
     serializer_class = PrefectureSerializer
 
 
-class CommunesRuralesListCreateAPIView(generics.ListCreateAPIView):
+class CommunesRuralesListCreateAPIView(MapQueryParamsMixin, generics.ListCreateAPIView):
     serializer_class = CommuneRuraleSerializer
     
     def get_queryset(self):
@@ -36,7 +187,14 @@ class CommunesRuralesListCreateAPIView(generics.ListCreateAPIView):
         )
         search = self.request.GET.get('q', '')
         if search:
-            queryset = queryset.filter(nom__icontains=search)
+            # Recherche insensible aux accents via l'index des noms en mémoire:
+            # toutes les communes trouvées, dans l'ordre de pertinence
+            ids = [match['id'] for match in AdminNameSearch.search(search, types={'commune'}, limit=None)]
+            if not ids:
+                return queryset.none()
+            return queryset.filter(id__in=ids).order_by(
+                Case(*[When(id=commune_id, then=position) for position, commune_id in enumerate(ids)])
+            )
         return queryset.order_by('nom')
 
 
@@ -211,8 +369,10 @@ class UserManagementAPIView(APIView):
 
 # ==================== PISTES ====================
 
-class PisteListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['pistes', 'login', 'communes_rurales']), name='get')
+class PisteListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'pistes'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     """Vue unifiee pour les pistes
     Accepte commune_id OU communes_rurales_id pour filtrage"""
     
@@ -229,11 +389,24 @@ class PisteListCreateAPIView(generics.ListCreateAPIView):
             return PisteReadSerializer
         return PisteWriteSerializer
     
-    def perform_create(self, serializer):
-        serializer.save()
-    
 from django.contrib.gis.db.models.functions import Length
 
+# Tables lues par le tableau de bord des pistes (compteurs par type inclus)
+PISTES_WEB_TABLES = [
+    'pistes', 'login', 'communes_rurales', 'chaussees', 'buses', 'ponts', 'dalots',
+    'bacs', 'ecoles', 'marches', 'services_santes', 'autres_infrastructures',
+    'batiments_administratifs', 'infrastructures_hydrauliques', 'localites',
+    'passages_submersibles',
+]
+
+# Types comptés par piste dans le tableau de bord (tables de même forme que les points)
+PISTES_WEB_COUNTED_TYPES = [
+    'buses', 'ponts', 'dalots', 'bacs', 'ecoles', 'marches', 'services_santes',
+    'autres_infrastructures', 'batiments_administratifs', 'infrastructures_hydrauliques',
+    'localites', 'passages_submersibles',
+]
+
+@method_decorator(watermark_etag(PISTES_WEB_TABLES), name='get')
 class PisteWebListAPIView(generics.ListAPIView):
     serializer_class = PisteDashboardSerializer
     pagination_class = None  
@@ -242,27 +415,26 @@ class PisteWebListAPIView(generics.ListAPIView):
         return Piste.objects.select_related(
             'login_id',
             'communes_rurales_id'
-        ).annotate(
-            nb_buses=Count('buses', filter=Q(buses__code_piste__isnull=False)),
-            nb_ponts=Count('ponts', filter=Q(ponts__code_piste__isnull=False)),
-            nb_dalots=Count('dalots', filter=Q(dalots__code_piste__isnull=False)),
-            nb_bacs=Count('bacs', filter=Q(bacs__code_piste__isnull=False)),
-            nb_ecoles=Count('ecoles', filter=Q(ecoles__code_piste__isnull=False)),
-            nb_marches=Count('marches', filter=Q(marches__code_piste__isnull=False)),
-            nb_services_santes=Count('servicessantes', filter=Q(servicessantes__code_piste__isnull=False)),
-            nb_autres_infrastructures=Count('autresinfrastructures', filter=Q(autresinfrastructures__code_piste__isnull=False)),
-            nb_batiments_administratifs=Count('batimentsadministratifs', filter=Q(batimentsadministratifs__code_piste__isnull=False)),
-            nb_infrastructures_hydrauliques=Count('infrastructureshydrauliques', filter=Q(infrastructureshydrauliques__code_piste__isnull=False)),
-            nb_localites=Count('localites', filter=Q(localites__code_piste__isnull=False)),
-            nb_passages_submersibles=Count('passagessubmersibles', filter=Q(passagessubmersibles__code_piste__isnull=False))
         ).order_by('-created_at')
 
+    def get_serializer_context(self):
+        # Compteurs par piste et par type en une requête UNION ALL
+        # (au lieu de 12 LEFT JOIN + COUNT sur la liste des pistes),
+        # recalculés seulement quand une table comptée change
+        context = super().get_serializer_context()
+        context['infrastructure_counts'] = PointInfrastructureUnion.cached_count_by(
+            'code_piste', PISTES_WEB_COUNTED_TYPES
+        )
+        return context
+
 
 
 # ==================== CHAUSSEES ====================
 
-class ChausseesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['chaussees']), name='get')
+class ChausseesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'chaussees'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = ChausseesSerializer
 
     def get_queryset(self):
@@ -280,8 +452,10 @@ class ChausseesListCreateAPIView(generics.ListCreateAPIView):
 
 # ==================== POINTS ====================
 
-class PointsCoupuresListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['points_coupures']), name='get')
+class PointsCoupuresListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'points_coupures'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = PointsCoupuresSerializer
 
     def get_queryset(self):
@@ -295,8 +469,10 @@ class PointsCoupuresListCreateAPIView(generics.ListCreateAPIView):
         return qs
 
 
-class PointsCritiquesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['points_critiques']), name='get')
+class PointsCritiquesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'points_critiques'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = PointsCritiquesSerializer
 
     def get_queryset(self):
@@ -312,8 +488,10 @@ class PointsCritiquesListCreateAPIView(generics.ListCreateAPIView):
 
 # ==================== INFRASTRUCTURES ====================
 
-class ServicesSantesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['services_santes']), name='get')
+class ServicesSantesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'services_santes'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = ServicesSantesSerializer
     
     def get_queryset(self):
@@ -324,8 +502,10 @@ class ServicesSantesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class AutresInfrastructuresListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['autres_infrastructures']), name='get')
+class AutresInfrastructuresListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'autres_infrastructures'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = AutresInfrastructuresSerializer
     
     def get_queryset(self):
@@ -336,8 +516,10 @@ class AutresInfrastructuresListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class BacsListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['bacs']), name='get')
+class BacsListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'bacs'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = BacsSerializer
     
     def get_queryset(self):
@@ -348,8 +530,10 @@ class BacsListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class BatimentsAdministratifsListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['batiments_administratifs']), name='get')
+class BatimentsAdministratifsListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'batiments_administratifs'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = BatimentsAdministratifsSerializer
     
     def get_queryset(self):
@@ -360,8 +544,10 @@ class BatimentsAdministratifsListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class BusesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['buses']), name='get')
+class BusesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'buses'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = BusesSerializer
     
     def get_queryset(self):
@@ -372,8 +558,10 @@ class BusesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class DalotsListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['dalots']), name='get')
+class DalotsListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'dalots'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = DalotsSerializer
     
     def get_queryset(self):
@@ -384,8 +572,10 @@ class DalotsListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class EcolesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['ecoles']), name='get')
+class EcolesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'ecoles'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = EcolesSerializer
     
     def get_queryset(self):
@@ -396,8 +586,10 @@ class EcolesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class InfrastructuresHydrauliquesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['infrastructures_hydrauliques']), name='get')
+class InfrastructuresHydrauliquesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'infrastructures_hydrauliques'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = InfrastructuresHydrauliquesSerializer
     
     def get_queryset(self):
@@ -408,8 +600,10 @@ class InfrastructuresHydrauliquesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class LocalitesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['localites']), name='get')
+class LocalitesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'localites'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = LocalitesSerializer
     
     def get_queryset(self):
@@ -420,8 +614,10 @@ class LocalitesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class MarchesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['marches']), name='get')
+class MarchesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'marches'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = MarchesSerializer
     
     def get_queryset(self):
@@ -432,8 +628,10 @@ class MarchesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class PassagesSubmersiblesListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['passages_submersibles']), name='get')
+class PassagesSubmersiblesListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'passages_submersibles'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = PassagesSubmersiblesSerializer
     
     def get_queryset(self):
@@ -444,8 +642,10 @@ class PassagesSubmersiblesListCreateAPIView(generics.ListCreateAPIView):
         return queryset
 
 
-class PontsListCreateAPIView(generics.ListCreateAPIView):
-    pagination_class = None  # Désactiver la pagination
+@method_decorator(watermark_etag(['ponts']), name='get')
+class PontsListCreateAPIView(InfrastructureCreateMixin, MapQueryParamsMixin, GeoFormatsMixin, generics.ListCreateAPIView):
+    layer_name = 'ponts'
+    pagination_class = KeysetPagination  # Opt-in: ?page_size=&after=
     serializer_class = PontsSerializer
     
     def get_queryset(self):
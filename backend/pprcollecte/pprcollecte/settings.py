@@ -163,6 +163,61 @@ PROJ_LIB = r"C:\Program Files\QGIS 3.40.2\share\proj"
 os.environ['PATH'] = r"C:\Program Files\QGIS 3.40.2\bin;" + os.environ['PATH']
 os.environ['PROJ_LIB'] = PROJ_LIB
 
+# Cache des couches spatiales (/api/collectes/), invalidé à chaque écriture.
+# locmem est propre à chaque processus: en production, utiliser un cache partagé, ex.
+#   COLLECTES_CACHE_BACKEND=django_redis.cache.RedisCache
+#   COLLECTES_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'collectes': {
+        'BACKEND': os.environ.get('COLLECTES_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('COLLECTES_CACHE_LOCATION', 'collectes'),
+    },
+}
+COLLECTES_CACHE_ALIAS = 'collectes'
+COLLECTES_CACHE_TIMEOUT = 3600
+# Couches de /api/collectes/ requêtées en parallèle. Sans pool de connexions, chaque
+# thread ouvre puis ferme sa propre connexion PostgreSQL à chaque requête non servie
+# par le cache: jusqu'à COLLECTES_MAX_WORKERS connexions de plus par requête, à
+# compter dans max_connections. 1 (défaut) = couches lues à la suite sur la connexion
+# de la requête; augmenter derrière un pooler (PgBouncer).
+COLLECTES_MAX_WORKERS = int(os.environ.get('COLLECTES_MAX_WORKERS', 1))
+# Hiérarchie administrative: clé liée aux versions des tables, durée longue
+GEOGRAPHY_CACHE_TIMEOUT = 24 * 3600
+# Géocodage inverse: délai (s) entre deux contrôles de version des communes
+LOCATOR_REFRESH_INTERVAL = 60
+
+# Profilage: en-tête Server-Timing (durées, requêtes SQL, spans par couche).
+# Désactivé par défaut; API_SERVER_TIMING=1 pour l'activer.
+API_SERVER_TIMING = os.environ.get('API_SERVER_TIMING', '0') == '1'
+MIDDLEWARE = ['api.profiling.ServerTimingMiddleware'] + MIDDLEWARE
+
+# Journalisation des APIs (logger "api"): API_LOG_LEVEL=DEBUG pour le détail des requêtes
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'api': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'api',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': os.environ.get('API_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 from datetime import timedelta
 
 SIMPLE_JWT = {